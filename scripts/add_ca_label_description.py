@@ -12,19 +12,19 @@ python scripts/add_ca_label_description.py | tee log/20190108-tmp.log
 # reload(sys)  # Reload does the trick!
 # sys.setdefaultencoding('UTF8')
 import argparse
-import copy
 import datetime
 import logging
 
-from pywikibot import pagegenerators as pg
-from pywikibot.exceptions import OtherPageSaveError
+from pywikibot.exceptions import APIError
 
-import wikidatabot
-from wikidatabot.models import Item
+from wikidatabot.models import TermContainer
+from wikidatabot.repository import CachedItemRepository, ItemPywikibotRepository
 
 
 logger = logging.getLogger('add_ca_label_description')
 
+ITEMS = CachedItemRepository(ItemPywikibotRepository())
+
 
 INSTANCE_OF = 'P31'
 COMMUNE_NOUVELLE = 'Q2989454'
@@ -126,24 +126,37 @@ def parse_args():
     return parser.parse_args()
 
 
+def edit_label_description(item, data, summary):
+    with item.edit(summary=summary) as edit:
+        for language, text in data.get('labels', {}).items():
+            edit.set_label(language, text)
+        for language, text in data.get('descriptions', {}).items():
+            edit.set_description(language, text)
+
+
 def update_label_description(item, data, summary_what):
     summary = " and ".join(summary_what)
     summary = f"Update ca {summary}"
     try:
         logger.info(summary)
-        item.editEntity(copy.deepcopy(data), summary=summary)  # editEntity modifies data
-    except OtherPageSaveError:
-        logger.warning(f"Exception while updating item {item.id}")
+        edit_label_description(item, data, summary)
+    except APIError as e:
+        # Only the collision with the label and description of another item is retried
+        if e.code != 'modification-failed':
+            raise
+        logger.warning(f"Exception while updating item {item.id}: {e}")
         location = item
-        instance_of = item.claims[INSTANCE_OF][0].target.id
+        statements = item.statements
+        instance_of = statements[INSTANCE_OF][0].target.id
         iteration = 0
         while instance_of != DEPARTMENT_OF_FRANCE and iteration < 5:
             iteration += 1
-            location = location.claims[LOCATED_IN][0].target
-            _ = location.get()
-            instance_of = location.claims[INSTANCE_OF][0].target.id
+            # Departments are shared by many communes: cached
+            location = ITEMS.get(statements[LOCATED_IN][0].target.id)
+            statements = location.statements
+            instance_of = statements[INSTANCE_OF][0].target.id
         if instance_of != DEPARTMENT_OF_FRANCE:
-            raise OtherPageSaveError
+            raise
         location_ca_label = location.labels.get('ca')
         location_fr_label = location.labels.get('fr')
         ca_description = data['descriptions']['ca'] if 'descriptions' in data else item.descriptions.get('ca')
@@ -155,7 +168,7 @@ def update_label_description(item, data, summary_what):
         summary = " and ".join(set(summary_what))
         summary = f"Update ca {summary}"
         logger.info(summary)
-        item.editEntity(copy.deepcopy(data), summary=summary)  # editEntity modifies data
+        edit_label_description(item, data, summary)
 
 
 def update_replaced_municipalities(item):
@@ -164,32 +177,31 @@ def update_replaced_municipalities(item):
         return
     logger.info("Start update of replaced municipalities")
     for statement in replaced_statements:
-        replaced_municipality = statement.target
+        replaced_municipality = ITEMS.get(statement.target.id)
         update_replaced_municipality(replaced_municipality)
     logger.info("End update of replaced municipalities")
 
 
-def update_replaced_municipality(pwb_item):
-    _ = pwb_item.get()
-    logger.info(f"Replaced item: {pwb_item.getID()}")
+def update_replaced_municipality(item):
+    logger.info(f"Replaced item: {item.id}")
     data = {}
     summary_what = []
 
     # Label
-    ca_label = pwb_item.labels.get('ca')
+    ca_label = item.labels.get('ca')
     if not ca_label:
-        fr_label = pwb_item.labels.get('fr')
+        fr_label = item.labels.get('fr')
         if fr_label:
             ca_label = {'ca': fr_label}
             data['labels'] = ca_label
             summary_what.append('label')
         else:
-            logger.error(f"No fr label for item {pwb_item.id}")
+            logger.error(f"No fr label for item {item.id}")
     else:
-        logger.info(f"ca label already present for item {pwb_item.id}: {ca_label}")
+        logger.info(f"ca label already present for item {item.id}: {ca_label}")
 
     # Description
-    ca_description = pwb_item.descriptions.get('ca')
+    ca_description = item.descriptions.get('ca')
     if not ca_description:
         ca_description = {'ca': 'antic municipi francès'}
         data['descriptions'] = ca_description
@@ -197,26 +209,26 @@ def update_replaced_municipality(pwb_item):
     else:
         if ca_description.startswith('municipi'):
             if len(ca_description) > 16:
-                logger.warning(f"ca description longer than expected for item {pwb_item.id}: {ca_description}")
+                logger.warning(f"ca description longer than expected for item {item.id}: {ca_description}")
             ca_description = {'ca': f'antic {ca_description}'}
             data['descriptions'] = ca_description
             summary_what.append('description')
         elif ca_description.startswith('antic'):
-            logger.info(f"ca description already updated for item {pwb_item.id}: {ca_description}")
+            logger.info(f"ca description already updated for item {item.id}: {ca_description}")
         else:
-            logger.error(f"ca description different than expected for item {pwb_item.id}: {ca_description}")
-    fr_description = pwb_item.descriptions.get('fr')
+            logger.error(f"ca description different than expected for item {item.id}: {ca_description}")
+    fr_description = item.descriptions.get('fr')
     if not fr_description:
-        logger.warning(f"No fr description for item {pwb_item.id}")
+        logger.warning(f"No fr description for item {item.id}")
     elif not fr_description.startswith('ancienne'):
-        logger.warning(f"fr description does not start with 'ancienne' for item {pwb_item.id}: {fr_description}")
+        logger.warning(f"fr description does not start with 'ancienne' for item {item.id}: {fr_description}")
 
     # Update data
     if data:
         # entity = {'id': item.id}
         # response = wikidatabot.repo.editEntity(entity, data, summary=summary)
         # print(response)
-        update_label_description(pwb_item, data, summary_what)
+        update_label_description(item, data, summary_what)
 
 
 if __name__ == '__main__':
@@ -227,6 +239,8 @@ if __name__ == '__main__':
     # Configurate logger
     config_logger(log_filename=args.log)
     logger.info('START add_ca_label_description')
+    # Only the terms in the languages used are kept
+    TermContainer.default_languages = frozenset({'ca', 'fr'})
 
     # Asof: today
     today = str(datetime.date.today())
@@ -235,17 +249,13 @@ if __name__ == '__main__':
     query = QUERY.replace('{administrative_division}', args.to).replace('{today}', today)
 
     # Create item generator
-    pwb_items = pg.WikidataSPARQLPageGenerator(query, site=wikidatabot.site)
-    # pwb_items = [1]
+    items = ItemPywikibotRepository().list(query)
 
-    for i, pwb_item in enumerate(pwb_items):
+    for i, item in enumerate(items):
         # pwb_item = wikidatabot.pywikibot.ItemPage(wikidatabot.repo, 'Q764858')
         # pwb_item = wikidatabot.pywikibot.ItemPage(wikidatabot.repo, 'Q43781672')
         # logger.info(pwb_item)
-        pwb_item.get()
-        # pwb_item_id = pwb_item.getID()
-        logger.info(f"Item: {pwb_item.getID()}")
-        item = Item.from_pwb(pwb_item)
+        logger.info(f"Item: {item.id}")
 
         # Update REPLACES municipalities
         update_replaced_municipalities(item)
@@ -285,7 +295,7 @@ if __name__ == '__main__':
             # entity = {'id': item.id}
             # response = wikidatabot.repo.editEntity(entity, data, summary=summary)
             # print(response)
-            update_label_description(pwb_item, data, summary_what)
+            update_label_description(item, data, summary_what)
 
         # if i >= 0:
         #     break
@@ -5,15 +5,14 @@
 
 
 import argparse
-from collections import defaultdict
 import os
 import pandas as pd
-import pywikibot
 from pywikibot import pagegenerators as pg
 import re
 
 import wikidatabot
-from wikidatabot.models import Claim, Statement, Item
+from wikidatabot.models import Claim, Statement, Item, Time
+from wikidatabot.repository import PropertyRepository, WIKIDATA_DATATYPES
 
 
 INSTANCE_OF = 'P31'
@@ -167,24 +166,23 @@ def check_duplicates(item, new_statement):
     :param new_statement:
     :return:
     """
-    item_statements = item.claims
-    if new_statement.getID() in item_statements:
-        for statement in item_statements[new_statement.getID()]:
-            # if statement.getTarget().amount == new_statement.getTarget().amount:
-            # For a string
-            if statement.getTarget() == new_statement.getTarget():
-                # print('- duplicated:', item.getID(), ':', item.labels['fr'])
-                if new_statement.qualifiers:
-                    for pid in new_statement.qualifiers:
-                        if pid in statement.qualifiers:
-                            statement_qualifier_claim = statement.qualifiers[pid][0]
-                            new_statement_qualifier_claim = new_statement.qualifiers[pid][0]
-                            if statement_qualifier_claim.getTarget().year == new_statement_qualifier_claim.getTarget().year:
-                                print('WARNING: duplicated:', item.getID(), ':', item.labels['fr'])
-                                return True
-            # elif statement.getRank() == 'preferred':
-            #     print('- preferred', item.labels['fr'])
-            #     statement.changeRank('normal')
+    # Cached index, kept up to date by the item edits
+    index = item.index
+    # if statement.getTarget().amount == new_statement.getTarget().amount:
+    # For a string
+    statements = {id(statement) for statement in index.find(new_statement.getID(), new_statement.getTarget())}
+    if statements:
+        # print('- duplicated:', item.getID(), ':', item.labels['fr'])
+        for pid in new_statement.qualifiers:
+            new_statement_qualifier_claim = new_statement.qualifiers[pid][0]
+            # Same qualifier year
+            year = Time(new_statement_qualifier_claim.getTarget().year)
+            if any(id(statement) in statements for statement in index.find_qualified(new_statement.getID(), pid, year)):
+                print('WARNING: duplicated:', item.id, ':', item.labels['fr'])
+                return True
+    # elif statement.getRank() == 'preferred':
+    #     print('- preferred', item.labels['fr'])
+    #     statement.changeRank('normal')
     return False
 
 
@@ -223,9 +221,10 @@ def main(query=None, summary=None, year=None, to=None, is_last=False, debug=True
             insee_code_claim = Claim(property=insee_code, value=insee_code_value)
 
             # TODO
+            statement_id = None
             if True:  # REPLACE: for None insee code**************************************************************
                 # insee_code_claim = Claim(property=insee_code, value=insee_code_value)
-                insee_code_claim._claim.snak = administrative_division.claims[insee_code][0].snak
+                statement_id = administrative_division.claims[insee_code][0].snak
 
             # if debug:
             #     print(insee_code_claim._claim.toJSON())
@@ -267,19 +266,20 @@ def main(query=None, summary=None, year=None, to=None, is_last=False, debug=True
             insee_code_statement = Statement(claim=insee_code_claim,
                                              rank='normal',
                                              qualifiers=[point_in_time_claim],
-                                             sources=[stated_in_claim, title_claim, publication_date_claim])
+                                             sources=[stated_in_claim, title_claim, publication_date_claim],
+                                             id=statement_id)
             # if debug:
             #     print(insee_code_statement._statement.toJSON())
 
             # Check duplicated target value
-            is_duplicated = check_duplicates(administrative_division, insee_code_statement._statement)
+            administrative_division_item = Item.from_pwb(administrative_division)
+            is_duplicated = check_duplicates(administrative_division_item, insee_code_statement._statement)
             if is_duplicated:
                 continue
 
             if not debug:
                 # pass
                 # add_statement(administrative_division, insee_code_statement, summary=summary)
-                administrative_division_item = Item.from_pwb(administrative_division)
                 administrative_division_item.add_statement(insee_code_statement, summary=summary)
 
             # break
@@ -291,6 +291,8 @@ if __name__ == '__main__':
     # Parse arguments
     args = parse_args()
     print(args.to)
+    # Property datatypes, so that claims are created without fetching them
+    PropertyRepository(snapshot=WIKIDATA_DATATYPES).register()
 
     path = None
     location = 'None'
@@ -6,10 +6,9 @@ from pathlib import Path
 
 import pandas as pd
 
-import pywikibot
-from pywikibot import pagegenerators as pg
-import wikidatabot
-from wikidatabot.models import Claim, Statement, Item
+from wikidatabot.models import Claim, Statement, TermContainer, Time
+from wikidatabot.cache import EntityCache
+from wikidatabot.repository import ItemPywikibotRepository, PropertyRepository, WIKIDATA_DATATYPES
 
 
 logger = logging.getLogger('add_population')
@@ -277,6 +276,7 @@ def parse_args():
     parser.add_argument('--debug', action='store_true')
     parser.add_argument('--check', action='store_true')
     parser.add_argument('--log', default='')
+    parser.add_argument('--cache', default='', help="SQLite entity cache path")
 
     args = parser.parse_args()
     return args
@@ -320,7 +320,7 @@ def get_insee_code(administrative_division, insee_code):
     :param insee_code:
     :return:
     """
-    statements = administrative_division.claims
+    statements = administrative_division.statements
     if insee_code not in statements:
         return
     claims = statements[insee_code]
@@ -339,31 +339,24 @@ def check_duplicated_year(item, new_statement, point_in_time=POINT_IN_TIME):
     # New statement
     new_statement_point_in_time_qualifier_year = new_statement.qualifiers[point_in_time][0].getTarget().year
     new_statement_population_amount = new_statement.getTarget().amount
-    # Item
-    item_statements = item.claims
-    if new_statement.getID() in item_statements:
-        statements = item_statements[new_statement.getID()]
-        for statement in statements:
-            if point_in_time in statement.qualifiers:
-                if not hasattr(statement.qualifiers[point_in_time][0].getTarget(), 'year'):
-                    logger.error(f"Unknown point_in_time format in item {item.labels.get('fr')} ({item.getID()})")
-                    continue
-                statement_point_in_time_qualifier_year = statement.qualifiers[point_in_time][0].getTarget().year
-                if statement_point_in_time_qualifier_year == new_statement_point_in_time_qualifier_year:
-                    statement_population_amount = statement.getTarget().amount
-                    if statement_population_amount == new_statement_population_amount:
-                        logger.warning(f"Duplicated claim: item {item.labels.get('fr')} ({item.getID()}) already "
-                                       f"contains the same population claim")
-                    else:
-                        logger.error(f"Wrong duplicated claim: item {item.labels.get('fr')} ({item.getID()}) already "
-                                     f"contains a population claim for the same year "
-                                     f"({statement_point_in_time_qualifier_year}) but with different population amount "
-                                     f"({statement_population_amount} instead of {new_statement_population_amount})")
-                    return True
-    return False
-
-
-def downgrade_ranks(item, new_statement, from_rank='preferred', to_rank='normal', summary=None):
+    # Item: its cached index, kept up to date by its edits
+    statements = item.index.find_qualified(new_statement.getID(), point_in_time,
+                                      Time(new_statement_point_in_time_qualifier_year))
+    if not statements:
+        return False
+    statement_population_amount = statements[0].getTarget().amount
+    if statement_population_amount == new_statement_population_amount:
+        logger.warning(f"Duplicated claim: item {item.labels.get('fr')} ({item.id}) already "
+                       f"contains the same population claim")
+    else:
+        logger.error(f"Wrong duplicated claim: item {item.labels.get('fr')} ({item.id}) already "
+                     f"contains a population claim for the same year "
+                     f"({new_statement_point_in_time_qualifier_year}) but with different population amount "
+                     f"({statement_population_amount} instead of {new_statement_population_amount})")
+    return True
+
+
+def downgrade_ranks(item, new_statement, from_rank='preferred', to_rank='normal', summary=None, edit=None):
     """
 
     It assumes there is no duplicated.
@@ -372,9 +365,10 @@ def downgrade_ranks(item, new_statement, from_rank='preferred', to_rank='normal'
     :param from_rank:
     :param to_rank:
     :param summary:
+    :param edit: ItemEdit recording the rank changes; if None, each one is persisted at once
     :return:
     """
-    item_statements = item.claims
+    item_statements = item.statements
     if new_statement.getID() in item_statements:
         for statement in item_statements[new_statement.getID()]:
             # if statement.getTarget().amount == new_statement.getTarget().amount:
@@ -382,13 +376,16 @@ def downgrade_ranks(item, new_statement, from_rank='preferred', to_rank='normal'
             #     return True
             if statement.getRank() == from_rank:
                 # print('- ' + from_rank, item.labels['fr'])
-                logger.info(f"Downgrade rank: from rank {from_rank} in item {item.labels.get('fr')} ({item.getID()})")
-                statement.changeRank(to_rank, summary=summary)
+                logger.info(f"Downgrade rank: from rank {from_rank} in item {item.labels.get('fr')} ({item.id})")
+                if edit is not None:
+                    edit.change_rank(statement, to_rank)
+                else:
+                    statement.changeRank(to_rank, summary=summary)
 
 
 def main(query=None, summary=None, population_date=None, stated_in=None,
          source_title=None, source_language=None, publication_date=None,
-         year=None, at=None, to=None, is_last=False, debug=DEBUG, params=None):
+         year=None, at=None, to=None, is_last=False, debug=DEBUG, params=None, cache=None):
 
     if year is None or to is None:
         return
@@ -397,16 +394,15 @@ def main(query=None, summary=None, population_date=None, stated_in=None,
     to_population_value = load_data(**params)
 
     # Create item generator
-    administrative_divisions = pg.WikidataSPARQLPageGenerator(query, site=wikidatabot.site)
+    items = ItemPywikibotRepository(cache=cache).list(query)
 
     # Iterate over administrative divisions (items)
-    for i, administrative_division in enumerate(administrative_divisions):
-        administrative_division.get()
+    for i, administrative_division in enumerate(items):
         administrative_division_label = administrative_division.labels.get('fr')
         if not administrative_division_label:
-            logger.warning(f"No fr label: item {administrative_division.getID()}")
-            administrative_division_label = administrative_division.getID()
-        # logger.info(f"Item {i + 1}: {administrative_division_label} ({administrative_division.getID()})")
+            logger.warning(f"No fr label: item {administrative_division.id}")
+            administrative_division_label = administrative_division.id
+        # logger.info(f"Item {i + 1}: {administrative_division_label} ({administrative_division.id})")
 
         # Get insee_code from item
         insee_code = get_insee_code(administrative_division, params['insee_code'])
@@ -415,12 +411,12 @@ def main(query=None, summary=None, population_date=None, stated_in=None,
         if insee_code not in to_population_value:
             # Wikidata entity wrongly stated as instance of this type of administrative division
             logger.error(f"Missing INSEE code: population file does not contain INSSE code {insee_code}, which is "
-                         f"present in item {administrative_division_label} ({administrative_division.getID()})")
+                         f"present in item {administrative_division_label} ({administrative_division.id})")
             continue
         else:
             # logger.info(f"Found INSEE code: population file contains INSEE code {insee_code}, which is present in "
-            #             f"item {administrative_division_label} ({administrative_division.getID()})")
-            logger.info(f"Item: {administrative_division_label} ({administrative_division.getID()}) with INSEE code {insee_code}")
+            #             f"item {administrative_division_label} ({administrative_division.id})")
+            logger.info(f"Item: {administrative_division_label} ({administrative_division.id}) with INSEE code {insee_code}")
 
         # Create population claim
         population_value = to_population_value.pop(insee_code)
@@ -455,16 +451,15 @@ def main(query=None, summary=None, population_date=None, stated_in=None,
         if is_duplicated:
             continue
 
-        # Downgrade rank of the other analogue statements
-        if is_last and not debug:  # and not is_duplicated
-            downgrade_ranks(administrative_division, population_statement._statement, summary=summary)
-
-        # Add statement
         if not debug:
-            # pass
-            # add_statement(administrative_division, insee_code_statement, summary=summary)
-            administrative_division_item = Item.from_pwb(administrative_division)
-            administrative_division_item.add_statement(population_statement, summary=summary)
+            # Rank changes and new statement in a single edit
+            with administrative_division.edit(summary=summary) as edit:
+                # Downgrade rank of the other analogue statements
+                if is_last:  # and not is_duplicated
+                    downgrade_ranks(administrative_division, population_statement._statement, edit=edit)
+                # Add statement
+                # add_statement(administrative_division, insee_code_statement, summary=summary)
+                edit.add_statement(population_statement)
         else:
             # print(population_statement._statement, summary)
             if i >= 20:
@@ -531,6 +526,10 @@ if __name__ == '__main__':
     # Parse arguments
     args = parse_args()
     logger.info(args.to)
+    # Property datatypes, so that claims are created without fetching them
+    PropertyRepository(snapshot=WIKIDATA_DATATYPES).register()
+    # Only the terms in the languages used are kept
+    TermContainer.default_languages = frozenset({'fr'})
 
     # if args.check:
     #     # Set check variables
@@ -608,6 +607,7 @@ if __name__ == '__main__':
          summary=summary,
          population_date=population_date, stated_in=stated_in,
          source_title=source_title, source_language=source_language, publication_date=publication_date,
-         params=params
+         params=params,
+         cache=EntityCache(args.cache) if args.cache else None
          )
     logger.info(f"END add_population")
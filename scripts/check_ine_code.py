@@ -3,6 +3,8 @@
 python ./scripts/check_ine_code.py -y 2019 --debug
 
 python ./scripts/check_ine_code.py -y 2019 --log logs/check_ine_code-0.log
+
+python ./scripts/check_ine_code.py -y 2019 --dump D:/data/wikidata/latest-all.json.gz
 """
 import argparse
 import logging
@@ -10,9 +12,9 @@ from pathlib import Path
 
 import pandas as pd
 
-from pywikibot import pagegenerators as pg
-import wikidatabot
-from wikidatabot.models import Claim, Statement, Item
+from wikidatabot.models import Claim, Statement
+from wikidatabot.cache import EntityCache
+from wikidatabot.repository import ItemDumpRepository, ItemPywikibotRepository
 
 
 logger = logging.getLogger("check_ine_code")
@@ -88,6 +90,8 @@ def parse_args():
     parser.add_argument('-t', '--to', default=MUNICIPALITY_OF_SPAIN)
     parser.add_argument('-y', '--year', required=True)
     parser.add_argument('--log', default='')
+    parser.add_argument('--cache', default='', help="SQLite entity cache path")
+    parser.add_argument('--dump', default='', help="Wikidata JSON dump path, to check offline")
     parser.add_argument('--debug', action='store_true')
     return parser.parse_args()
 
@@ -122,6 +126,23 @@ def load_data(path=''):
     return to_value
 
 
+def is_administrative_division(entity, administrative_divisions, year):
+    """Check the entity JSON of a dump as QUERY does."""
+    date = f"+{year}-01-01T00:00:00Z"
+    for statement in entity.get('claims', {}).get(INSTANCE_OF, []):
+        value = statement['mainsnak'].get('datavalue', {}).get('value', {})
+        if value.get('id') not in administrative_divisions:
+            continue
+        qualifiers = statement.get('qualifiers', {})
+        start_times = [qualifier['datavalue']['value']['time']
+                       for qualifier in qualifiers.get(START_TIME, []) if 'datavalue' in qualifier]
+        end_times = [qualifier['datavalue']['value']['time']
+                     for qualifier in qualifiers.get(END_TIME, []) if 'datavalue' in qualifier]
+        if all(start_time <= date for start_time in start_times) and all(end_time > date for end_time in end_times):
+            return True
+    return False
+
+
 def get_ine_code(item, ine_code):
     statements = item.statements
     if ine_code not in statements:
@@ -130,7 +151,8 @@ def get_ine_code(item, ine_code):
     if len(claims) > 1:
         logger.warning(f"Multiple INE codes for item {item.id}")
     for claim in claims:
-        ine_code_value = claim.getTarget()
+        # Statements of a dump item; else pywikibot claims
+        ine_code_value = claim.claim.value if isinstance(claim, Statement) else claim.getTarget()
         # print(insee_code_value)
         # TODO: many values? get preferred rank?
         if claim.rank == 'preferred':
@@ -167,18 +189,25 @@ if __name__ == '__main__':
     query = query.replace('{values}', values)
 
     # Create item generator
-    pwb_items = pg.WikidataSPARQLPageGenerator(query, site=wikidatabot.site)
+    if args.dump:
+        administrative_divisions = params['administrative_division']
+        if isinstance(administrative_divisions, str):
+            administrative_divisions = [administrative_divisions]
+        items = ItemDumpRepository(args.dump).list(
+            lambda entity: is_administrative_division(entity, administrative_divisions, args.year),
+            properties=[INE_MUNICIPALITY_CODE], languages=[])
+    else:
+        cache = EntityCache(args.cache) if args.cache else None
+        # Only the INE code is checked
+        items = ItemPywikibotRepository(cache=cache).list(query, properties=[INE_MUNICIPALITY_CODE], languages=[])
 
     # Iterate over administrative divisions (items)
     used_ine_codes = {}
-    for i, pwb_item in enumerate(pwb_items):
+    for i, item in enumerate(items):
         # pwb_item = wikidatabot.pywikibot.ItemPage(wikidatabot.repo, 'Q764858')
         # pwb_item = wikidatabot.pywikibot.ItemPage(wikidatabot.repo, 'Q43781672')
         # logger.info(pwb_item)
-        pwb_item.get()
-        # pwb_item_id = pwb_item.getID()
-        logger.info(f"Item: {pwb_item.getID()}")
-        item = Item.from_pwb(pwb_item)
+        logger.info(f"Item: {item.id}")
 
         ine_code = get_ine_code(item, INE_MUNICIPALITY_CODE)
         if not ine_code:
@@ -13,23 +13,33 @@ TEST:
 """
 import argparse
 import datetime
+import json
 import logging
+from pathlib import Path
 import re
+import time
 from collections import defaultdict
 
 import pywikibot as pw
 from pywikibot import pagegenerators as pg
+from pywikibot.backports import batched
+from pywikibot.data.sparql import SparqlQuery
 import wikidatabot
-from wikidatabot.models import Claim, Statement, Item
+from wikidatabot.cache import LinkCache
+from wikidatabot.models import Claim, Statement, Source, SourceContainer, is_time, time_key, time_refines
+from wikidatabot.repository import (CachedItemRepository, ItemPywikibotRepository, PropertyRepository,
+                                    WIKIDATA_DATATYPES)
 
 
 logger = logging.getLogger("transfer_infotable")
 
 
-CA_SITE = pw.Site('ca', 'wikipedia')
-EN_SITE = pw.Site('en', 'wikipedia')
-ES_SITE = pw.Site('es', 'wikipedia')
-GL_SITE = pw.Site('gl', 'wikipedia')
+CA_SITE = wikidatabot.lazy_site('ca', 'wikipedia')
+EN_SITE = wikidatabot.lazy_site('en', 'wikipedia')
+ES_SITE = wikidatabot.lazy_site('es', 'wikipedia')
+GL_SITE = wikidatabot.lazy_site('gl', 'wikipedia')
+
+ITEMS = CachedItemRepository(ItemPywikibotRepository(), maxsize=10000)
 
 # Constants
 
@@ -64,6 +74,7 @@ DIOCESE = 'P708'
 IMPORTED_FROM_WIKIMEDIA_PROJECT = 'P143'
 CATALAN_WIKIPEDIA = 'Q199693'
 RETRIEVED = 'P813'
+IMPORTED_FROM_CATALAN_WIKIPEDIA = Source(property=IMPORTED_FROM_WIKIMEDIA_PROJECT, item=CATALAN_WIKIPEDIA)
 
 # Utils to find position from organization
 OFFICE_HELD_BY_HEAD_OF_GOVERNMENT = 'P1313'
@@ -71,6 +82,13 @@ OFFICE_HELD_BY_HEAD_OF_THE_ORGANIZATION = 'P2388'
 OFFICE_HELD_BY_HEAD_OF_STATE = 'P1906'
 HAS_PART = 'P527'
 HAS_PARTS_OF_THE_CLASS = 'P2670'
+# Properties resolving an organization to an item: the value of the first one with statements
+OFFICE_HELD_BY_HEAD = (OFFICE_HELD_BY_HEAD_OF_GOVERNMENT, OFFICE_HELD_BY_HEAD_OF_THE_ORGANIZATION)
+OFFICE_HELD_BY_HEAD_OF_STATE_ONLY = (OFFICE_HELD_BY_HEAD_OF_STATE,)
+OFFICE_HELD_BY_HEAD_OF_STATE_OR_ORGANIZATION = (OFFICE_HELD_BY_HEAD_OF_STATE, OFFICE_HELD_BY_HEAD_OF_THE_ORGANIZATION)
+PART = (HAS_PART, HAS_PARTS_OF_THE_CLASS)
+ORGANIZATION_RESOLUTIONS = [OFFICE_HELD_BY_HEAD, OFFICE_HELD_BY_HEAD_OF_STATE_ONLY,
+                            OFFICE_HELD_BY_HEAD_OF_STATE_OR_ORGANIZATION, PART]
 
 # Utils to find position from list
 IS_A_LIST_OF = 'P360'
@@ -470,6 +488,14 @@ TO_MONTH_NUMBER = {
 def parse_args():
     parser = argparse.ArgumentParser(description="Transfer infotable")
     parser.add_argument('--log', default='')
+    parser.add_argument('--redirects', default='', help="JSON path to persist the template redirects")
+    parser.add_argument('--redirects-ttl', type=float, default=24 * 60 * 60,
+                        help="Seconds the persisted template redirects are reused")
+    parser.add_argument('--links', default='', help="SQLite path to persist the resolution of page links")
+    parser.add_argument('--links-ttl', type=float, default=30 * 24 * 60 * 60,
+                        help="Seconds the persisted resolved page links are reused")
+    parser.add_argument('--missing-links-ttl', type=float, default=24 * 60 * 60,
+                        help="Seconds the persisted missing page links are reused")
     parser.add_argument('--debug', action='store_true')
     return parser.parse_args()
 
@@ -501,17 +527,57 @@ def create_generator(category='Categoria:Articles amb càrrecs manuals i P39', g
     return pg.PreloadingGenerator(pages, groupsize=groupsize)
 
 
-def parse_infotable(page, infotable="Infotaula persona"):
-    def get_redirects(title):
-        temp = pw.Page(CA_SITE, title, ns=10)
+class TemplateRedirects:
+    """Registry of the (lowercased) names of templates: each template and its redirects.
+
+    The names of a template are fetched once, and kept for ttl seconds (forever if None). If path is given, they are
+    persisted there as JSON, so that they are reused across runs.
+    """
+    def __init__(self, site=CA_SITE, path=None, ttl=None):
+        self.site = site
+        self.path = Path(path) if path else None
+        self.ttl = ttl
+        self._names = {}  # title: (names, fetched_at)
+        if self.path is not None and self.path.exists():
+            self._names = {title: (frozenset(names), fetched_at)
+                           for title, (names, fetched_at) in json.loads(self.path.read_text(encoding='utf-8')).items()}
+
+    def get(self, *titles):
+        """Return the names of the templates of titles and of their redirects."""
+        names = set()
+        for title in titles:
+            title = title.replace('_', ' ')
+            entry = self._names.get(title)
+            if entry is None or (self.ttl is not None and time.time() - entry[1] > self.ttl):
+                entry = self._names[title] = (self._fetch(title), time.time())
+                self.save()
+            names.update(entry[0])
+        return frozenset(names)
+
+    def _fetch(self, title):
+        temp = pw.Page(self.site, title, ns=10)
         if temp.isRedirectPage():
             temp = temp.getRedirectTarget()
         titles = [page.title(with_ns=False).lower()
                   for page in temp.getReferences(filter_redirects=True, namespaces=[10], follow_redirects=False)]
         titles.append(temp.title(with_ns=False).lower())
-        return titles
-    infotable = infotable.replace('_', ' ')
-    infotables = get_redirects(infotable)
+        return frozenset(titles)
+
+    def save(self):
+        if self.path is not None:
+            self.path.write_text(json.dumps({title: [sorted(names), fetched_at]
+                                             for title, (names, fetched_at) in self._names.items()}),
+                                 encoding='utf-8')
+
+
+TEMPLATE_REDIRECTS = TemplateRedirects()
+
+
+def parse_infotable(page, infotable="Infotaula persona"):
+    """Return the parameters of the first infotable (or any of several, if a list of names) in the page."""
+    if isinstance(infotable, str):
+        infotable = [infotable]
+    infotables = TEMPLATE_REDIRECTS.get(*infotable)
     templates = pw.textlib.extract_templates_and_params(page.text, True, True)
     for template_name, template_params in templates:
         if template_name.lower() in infotables:
@@ -575,37 +641,177 @@ def parse_link(link):
     return link_target, link_label
 
 
-def get_page_from_link(link, langs=None):
-    if not langs:
-        langs = ['ca', 'es', 'gl', 'en']
-    sites = {'ca': CA_SITE, 'es': ES_SITE, 'gl': GL_SITE, 'en': EN_SITE}
-    logger.info(f"Get page from link {link}")
-    for lang in langs:
-        site = sites[lang]
-        page = pw.Page(pw.Link(link, source=site))
+class LinkResolver:
+    """Resolver of page links to existing Wikipedia pages, trying the sites of several languages in order.
+
+    Links are resolved in bulk: for each language, one query request (following redirects) per group of titles, and
+    the links not found fall through to the next language. Before batching, links are normalized as page titles of
+    the site they point to (see normalize), so that variants of a link share a request and a cache entry. Results,
+    and the QIDs of the pages once known, are memoized and, if a LinkCache is given, persisted across runs.
+    """
+    LANGS = ['ca', 'es', 'gl', 'en']
+
+    def __init__(self, sites=None, groupsize=50, cache: LinkCache = None):
+        self.sites = sites if sites is not None else {'ca': CA_SITE, 'es': ES_SITE, 'gl': GL_SITE, 'en': EN_SITE}
+        self.groupsize = groupsize
+        self.cache = cache
+        self._resolved = {}  # (lang, title): (resolved title, page id), or None if missing
+        self._qids = {}  # (lang, resolved title): QID
+
+    def normalize(self, link, lang):
+        """Return the (lang, title) of the page a link points to from the site of lang: following its interwiki or
+        language prefix, without its section and with its namespace and first letter normalized. None if it is not
+        a valid title or points to a site other than those of the resolver.
+        """
         try:
-            if page.isRedirectPage():
-                page = page.getRedirectTarget()
-            if page.exists():
-                logger.info(f"Found Wikipedia page from {lang} page link {link}: {page}")
-                return page
-        except Exception as e:
-            logger.error(f"Exception {type(e)}: {e}")
+            parsed = pw.Link(link.replace('_', ' ').strip(), source=self.sites[lang])
+            site, title = parsed.site, parsed.canonical_title()
+        except (pw.exceptions.InvalidTitleError, pw.exceptions.SiteDefinitionError) as e:
+            logger.warning(f"Invalid page link {link}: {e}")
             return
-        else:
-            logger.warning(f"No Wikipedia page from {lang} page link {link}")
-    logger.error(f"No Wikipedia page from (ca, es, gl, en) page links: {link}")
+        return next(((site_lang, title) for site_lang, lang_site in self.sites.items() if lang_site == site), None)
+
+    def resolve(self, links, langs=None):
+        """Return the page of each link (None if not found in any language)."""
+        links = list(dict.fromkeys(links))
+        pages = dict.fromkeys(links)
+        pending = links
+        for lang in langs or self.LANGS:
+            targets = {link: self.normalize(link, lang) for link in pending}
+            targets = {link: target for link, target in targets.items() if target is not None}
+            titles = defaultdict(set)
+            for target_lang, title in targets.values():
+                titles[target_lang].add(title)
+            for target_lang, target_titles in titles.items():
+                self._fetch(target_lang, target_titles)
+            unresolved = []
+            for link, (target_lang, title) in targets.items():
+                resolved = self._resolved[target_lang, title]
+                if resolved is None:
+                    unresolved.append(link)
+                    continue
+                title, page_id = resolved
+                page = pages[link] = pw.Page(self.sites[target_lang], title)
+                # Known to exist: not fetched again
+                page._pageid = page_id
+            pending = unresolved
+            if not pending:
+                break
+        return pages
+
+    def get_qid(self, page):
+        """Return the QID of the item of a resolved page, if known."""
+        key = (page.site.code, page.title())
+        if key not in self._qids and self.cache is not None:
+            qid = self.cache.get_qid(*key)
+            if qid:
+                self._qids[key] = qid
+        return self._qids.get(key)
+
+    def set_qid(self, page, qid):
+        key = (page.site.code, page.title())
+        self._qids[key] = qid
+        if self.cache is not None:
+            self.cache.set_qid(*key, qid)
+
+    def _fetch(self, lang, titles):
+        titles = sorted(title for title in titles if (lang, title) not in self._resolved)
+        if self.cache is not None:
+            cached = self.cache.get_many(lang, titles)
+            self._resolved.update(((lang, title), resolved) for title, resolved in cached.items())
+            titles = [title for title in titles if title not in cached]
+        for batch in batched(titles, self.groupsize):
+            data = self.sites[lang].simple_request(action='query', titles=batch, redirects=True).submit()
+            resolved = self.parse_query(batch, data.get('query', {}))
+            self._resolved.update(((lang, title), entry) for title, entry in resolved.items())
+            if self.cache is not None:
+                self.cache.put_many(lang, resolved)
+
+    @staticmethod
+    def parse_query(titles, query):
+        """Return the (resolved title, page id) of each title in a query response; None if missing."""
+        normalized = {normalization['from']: normalization['to'] for normalization in query.get('normalized', [])}
+        redirects = {redirect['from']: redirect['to'] for redirect in query.get('redirects', [])}
+        pages = query.get('pages', [])
+        if isinstance(pages, dict):
+            pages = pages.values()
+        page_ids = {page['title']: page['pageid'] for page in pages if 'missing' not in page and 'invalid' not in page}
+        resolved = {}
+        for title in titles:
+            target = normalized.get(title, title)
+            followed = {target}
+            while target in redirects and redirects[target] not in followed:
+                target = redirects[target]
+                followed.add(target)
+            resolved[title] = (target, page_ids[target]) if target in page_ids else None
+        return resolved
+
+
+LINKS = LinkResolver()
 
 
-def get_item_from_page(page):
-    logger.info(f"Get item from page {page}")
+def get_page_from_link(link, langs=None):
+    logger.info(f"Get page from link {link}")
     try:
-        item = pw.ItemPage.fromPage(page)
-    except pw.NoPage:
-        logger.error(f"No Wikidata item from page: {page}")
+        page = LINKS.resolve([link], langs=langs)[link]
+    except Exception as e:
+        logger.error(f"Exception {type(e)}: {e}")
         return
-    logger.info(f"Found Wikidata item from page {page}: {item}")
-    return item
+    if page is None:
+        logger.error(f"No Wikipedia page from ({', '.join(langs or LINKS.LANGS)}) page links: {link}")
+        return
+    logger.info(f"Found Wikipedia page from {page.site.code} page link {link}: {page}")
+    return page
+
+
+def prefetch_links(positions):
+    """Resolve all the page links of the positions at once (see LinkResolver), and get the items of their pages at
+    once too: by QID those whose QID is known and are not cached yet (see CachedItemRepository.get_many), and the
+    others by page (see ItemPywikibotRepository.get_many_from_pages). Then all of them are resolved as organizations
+    at once (see OrganizationResolutions.warm).
+    """
+    links = [match[0].strip() for position in positions for value in position.values()
+             for match in LINK_REGEX.findall(value) if not match[0].strip().startswith("Fitxer:")]
+    try:
+        pages = [(page, LINKS.get_qid(page)) for page in LINKS.resolve(links).values() if page is not None]
+        qids = [qid for page, qid in pages if qid]
+        # Only the uncached ones are fetched
+        for _ in ITEMS.get_many(qids):
+            pass
+        pages = [page for page, qid in pages if not qid]
+        items = ITEMS.repository.get_many_from_pages(pages)
+    except Exception as e:
+        logger.error(f"Exception {type(e)}: {e}")
+        return
+    for page in pages:
+        item = items.get((page.site.dbName(), page.title()))
+        if item is not None:
+            ITEMS.put(item)
+            LINKS.set_qid(page, item.id)
+            qids.append(item.id)
+    # Once per batch, with the QIDs just resolved too
+    try:
+        ORGANIZATIONS.warm(qids)
+    except Exception as e:
+        logger.error(f"Exception {type(e)}: {e}")
+
+
+def get_item_from_page(page):
+    logger.info(f"Get item from page {page}")
+    qid = LINKS.get_qid(page)
+    if qid:
+        item = ITEMS.get(qid)
+    else:
+        try:
+            # Concurrent lookups of the same page share a single fetch
+            item = ITEMS.repository.get_from_page(page)
+        except pw.exceptions.NoPageError:
+            logger.error(f"No Wikidata item from page: {page}")
+            return
+        ITEMS.put(item)
+        LINKS.set_qid(page, item.id)
+    logger.info(f"Found Wikidata item from page {page}: {item._item}")
+    return item._item
 
 
 def get_item_from_page_link(link, langs=None):
@@ -622,7 +828,7 @@ def get_item_from_id(item_id):
     logger.info(f"Get item from id {item_id}")
     try:
         pwb_item = pw.ItemPage(wikidatabot.repo, item_id)
-    except pw.NoPage:
+    except pw.exceptions.NoPageError:
         logger.error(f"No Wikidata item from id {item_id}")
         return
     logger.info(f"Found Wikidata item from id {item_id}")
@@ -630,8 +836,8 @@ def get_item_from_id(item_id):
 
 
 def fetch_item(pwb_item):
-    _ = pwb_item.get()
-    return pwb_item
+    # Positions, organizations and constituencies recur across pages: cached
+    return ITEMS.get(pwb_item.id)._item
 
 
 # def get_item(page):
@@ -646,6 +852,104 @@ def fetch_item(pwb_item):
 #     return item
 
 
+class OrganizationResolutions:
+    """Memo of the resolutions of organizations to an item: the value of the first of some properties (e.g.
+    OFFICE_HELD_BY_HEAD) with statements in the organization item, keyed by (organization QID, properties).
+
+    Failures are memoized too, as the error: 'none' if no statement, 'several' if more than one value. warm resolves
+    many organizations at once with a single SPARQL query. Both count the same statements: all of them, whatever
+    their rank, including those with unknown value or no value (as a None value).
+    """
+    QUERY = """
+SELECT ?organization ?property ?value WHERE {
+  VALUES ?organization { {organizations} }
+  VALUES (?property ?p ?ps) { {properties} }
+  ?organization ?p ?statement .
+  OPTIONAL { ?statement ?ps ?value }
+}
+"""
+
+    def __init__(self, repo=wikidatabot.repo):
+        self.repo = repo
+        self._resolved = {}  # (organization QID, properties): (value QID, error)
+
+    def get(self, organization_id, properties):
+        """Return the memoized (value QID, error) of the organization, or None if not resolved yet."""
+        return self._resolved.get((organization_id, properties))
+
+    def resolve(self, organization_item, properties):
+        """Return the (value QID, error) of the organization item; memoized."""
+        key = (organization_item.id, properties)
+        if key not in self._resolved:
+            values = {property: [getattr(claim.getTarget(), 'id', None) for claim in claims]
+                      for property, claims in organization_item.claims.items() if property in properties}
+            self._resolved[key] = self._choose(values, properties)
+        return self._resolved[key]
+
+    def warm(self, organization_ids, resolutions=None):
+        """Resolve the organizations not resolved yet with a single SPARQL query, for all the resolutions (by default
+        ORGANIZATION_RESOLUTIONS).
+        """
+        resolutions = resolutions or ORGANIZATION_RESOLUTIONS
+        organization_ids = [organization_id for organization_id in dict.fromkeys(organization_ids)
+                            if any((organization_id, properties) not in self._resolved for properties in resolutions)]
+        if not organization_ids:
+            return
+        properties = sorted({property for properties in resolutions for property in properties})
+        query = (self.QUERY
+                 .replace('{organizations}', ' '.join(f"wd:{organization_id}" for organization_id in organization_ids))
+                 .replace('{properties}', ' '.join(f'("{property}" p:{property} ps:{property})'
+                                                   for property in properties)))
+        results = SparqlQuery(repo=self.repo).select(query)
+        if results is None:
+            # Failed: not memoized, resolved one by one instead
+            logger.error(f"Failed warming the resolutions of organizations {', '.join(organization_ids)}")
+            return
+        values = defaultdict(lambda: defaultdict(list))  # organization QID: property: value QIDs
+        for result in results:
+            # None if no value (unbound) or unknown value (blank node)
+            value = result['value']
+            value = value.rsplit('/', 1)[-1] if value and value.startswith('http://www.wikidata.org/entity/') else None
+            values[result['organization'].rsplit('/', 1)[-1]][result['property']].append(value)
+        for organization_id in organization_ids:
+            for properties in resolutions:
+                self._resolved.setdefault((organization_id, properties),
+                                          self._choose(values[organization_id], properties))
+
+    @staticmethod
+    def _choose(values, properties):
+        for property in properties:
+            if values.get(property):
+                if len(values[property]) > 1:
+                    return None, 'several'
+                return values[property][0], None
+        return None, 'none'
+
+
+ORGANIZATIONS = OrganizationResolutions()
+
+
+def get_organization_value(page, properties, name="office held by head"):
+    """Return the item resolving the organization of page with properties (see OrganizationResolutions)."""
+    organization_id = LINKS.get_qid(page)
+    resolved = ORGANIZATIONS.get(organization_id, properties) if organization_id else None
+    if resolved is None:
+        organization_item = get_item_from_page(page)
+        if not organization_item:
+            logger.error(f"No organization item found from page {page}")
+            return
+        organization_id = organization_item.id
+        resolved = ORGANIZATIONS.resolve(organization_item, properties)
+    value_id, error = resolved
+    if error == 'several':
+        logger.error(f"More than one {name} found for item {organization_id}")
+        return
+    elif error == 'none':
+        logger.error(f"No {name} found for item {organization_id}")
+        return
+    return pw.ItemPage(wikidatabot.repo, value_id) if value_id else None
+
+
 def get_office_held_by_head_from_page(page, of=None):
     logger.info(f"Get office held by head from page {page}")
     if not page:
@@ -653,26 +957,7 @@ def get_office_held_by_head_from_page(page, of=None):
         return
     if page.title().lower().startswith("llista"):
         logger.warning(f"Link is a list")
-    organization_item = get_item_from_page(page)
-    if not organization_item:
-        logger.error(f"No organization item found from page {page}")
-        return
-    if of == 'state':
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_STATE)
-    else:
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_GOVERNMENT)
-        if not office_claims:
-            office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_THE_ORGANIZATION)
-    if office_claims:
-        if len(office_claims) == 1:
-            position_item = office_claims[0].getTarget()  # .id
-        else:
-            logger.error(f"More than one office held by head found for item {organization_item}")
-            return
-    else:
-        logger.error(f"No office held by head found for item {organization_item}")
-        return
-    return position_item
+    return get_organization_value(page, OFFICE_HELD_BY_HEAD_OF_STATE_ONLY if of == 'state' else OFFICE_HELD_BY_HEAD)
 
 
 def get_office_held_by_head_from_link(link, of=None):
@@ -682,26 +967,11 @@ def get_office_held_by_head_from_link(link, of=None):
         return
     if link.lower().startswith("llista"):
         logger.warning(f"Link is a list")
-    organization_item = get_item_from_page_link(link)
-    if not organization_item:
+    page = get_page_from_link(link)
+    if not page:
         logger.error(f"No organization item found from link {link}")
         return
-    if of == 'state':
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_STATE)
-    else:
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_GOVERNMENT)
-        if not office_claims:
-            office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_THE_ORGANIZATION)
-    if office_claims:
-        if len(office_claims) == 1:
-            position_item = office_claims[0].getTarget()  # .id
-        else:
-            logger.error(f"More than one office held by head found for item {organization_item}")
-            return
-    else:
-        logger.error(f"No office held by head found for item {organization_item}")
-        return
-    return position_item
+    return get_organization_value(page, OFFICE_HELD_BY_HEAD_OF_STATE_ONLY if of == 'state' else OFFICE_HELD_BY_HEAD)
 
 
 def get_office_held_by_head(organization_page, head_of=None, from_list_of=None, prepend_to_list_of=None):
@@ -723,27 +993,9 @@ def get_office_held_by_head(organization_page, head_of=None, from_list_of=None,
         if not organization_page:
             logger.error(f"No organization page from list link: {organization_page}")
             return
-    # Organization item
-    organization_item = get_item_from_page(organization_page)
-    if not organization_item:
-        logger.error(f"No organization item found from organization: {organization_page}")
-        return
-    if head_of == 'state':
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_STATE)
-    else:
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_GOVERNMENT)
-    if not office_claims:
-        office_claims = organization_item.claims.get(OFFICE_HELD_BY_HEAD_OF_THE_ORGANIZATION)
-    if office_claims:
-        if len(office_claims) == 1:
-            position_item = office_claims[0].getTarget()  # .id
-        else:
-            logger.error(f"More than one office held by head found for item {organization_item}")
-            return
-    else:
-        logger.error(f"No office held by head found for item {organization_item}")
-        return
-    return position_item
+    return get_organization_value(
+        organization_page,
+        OFFICE_HELD_BY_HEAD_OF_STATE_OR_ORGANIZATION if head_of == 'state' else OFFICE_HELD_BY_HEAD)
 
 
 def get_has_part_from_link(link):
@@ -753,23 +1005,11 @@ def get_has_part_from_link(link):
         return
     if link.lower().startswith("llista"):
         logger.warning(f"Link is a list")
-    organization_item = get_item_from_page_link(link)
-    if not organization_item:
+    page = get_page_from_link(link)
+    if not page:
         logger.error(f"No organization item found from link {link}")
         return
-    part_claims = organization_item.claims.get(HAS_PART)
-    if not part_claims:
-        part_claims = organization_item.claims.get(HAS_PARTS_OF_THE_CLASS)
-    if part_claims:
-        if len(part_claims) == 1:
-            position_item = part_claims[0].getTarget()  # .id
-        else:
-            logger.error(f"More than one part found for item {organization_item}")
-            return
-    else:
-        logger.error(f"No part found for item {organization_item}")
-        return
-    return position_item
+    return get_organization_value(page, PART, name="part")
 
 
 def parse_date(value):
@@ -1338,7 +1578,7 @@ def create_position_statements(positions):
             return
         statements.append((position_claim, qualifiers))
     # Create sources
-    sources = [Claim(property=IMPORTED_FROM_WIKIMEDIA_PROJECT, item=CATALAN_WIKIPEDIA)]
+    sources = [IMPORTED_FROM_CATALAN_WIKIPEDIA]
     today = datetime.datetime.now(datetime.timezone.utc)
     today = {'year': today.year, 'month': today.month, 'day': today.day}
     retrieved_claim = Claim(property=RETRIEVED, **today)
@@ -1351,101 +1591,77 @@ def create_position_statements(positions):
 
 def get_main_item(page):
     item = get_item_from_page(page)
-    item = Item.from_pwb(item)
+    # Cached Item: refreshed by its edits, so that it is up to date when later fetched as position value
+    item = ITEMS.get(item.id)
     logger.info(f"Main item {item.id} from page: {page}")
     return item
 
 
 def add_statements(item, statements, summary=''):
     logger.info("Try to add new statements to main item")
-    for statement in statements:
-        add_statement(item, statement, summary=summary)
+    # All the changes to the item are committed in a single edit
+    with item.edit(summary=summary) as edit:
+        for statement in statements:
+            add_statement(item, statement, edit)
 
 
-def add_statement(item, new_statement, summary=''):
+def add_statement(item, new_statement, edit):
     logger.info(f"Try to add new statement: {new_statement.claim.value.id}")
-    duplicated = check_duplicate(item, new_statement, summary=summary)
+    duplicated = check_duplicate(item, new_statement, edit)
     if not duplicated:
         logger.info(f"Add statement: {new_statement.claim.value.id}")
-        item.add_statement(new_statement, summary=summary)
+        edit.add_statement(new_statement)
 
 
-def check_duplicate(item, new_statement, summary=''):
+def check_duplicate(item, new_statement, edit):
     logger.info("Check if new statement is duplicated in main item")
-    # pwb_item = item._item
-    # pwb_new_statement = new_statement._statement
     # New statement
     new_statement_claim_property = new_statement.claim.property
     new_statement_claim_id = new_statement.claim.value.id
-    # Item
-    if new_statement_claim_property in item.statements:
-        statements = item.statements[new_statement_claim_property]
-        for statement in statements:
-            if new_statement_claim_id == statement.target.id:
-                logger.warning(f"Equal position value {new_statement_claim_id} already exists for item {item.id}")
-                # TODO: Additional equality conditions
-                if not new_statement.qualifiers:
-                    logger.info(f"Do not add statement: duplicated position values without qualifiers")
-                    return True
-                common_qualifier_properties = set(statement.qualifiers.keys()).intersection(
-                    {new_statement_qualifier.property for new_statement_qualifier in new_statement.qualifiers})
-                if not common_qualifier_properties:
-                    # Add new qualifiers
-                    logger.info(f"Item position does not contain any of the new statement qualifiers")
-                    add_qualifiers(statement, new_statement, summary=summary)
-                    return True
-                else:
-                    equal_qualifiers = True
-                    for new_statement_qualifier in new_statement.qualifiers:
-                        if new_statement_qualifier.property in common_qualifier_properties:
-                            if hasattr(new_statement_qualifier.value, 'id'):
-                                new_statement_qualifier_value = new_statement_qualifier.value.id
-                            elif hasattr(new_statement_qualifier.value, 'precision'):
-                                new_statement_qualifier_value = {'year': new_statement_qualifier.value.year}
-                                if new_statement_qualifier.value.precision >= 10:
-                                    new_statement_qualifier_value['month'] = new_statement_qualifier.value.month
-                                if new_statement_qualifier.value.precision >= 11:
-                                    new_statement_qualifier_value['day'] = new_statement_qualifier.value.day
-                            else:
-                                new_statement_qualifier_value = new_statement_qualifier.value
-                            equal_qualifier = False  # if any True:
-                            for claim in statement.qualifiers[new_statement_qualifier.property]:
-                                if hasattr(claim.target, 'id'):
-                                    statement_qualifier_value = claim.target.id
-                                elif hasattr(claim.target, 'precision'):
-                                    statement_qualifier_value = {'year': claim.target.year}
-                                    if claim.target.precision >= 10:
-                                        statement_qualifier_value['month'] = claim.target.month
-                                    if claim.target.precision >= 11:
-                                        statement_qualifier_value['day'] = claim.target.day
-                                else:
-                                    statement_qualifier_value = claim.target
-                                if isinstance(statement_qualifier_value, dict):
-                                    if all([
-                                        statement_qualifier_value[key] == new_statement_qualifier_value[key] for key in
-                                        set(statement_qualifier_value.keys()).intersection(
-                                            new_statement_qualifier_value.keys())]):
-                                        equal_qualifier = True
-                                        break
-                                else:
-                                    if new_statement_qualifier_value == statement_qualifier_value:
-                                        equal_qualifier = True
-                                        break
-                            equal_qualifiers = equal_qualifiers and equal_qualifier
-                            if not equal_qualifiers:  # if any of the common qualifiers is different
-                                logger.info(f"Skip statement: any of the common qualifiers is different: "
-                                            f"{new_statement_qualifier.property}: {new_statement_qualifier_value}) "
-                                            f"vs. {statement_qualifier_value}")
-                                # Pass to next statement
-                                break
-                    if equal_qualifiers:  # if all common qualifiers are equal
-                        logger.info(f"Equal position values and all equal common qualifiers")
-                        add_qualifiers(statement, new_statement, summary=summary)
-                        return True
+    # First qualifier value of each property
+    new_statement_qualifier_values = {new_statement_qualifier.property: new_statement_qualifier.value
+                                      for new_statement_qualifier in reversed(new_statement.qualifiers)}
+    # Item: same position and overlapping term
+    statements = item.index.find_overlapping(new_statement_claim_property,
+                                             start=new_statement_qualifier_values.get(START_TIME),
+                                             end=new_statement_qualifier_values.get(END_TIME),
+                                             value=new_statement.claim.value)
+    if not statements:
+        return False
+    logger.warning(f"Equal position value {new_statement_claim_id} already exists for item {item.id}")
+    # TODO: Additional equality conditions
+    if not new_statement.qualifiers:
+        logger.info(f"Do not add statement: duplicated position values without qualifiers")
+        return True
+    # Statements with an equal qualifier, for each new statement qualifier
+    equal_qualifier_statements = [
+        {id(statement) for statement in item.index.find_qualified(
+            new_statement_claim_property, new_statement_qualifier.property, new_statement_qualifier.value)}
+        for new_statement_qualifier in new_statement.qualifiers]
+    for statement in statements:
+        common_qualifier_properties = set(statement.qualifiers.keys()).intersection(
+            {new_statement_qualifier.property for new_statement_qualifier in new_statement.qualifiers})
+        if not common_qualifier_properties:
+            # Add new qualifiers
+            logger.info(f"Item position does not contain any of the new statement qualifiers")
+            add_qualifiers(statement, new_statement, edit)
+            return True
+        for new_statement_qualifier, statement_ids in zip(new_statement.qualifiers, equal_qualifier_statements):
+            if new_statement_qualifier.property in common_qualifier_properties and id(statement) not in statement_ids:
+                # if any of the common qualifiers is different
+                logger.info(f"Skip statement: any of the common qualifiers is different: "
+                            f"{new_statement_qualifier.property}: {new_statement_qualifier.value}) vs. "
+                            f"{[claim.target for claim in statement.qualifiers[new_statement_qualifier.property]]}")
+                # Pass to next statement
+                break
+        else:  # if all common qualifiers are equal
+            logger.info(f"Equal position values and all equal common qualifiers")
+            add_qualifiers(statement, new_statement, edit)
+            return True
     return False
 
 
-def add_qualifiers(statement, new_statement, summary=""):
+def add_qualifiers(statement, new_statement, edit):
     logger.info(f"Add qualifiers to duplicated item position value")
     # New statement
     # new_statement_claim_property = new_statement.claim.property
@@ -1453,39 +1669,18 @@ def add_qualifiers(statement, new_statement, summary=""):
     #
     add_source = False
     for new_statement_qualifier in new_statement.qualifiers:
-        if hasattr(new_statement_qualifier.value, 'id'):
-            new_statement_qualifier_value = new_statement_qualifier.value.id
-        elif hasattr(new_statement_qualifier.value, 'precision'):
-            new_statement_qualifier_value = {'year': new_statement_qualifier.value.year}
-            if new_statement_qualifier.value.precision >= 10:
-                new_statement_qualifier_value['month'] = new_statement_qualifier.value.month
-            if new_statement_qualifier.value.precision >= 11:
-                new_statement_qualifier_value['day'] = new_statement_qualifier.value.day
-        else:
-            new_statement_qualifier_value = new_statement_qualifier.value
+        new_statement_qualifier_value = new_statement_qualifier.value
         add_qualifier = True
         change_qualifier = False
-        for qualifier_pid in statement.qualifiers:
-            if new_statement_qualifier.property == qualifier_pid:
-                add_qualifier = False
-                # for claim in statement.qualifiers[new_statement_qualifier.property]:
-                #     if new_statement_qualifier.value.id == claim.target.id:
-                #         add_qualifier = False
+        if new_statement_qualifier.property in statement.qualifiers:
+            add_qualifier = False
+            if is_time(new_statement_qualifier_value):
+                # Refine a coarser date: e.g. year precision to day precision
+                new_statement_qualifier_key = time_key(new_statement_qualifier_value)
                 for i_claim, claim in enumerate(statement.qualifiers[new_statement_qualifier.property]):
-                    if (hasattr(claim.target, 'precision') and
-                            claim.target.precision < new_statement_qualifier.value.precision):
-                        if ((claim.target.precision == 9 and
-                             claim.target.year == new_statement_qualifier.value.year) or
-                                (claim.target.precision == 10 and
-                                 claim.target.year == new_statement_qualifier.value.year and
-                                 claim.target.month == new_statement_qualifier.value.month)):
-                            change_qualifier = True
-                            i_change_qualifier = i_claim
-                            hash_change_qualifier = claim.hash
-                        # elif (claim.target.precision == 10 and claim.target.year == new_statement_qualifier.value.year
-                        #         and claim.target.month == new_statement_qualifier.value.month):
-                        #     edit_qualifier = True
-                        #     i_edit_qualifier = i_claim
+                    if is_time(claim.target) and time_refines(new_statement_qualifier_key, time_key(claim.target)):
+                        change_qualifier = True
+                        i_change_qualifier = i_claim
 
         if add_qualifier or change_qualifier:
             add_source = True
@@ -1494,16 +1689,12 @@ def add_qualifiers(statement, new_statement, summary=""):
                                f"{new_statement_qualifier_value}) to already present equal position value "
                                f"{new_statement_claim_id}")  # for item {item.id}")
                 # statement._persist_qualifier(new_statement_qualifier, summary=summary)
-                statement.addQualifier(new_statement_qualifier._claim, new=True, summary=summary)
-                statement.qualifiers[new_statement_qualifier.property].append(new_statement_qualifier._claim)
+                edit.add_qualifier(statement, new_statement_qualifier)
             elif change_qualifier:
                 logger.warning(f"Change qualifier ({new_statement_qualifier.property}, "
                                f"{new_statement_qualifier_value}) to already present equal position value "
                                f"{new_statement_claim_id}")  # for item {item.id}")
-                new_statement_qualifier._claim.hash = hash_change_qualifier
-                statement.addQualifier(new_statement_qualifier._claim, new=False, summary=summary)
-                statement.qualifiers[new_statement_qualifier.property][i_change_qualifier] = \
-                    new_statement_qualifier._claim
+                edit.add_qualifier(statement, new_statement_qualifier, index=i_change_qualifier)
         else:
             logger.info(f"Skip already present qualifier ({new_statement_qualifier.property}, "
                         f"{new_statement_qualifier_value}) to already present equal position value "
@@ -1512,20 +1703,13 @@ def add_qualifiers(statement, new_statement, summary=""):
         new_statement_sources = new_statement.sources
         logger.warning(f"Add source to already present equal position value {new_statement_claim_id}")
         # Check if new source already exists
-        for source in statement.sources:
-            if IMPORTED_FROM_WIKIMEDIA_PROJECT in source:
-                for claim in source[IMPORTED_FROM_WIKIMEDIA_PROJECT]:
-                    if claim.target.id == CATALAN_WIKIPEDIA:
-                        logger.info(f"Skip adding source because already present")
-                        return
+        if SourceContainer.from_pwb(statement.sources).has_source(IMPORTED_FROM_CATALAN_WIKIPEDIA):
+            logger.info(f"Skip adding source because already present")
+            return
         # Add source
         # statement._persist_source(new_statement_source, summary=summary)
-        statement.addSources(
-            [new_statement_source._claim for new_statement_source in new_statement_sources],
-            summary=summary)
-        statement.sources.append(
-            {new_statement_source.property: new_statement_source._claim
-             for new_statement_source in new_statement_sources})
+        for new_statement_source_block in new_statement_sources:
+            edit.add_sources(statement, new_statement_source_block)
     else:
         logger.info(f"No qualifier added to duplicated item position value")
 
@@ -1556,6 +1740,12 @@ if __name__ == '__main__':
 
     # Parse arguments
     args = parse_args()
+    # Property datatypes, so that claims are created without fetching them
+    PropertyRepository(snapshot=WIKIDATA_DATATYPES).register()
+    if args.redirects:
+        TEMPLATE_REDIRECTS = TemplateRedirects(path=args.redirects, ttl=args.redirects_ttl)
+    if args.links:
+        LINKS = LinkResolver(cache=LinkCache(args.links, ttl=args.links_ttl, missing_ttl=args.missing_links_ttl))
 
     # Configurate logger
     config_logger(log_filename=args.log, debug=args.debug)
@@ -1609,6 +1799,7 @@ if __name__ == '__main__':
                 raise SkipPageError
             positions = extract_positions(infotable_params)
             logger.info(f"Positions: {positions}")
+            prefetch_links(positions)
             position_statements = create_position_statements(positions)
             if not position_statements:
                 raise SkipPageError
@@ -13,6 +13,9 @@ setup(
         'xlrd',  # Excel support
     ],
     extras_require={
+        'async': [
+            'aiohttp',  # AsyncItemRepository
+        ],
         'dev': [
             'pytest',
         ]
@@ -24,6 +24,5 @@ sys.path.insert(0, str(scripts_directory))
 @pytest.fixture(scope='session')
 def wikidatabot():
     import wikidatabot
-    wikidatabot.site = wikidatabot.pywikibot.Site('test', 'wikidata')
-    wikidatabot.repo = wikidatabot.site.data_repository()
+    wikidatabot.configure('test')
     return wikidatabot
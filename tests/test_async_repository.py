@@ -0,0 +1,154 @@
+import asyncio
+import json
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+from pywikibot.exceptions import NoPageError
+
+
+ENTITIES = {f"Q{i}": {'id': f"Q{i}", 'lastrevid': i, 'labels': {'ca': {'language': 'ca', 'value': f"item {i}"}}}
+            for i in range(1, 121)}
+
+
+class StandInServer:
+    """Local stand-in of the MediaWiki API and the SPARQL endpoint."""
+
+    def __init__(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.token = 'token+\\'
+
+    async def api(self, request):
+        params = dict(request.query)
+        params.update(await request.post())
+        self.requests.append(params)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if params['action'] == 'wbgetentities':
+            entities = {entity_id: ENTITIES.get(entity_id, {'id': entity_id, 'missing': True})
+                        for entity_id in params['ids'].split('|')}
+            return web.json_response({'entities': entities})
+        elif params['action'] == 'query':
+            return web.json_response({'query': {'tokens': {'csrftoken': self.token}}})
+        elif params['action'] == 'wbeditentity':
+            if params['token'] != self.token:
+                return web.json_response({'error': {'code': 'badtoken', 'info': 'Invalid CSRF token.'}})
+            entity = dict(ENTITIES[params['id']], lastrevid=int(params['baserevid']) + 1,
+                          labels=json.loads(params['data'])['labels'])
+            return web.json_response({'entity': entity, 'success': 1})
+
+    async def sparql(self, request):
+        query = request.query['query']
+        ids = sorted(ENTITIES, key=lambda entity_id: 'http://www.wikidata.org/entity/' + entity_id)
+        if 'FILTER' in query:
+            cursor = query.split('FILTER(STR(?item) > "')[1].split('"')[0]
+            ids = [entity_id for entity_id in ids if 'http://www.wikidata.org/entity/' + entity_id > cursor]
+        limit = int(query.rsplit('LIMIT', 1)[1])
+        bindings = [{'item': {'type': 'uri', 'value': 'http://www.wikidata.org/entity/' + entity_id}}
+                    for entity_id in ids[:limit]]
+        return web.json_response({'results': {'bindings': bindings}})
+
+
+def run(test):
+    """Run test(repository, server) against a stand-in server."""
+    from wikidatabot.async_repository import AsyncItemRepository
+
+    async def main():
+        server = StandInServer()
+        app = web.Application()
+        app.router.add_route('*', '/w/api.php', server.api)
+        app.router.add_get('/sparql', server.sparql)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        try:
+            async with AsyncItemRepository(api_url=f"http://127.0.0.1:{port}/w/api.php",
+                                           sparql_url=f"http://127.0.0.1:{port}/sparql", repo=None,
+                                           concurrency=2) as repository:
+                await test(repository, server)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+class TestAsyncItemRepository:
+
+    def test_get_many(self):
+        async def test(repository, server):
+            items = await repository.get_many([f"Q{i}" for i in range(1, 131)], groupsize=10)
+            assert [item.id for item in items] == [f"Q{i}" for i in range(1, 121)]
+            assert len(server.requests) == 13
+            assert server.max_in_flight == 2
+            item = await repository.get('Q1', languages=['ca'])
+            assert item.labels == {'ca': 'item 1'}
+            assert server.requests[-1]['languages'] == 'ca'
+            with pytest.raises(NoPageError):
+                await repository.get('Q200')
+
+        run(test)
+
+    def test_list(self):
+        async def test(repository, server):
+            items = [item async for item in repository.list("SELECT ?item WHERE { ?item wdt:P31 wd:Q5 }",
+                                                            page_size=50)]
+            assert sorted(item.id for item in items) == sorted(ENTITIES)
+
+        run(test)
+
+    def test_list_break(self):
+        async def test(repository, server):
+            select = repository._select
+            cancelled = []
+
+            async def blocking_select(query):
+                if 'FILTER' not in query:
+                    return await select(query)
+                # Next page: in flight until cancelled
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    cancelled.append(query)
+                    raise
+
+            repository._select = blocking_select
+            stream = repository.list("SELECT ?item WHERE { ?item wdt:P31 wd:Q5 }", page_size=50)
+            async for item in stream:
+                break
+            await stream.aclose()
+            await asyncio.sleep(0)
+            assert len(cancelled) == 1
+
+        run(test)
+
+    def test_edit(self):
+        async def test(repository, server):
+            items = await repository.get_many(['Q1', 'Q2'])
+            await asyncio.gather(*(repository.edit(item, {'labels': {'ca': {'language': 'ca', 'value': 'edited'}}})
+                                   for item in items))
+            edits = [request for request in server.requests if request['action'] == 'wbeditentity']
+            assert [(edit['id'], edit['baserevid']) for edit in edits] == [('Q1', '1'), ('Q2', '2')]
+            assert [request['action'] for request in server.requests[-3:]] == ['query', 'wbeditentity',
+                                                                               'wbeditentity']
+            assert [(item.lastrevid, item.labels) for item in items] == [(2, {'ca': 'edited'}), (3, {'ca': 'edited'})]
+
+        run(test)
+
+    def test_edit_badtoken(self):
+        async def test(repository, server):
+            item = await repository.get('Q1')
+            await repository.edit(item, {'labels': {'ca': {'language': 'ca', 'value': 'edited'}}})
+            # E.g. the session expired
+            server.token = 'token2+\\'
+            await repository.edit(item, {'labels': {'ca': {'language': 'ca', 'value': 'edited again'}}})
+            assert [request['action'] for request in server.requests[-3:]] == ['wbeditentity', 'query', 'wbeditentity']
+            assert item.labels == {'ca': 'edited again'}
+
+        run(test)
@@ -0,0 +1,43 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def restore_backend():
+    import wikidatabot
+    backend = wikidatabot._backend
+    yield
+    wikidatabot.configure(backend)
+
+
+class TestLazy:
+
+    def test_import_does_not_construct_site(self):
+        import wikidatabot
+        wikidatabot.configure('offline')
+        assert wikidatabot.site._instance is None
+        assert wikidatabot.repo._instance is None
+
+    def test_offline(self):
+        import wikidatabot
+        wikidatabot.configure('offline')
+        with pytest.raises(wikidatabot.OfflineError):
+            wikidatabot.site.data_repository()
+        with pytest.raises(wikidatabot.OfflineError):
+            wikidatabot.lazy_site('ca', 'wikipedia').code
+
+    def test_unknown_backend(self):
+        import wikidatabot
+        with pytest.raises(ValueError):
+            wikidatabot.configure('fake')
+
+    def test_delegation(self):
+        from types import SimpleNamespace
+        from wikidatabot import Lazy
+        target = SimpleNamespace(code='ca')
+        proxy = Lazy(lambda: target)
+        assert proxy._instance is None
+        assert proxy.code == 'ca'
+        assert isinstance(proxy, SimpleNamespace)
+        assert proxy == target
+        proxy.code = 'es'
+        assert target.code == 'es'
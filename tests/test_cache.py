@@ -0,0 +1,52 @@
+class TestEntityCache:
+
+    def test_put_get(self, tmp_path):
+        from wikidatabot.cache import EntityCache
+        path = tmp_path / 'entities.sqlite'
+        cache = EntityCache(path)
+        entity = {'id': 'Q1', 'lastrevid': 10, 'labels': {'ca': {'language': 'ca', 'value': 'univers'}}}
+        cache.put(entity)
+        cache.close()
+        cache = EntityCache(path)
+        assert cache.get('Q1') == entity
+        assert cache.get('Q2') is None
+        assert len(cache) == 1
+        cache.delete_many(['Q1'])
+        assert len(cache) == 0
+
+
+class TestLinkCache:
+
+    def test_ttl(self, monkeypatch):
+        import wikidatabot.cache as module
+        from wikidatabot.cache import LinkCache
+        now = [0.]
+        monkeypatch.setattr(module.time, 'time', lambda: now[0])
+        cache = LinkCache(ttl=100, missing_ttl=10)
+        cache.put_many('ca', {'BCN': ('Barcelona', 1), 'Nowhere': None})
+        assert cache.get_many('ca', ['BCN', 'Nowhere', 'Girona']) == {'BCN': ('Barcelona', 1), 'Nowhere': None}
+        assert cache.get_many('es', ['BCN']) == {}
+        now[0] = 50.
+        assert cache.get_many('ca', ['BCN', 'Nowhere']) == {'BCN': ('Barcelona', 1)}
+        # The QID expires with its entry
+        cache.set_qid('ca', 'Barcelona', 'Q1492')
+        assert cache.get_qid('ca', 'Barcelona') == 'Q1492'
+        now[0] = 150.
+        assert cache.get_qid('ca', 'Barcelona') is None
+        # and is not kept when the entry is fetched again
+        cache.put_many('ca', {'BCN': ('Barcelona', 1)})
+        assert cache.get_qid('ca', 'Barcelona') is None
+
+    def test_redirect_change(self):
+        from wikidatabot.cache import LinkCache
+        cache = LinkCache()
+        cache.put_many('ca', {'BCN': ('Barcelona', 1), 'Barna': ('Barcelona', 1), 'Barcelona': ('Barcelona', 1)})
+        cache.set_qid('ca', 'Barcelona', 'Q1492')
+        assert cache.get_qid('ca', 'Barcelona') == 'Q1492'
+        # Still resolved to Barcelona: QID kept
+        cache.put_many('ca', {'Barcelona': ('Barcelona', 1)})
+        assert cache.get_qid('ca', 'Barcelona') == 'Q1492'
+        # Redirect target changed: entries resolved to the former one invalidated
+        cache.put_many('ca', {'BCN': ('Barcelona (desambiguació)', 2)})
+        assert cache.get_many('ca', ['BCN', 'Barna', 'Barcelona']) == {'BCN': ('Barcelona (desambiguació)', 2)}
+        assert cache.get_qid('ca', 'Barcelona') is None
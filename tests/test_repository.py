@@ -1,5 +1,20 @@
 
 
+import pytest
+
+
+def test_paginate_query():
+    from wikidatabot.repository import paginate_query
+    query = "SELECT ?item WHERE {\n  ?item wdt:P31 wd:Q5 .\n}\n"
+    assert paginate_query(query, limit=2) == "SELECT ?item WHERE {\n  ?item wdt:P31 wd:Q5 .\n}\nORDER BY ?item\nLIMIT 2"
+    cursor = 'http://www.wikidata.org/entity/Q42'
+    assert paginate_query(query, cursor=cursor, limit=2) == (
+        "SELECT ?item WHERE {\n  ?item wdt:P31 wd:Q5 .\n"
+        '  FILTER(STR(?item) > "http://www.wikidata.org/entity/Q42")\n}\nORDER BY ?item\nLIMIT 2')
+    with pytest.raises(ValueError):
+        paginate_query(query + "LIMIT 10")
+
+
 class TestItemPywikibotRepository:
 
     # TODO: refactorize to assert result == expected, where expected is an instance of Item
@@ -14,6 +29,357 @@ class TestItemPywikibotRepository:
         assert item.id == pwb_item.id
         assert item.labels == pwb_item.labels
         assert item.descriptions == pwb_item.descriptions
-        assert item.aliases == pwb_item.aliases
+        assert item.aliases == {language: tuple(aliases) for language, aliases in pwb_item.aliases.items()}
         assert item.statements == pwb_item.claims
-        assert item.sitelinks == pwb_item.sitelinks
+        assert item.sitelinks == {site: sitelink['title'] for site, sitelink in pwb_item.sitelinks.toJSON().items()}
+
+    def test_get_many(self, wikidatabot):
+        from wikidatabot.repository import ItemPywikibotRepository
+        repository = ItemPywikibotRepository()
+        item_ids = ['Q68', 'Q271']
+        items = list(repository.get_many(item_ids, groupsize=1))
+        assert [item.id for item in items] == item_ids
+        for item in items:
+            pwb_item = wikidatabot.pywikibot.ItemPage(wikidatabot.repo, item.id)
+            _ = pwb_item.get()
+            assert item.labels == pwb_item.labels
+            assert item.statements == pwb_item.claims
+
+    def test_list_failed_page(self, monkeypatch):
+        from pywikibot.exceptions import ServerError
+        import wikidatabot.repository as repository_module
+        pages = [[{'item': f"http://www.wikidata.org/entity/Q{i}"} for i in (1, 2)], None]
+
+        class FakeSparqlQuery:
+            def __init__(self, repo):
+                pass
+
+            def select(self, query):
+                return pages.pop(0)
+
+        monkeypatch.setattr(repository_module, 'SparqlQuery', FakeSparqlQuery)
+        repository = repository_module.ItemPywikibotRepository(repo=None)
+        monkeypatch.setattr(repository, 'get_many', lambda item_ids, **kwargs: list(item_ids))
+        items = repository.list("SELECT ?item WHERE { ?item wdt:P31 wd:Q5 }", page_size=2)
+        assert [next(items), next(items)] == ['Q1', 'Q2']
+        # A failed page is not the end of the results
+        with pytest.raises(ServerError):
+            next(items)
+
+
+class FakeItemRepository:
+
+    def __init__(self):
+        self.requested = []
+
+    def get(self, item_id):
+        from wikidatabot.models import Item
+        self.requested.append(item_id)
+        return Item(id=item_id)
+
+    def get_many(self, item_ids):
+        return [self.get(item_id) for item_id in item_ids]
+
+
+class TestCachedItemRepository:
+
+    def test_get(self):
+        from wikidatabot.repository import CachedItemRepository
+        repository = CachedItemRepository(FakeItemRepository())
+        item = repository.get('Q1')
+        assert repository.get('Q1') is item
+        assert repository.repository.requested == ['Q1']
+        assert (repository.hits, repository.misses) == (1, 1)
+        assert repository.hit_rate == 0.5
+
+    def test_get_projection(self):
+        from wikidatabot.models import Item, Projection
+        from wikidatabot.repository import CachedItemRepository
+        repository = CachedItemRepository(FakeItemRepository())
+        repository.put(Item(id='Q1', projection=Projection.create(properties=['P31'])))
+        assert repository.get('Q1', properties=['P31']).projection is not None
+        # Not covered by the cached partial item
+        assert repository.get('Q1').projection is None
+        assert repository.repository.requested == ['Q1']
+        assert repository.get('Q1', properties=['P17']).projection is None
+
+    def test_write_through(self):
+        from wikidatabot.models import Item, Projection
+        from wikidatabot.repository import CachedItemRepository
+        repository = CachedItemRepository(FakeItemRepository())
+        item = Item(id='Q1', projection=Projection.create(properties=['P31']))
+        repository.put(item)
+        item.refresh({'id': 'Q1', 'lastrevid': 2})
+        assert repository.get('Q1') is item
+        assert repository.repository.requested == []
+
+    def test_get_many(self):
+        from wikidatabot.repository import CachedItemRepository
+        repository = CachedItemRepository(FakeItemRepository())
+        repository.get('Q2')
+        items = list(repository.get_many(['Q1', 'Q2', 'Q3']))
+        assert [item.id for item in items] == ['Q1', 'Q2', 'Q3']
+        assert repository.repository.requested == ['Q2', 'Q1', 'Q3']
+
+    def test_lru_eviction(self):
+        from wikidatabot.repository import CachedItemRepository
+        repository = CachedItemRepository(FakeItemRepository(), maxsize=2)
+        repository.get('Q1')
+        repository.get('Q2')
+        repository.get('Q1')
+        repository.get('Q3')  # evicts Q2
+        assert len(repository) == 2
+        repository.get('Q1')
+        repository.get('Q2')
+        assert repository.repository.requested == ['Q1', 'Q2', 'Q3', 'Q2']
+
+    def test_ttl(self, monkeypatch):
+        from wikidatabot import repository as module
+        now = [0.]
+        monkeypatch.setattr(module.time, 'monotonic', lambda: now[0])
+        repository = module.CachedItemRepository(FakeItemRepository(), ttl=10)
+        repository.get('Q1')
+        now[0] = 5.
+        repository.get('Q1')
+        now[0] = 11.
+        repository.get('Q1')
+        assert repository.repository.requested == ['Q1', 'Q1']
+        assert (repository.hits, repository.misses) == (1, 2)
+
+
+class FakeRepo:
+    """Fake DataSite answering wbgetentities requests from entities."""
+
+    def __init__(self, entities):
+        self.entities = entities
+        self.requests = []
+
+    def simple_request(self, **params):
+        from types import SimpleNamespace
+        self.requests.append(params)
+        entities = {}
+        for entity_id in params['ids']:
+            entity = self.entities.get(entity_id, {'id': entity_id, 'missing': ''})
+            if params.get('props') == 'info' and 'missing' not in entity:
+                entity = {'id': entity_id, 'lastrevid': entity['lastrevid']}
+            entities[entity_id] = entity
+        return SimpleNamespace(submit=lambda: {'entities': entities})
+
+
+class TestItemPywikibotRepositoryCache:
+
+    def test_revalidation(self):
+        from wikidatabot.cache import EntityCache
+        from wikidatabot.repository import ItemPywikibotRepository
+        repo = FakeRepo({'Q1': {'id': 'Q1', 'lastrevid': 1}, 'Q2': {'id': 'Q2', 'lastrevid': 1}})
+        repository = ItemPywikibotRepository(repo=repo, cache=EntityCache())
+        assert repository._get_entities(['Q1', 'Q2', 'Q3']) == [{'id': 'Q1', 'lastrevid': 1},
+                                                               {'id': 'Q2', 'lastrevid': 1}]
+        assert repo.requests == [{'action': 'wbgetentities', 'ids': ['Q1', 'Q2', 'Q3']}]
+        # Unchanged: only revalidation
+        repo.requests = []
+        assert repository._get_entities(['Q1', 'Q2']) == [{'id': 'Q1', 'lastrevid': 1},
+                                                         {'id': 'Q2', 'lastrevid': 1}]
+        assert repo.requests == [{'action': 'wbgetentities', 'ids': ['Q1', 'Q2'], 'props': 'info'}]
+        # Changed: revalidation and download of the changed one
+        repo.entities['Q2'] = {'id': 'Q2', 'lastrevid': 2}
+        repo.requests = []
+        assert repository._get_entities(['Q1', 'Q2']) == [{'id': 'Q1', 'lastrevid': 1},
+                                                         {'id': 'Q2', 'lastrevid': 2}]
+        assert repo.requests[1] == {'action': 'wbgetentities', 'ids': ['Q2']}
+        assert repository.cache.get('Q2') == {'id': 'Q2', 'lastrevid': 2}
+
+
+class TestPropertyRepository:
+
+    def test_warm(self, tmp_path, monkeypatch):
+        from wikidatabot import models
+        from wikidatabot.repository import PropertyRepository
+        repo = FakeRepo({'P1': {'id': 'P1', 'datatype': 'string'}, 'P2': {'id': 'P2', 'datatype': 'time'}})
+        path = tmp_path / 'datatypes.json'
+        properties = PropertyRepository(path, repo=repo, snapshot={'P31': 'wikibase-item'})
+        assert properties.get_many(['P31', 'P1', 'P2', 'P3']) == {'P31': 'wikibase-item', 'P1': 'string',
+                                                                   'P2': 'time'}
+        assert repo.requests == [{'action': 'wbgetentities', 'ids': ('P1', 'P2', 'P3'), 'props': 'datatype'}]
+        assert properties.get('P1') == 'string'
+        assert len(repo.requests) == 1
+        # Persisted
+        assert PropertyRepository(path, repo=repo).datatypes == {'P31': 'wikibase-item', 'P1': 'string',
+                                                                 'P2': 'time'}
+        monkeypatch.setattr(models, 'datatypes', {})
+        properties.register()
+        assert models.datatypes is properties.datatypes
+
+
+class TestItemPywikibotRepositoryPages:
+
+    def test_get_many_from_pages(self):
+        from types import SimpleNamespace
+        from wikidatabot.repository import ItemPywikibotRepository
+        entities = {'Q1492': {'id': 'Q1492', 'sitelinks': {'cawiki': {'site': 'cawiki', 'title': 'Barcelona'}}},
+                    'Q15090': {'id': 'Q15090', 'sitelinks': {'cawiki': {'site': 'cawiki', 'title': 'Girona'}}}}
+        requests = []
+
+        def simple_request(**params):
+            requests.append(params)
+            found = {entity['sitelinks']['cawiki']['title']: entity for entity in entities.values()}
+            data = {'entities': {}}
+            for i, title in enumerate(params['titles']):
+                entity = found.get(title, {'site': 'cawiki', 'title': title, 'missing': ''})
+                data['entities'][entity.get('id', str(-i - 1))] = entity
+            return SimpleNamespace(submit=lambda: data)
+
+        repository = ItemPywikibotRepository(repo=SimpleNamespace(simple_request=simple_request))
+        repository._to_item = lambda entity, projection=None: (entity['id'], projection)
+        items = repository.get_many_from_pages([('cawiki', 'Barcelona'), ('cawiki', 'Girona'), ('cawiki', 'Nowhere'),
+                                                ('cawiki', 'Barcelona')], groupsize=2, properties=['P31'])
+        assert {key: item[0] for key, item in items.items()} == {('cawiki', 'Barcelona'): 'Q1492',
+                                                                ('cawiki', 'Girona'): 'Q15090'}
+        assert [request['titles'] for request in requests] == [('Barcelona', 'Girona'), ('Nowhere',)]
+        assert requests[0]['sitefilter'] == 'cawiki'
+        assert requests[0]['props'] == ['info', 'labels', 'descriptions', 'aliases', 'claims', 'sitelinks']
+
+
+@pytest.fixture(params=['latest-all.json', 'latest-all.json.gz', 'latest-all.json.bz2'])
+def dump_path(request, tmp_path):
+    import bz2
+    import gzip
+    import json
+    entities = [
+        {'type': 'item', 'id': 'Q1', 'labels': {'ca': {'language': 'ca', 'value': 'univers'}}},
+        {'type': 'property', 'id': 'P31', 'datatype': 'wikibase-item'},
+        {'type': 'item', 'id': 'Q2', 'labels': {'ca': {'language': 'ca', 'value': 'Terra'}},
+         'claims': {'P31': [{'mainsnak': {'snaktype': 'value', 'property': 'P31', 'datatype': 'wikibase-item',
+                                          'datavalue': {'value': {'entity-type': 'item', 'id': 'Q3504248'},
+                                                        'type': 'wikibase-entityid'}},
+                             'type': 'statement', 'rank': 'normal', 'id': 'Q2$1'}]},
+         'sitelinks': {'cawiki': {'site': 'cawiki', 'title': 'Terra', 'badges': []}}},
+    ]
+    text = '[\n' + ',\n'.join(json.dumps(entity, separators=(',', ':')) for entity in entities) + '\n]\n'
+    path = tmp_path / request.param
+    opener = {'.gz': gzip.open, '.bz2': bz2.open}.get(path.suffix, open)
+    with opener(path, 'wt') as f:
+        f.write(text)
+    return path
+
+
+class TestItemDumpRepository:
+
+    def test_get(self, dump_path):
+        from pywikibot.exceptions import NoPageError
+        from wikidatabot.repository import ItemDumpRepository
+        repository = ItemDumpRepository(dump_path)
+        if dump_path.suffix in ('.gz', '.bz2'):
+            with pytest.raises(ValueError):
+                repository.get('Q2')
+            return
+        item = repository.get('Q2')
+        assert repository.index_path.exists()
+        assert item.id == 'Q2'
+        assert item.labels == {'ca': 'Terra'}
+        assert item.sitelinks == {'cawiki': 'Terra'}
+        with pytest.raises(NoPageError):
+            repository.get('Q3')
+        repository.close()
+
+    def test_statements_offline(self, dump_path, monkeypatch):
+        import wikidatabot
+        from wikidatabot import models
+        from wikidatabot.models import ItemId, Statement
+        from wikidatabot.repository import ItemDumpRepository
+        monkeypatch.setattr(models, 'datatypes', {})
+        backend = wikidatabot._backend
+        wikidatabot.configure('offline')
+        try:
+            repository = ItemDumpRepository(dump_path)
+            item = next(repository.get_many(['Q2']))
+            [statement] = item.statements['P31']
+            assert isinstance(statement, Statement)
+            assert (statement.id, statement.claim.value) == ('Q2$1', ItemId('Q3504248'))
+            assert models.datatypes == {'P31': 'wikibase-item'}
+            repository.close()
+        finally:
+            wikidatabot.configure(backend)
+
+    def test_get_many(self, dump_path):
+        from wikidatabot.repository import ItemDumpRepository
+        repository = ItemDumpRepository(dump_path)
+        items = list(repository.get_many(['Q2', 'Q3', 'Q1']))
+        assert [item.id for item in items] == ['Q1', 'Q2']
+        repository.close()
+
+    def test_list(self, dump_path):
+        from wikidatabot.repository import ItemDumpRepository
+        repository = ItemDumpRepository(dump_path)
+        assert [item.id for item in repository.list()] == ['Q1', 'Q2']
+        assert [item.id for item in repository.list(lambda entity: 'cawiki' in entity.get('sitelinks', {}))] == ['Q2']
+
+    def test_get_projection(self, dump_path):
+        from wikidatabot.models import NotFetchedError
+        from wikidatabot.repository import ItemDumpRepository
+        repository = ItemDumpRepository(dump_path)
+        item = next(repository.get_many(['Q2'], properties=['P17'], languages=['es']))
+        assert item.labels == {}
+        assert item.statements == {}
+        with pytest.raises(NotFetchedError):
+            item.labels['ca']
+        repository.close()
+
+
+class TestSingleFlight:
+
+    def test_do(self):
+        import threading
+        from wikidatabot.repository import SingleFlight
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            started.set()
+            release.wait(5)
+            return object()
+
+        joined = []
+        all_joined = threading.Event()
+
+        class Calls(dict):
+            # Looked up under the SingleFlight lock: a follower that finds the call in flight waits for it
+            def get(self, key, default=None):
+                call = super().get(key, default)
+                if call is not None:
+                    joined.append(key)
+                    if len(joined) == 3:
+                        all_joined.set()
+                return call
+
+        flights._calls = Calls()
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('Q1', fetch, 'Q1')))
+        leader.start()
+        assert started.wait(5)
+        followers = [threading.Thread(target=lambda: results.append(flights.do('Q1', fetch, 'Q1')))
+                     for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        # Followers are waiting for the call in flight
+        assert all_joined.wait(5)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+            assert not thread.is_alive()
+        assert calls == ['Q1']
+        assert len(results) == 4 and all(result is results[0] for result in results)
+        # Not in flight anymore: called again
+        assert flights.do('Q1', fetch, 'Q1') is not results[0]
+
+    def test_exception(self):
+        from wikidatabot.repository import SingleFlight
+
+        def fail():
+            raise KeyError('Q1')
+
+        with pytest.raises(KeyError):
+            SingleFlight().do('Q1', fail)
@@ -316,3 +316,263 @@ class TestScriptTransferInfotable:
         expected_text = "{{Infotaula\n| llengua = rus\n| ocupacio = Poeta\n}}"
         assert page.text == expected_text
 
+
+class TestTemplateRedirects:
+
+    def test_get(self, tmp_path, monkeypatch):
+        from transfer_infotable import TemplateRedirects
+        fetched = []
+
+        def fetch(self, title):
+            fetched.append(title)
+            return frozenset([title.lower(), title.lower() + ' redirect'])
+
+        monkeypatch.setattr(TemplateRedirects, '_fetch', fetch)
+        path = tmp_path / 'redirects.json'
+        redirects = TemplateRedirects(path=path, ttl=60)
+        assert redirects.get('Infotaula_persona') == {'infotaula persona', 'infotaula persona redirect'}
+        assert redirects.get('Infotaula persona', 'Infotaula polític') == {
+            'infotaula persona', 'infotaula persona redirect', 'infotaula polític', 'infotaula polític redirect'}
+        assert fetched == ['Infotaula persona', 'Infotaula polític']
+        # Persisted
+        assert TemplateRedirects(path=path, ttl=60).get('Infotaula persona') == {'infotaula persona',
+                                                                                 'infotaula persona redirect'}
+        assert len(fetched) == 2
+        # Expired
+        assert TemplateRedirects(path=path, ttl=-1).get('Infotaula persona')
+        assert len(fetched) == 3
+
+
+class FakeWiki:
+    """Fake site answering query&redirects requests from its pages and redirects."""
+
+    def __init__(self, code, pages, redirects=None):
+        self.code = code
+        self.pages = pages
+        self.redirects = redirects or {}
+        self.requests = []
+
+    def dbName(self):
+        return self.code + 'wiki'
+
+    def simple_request(self, **params):
+        self.requests.append(params['titles'])
+        titles = [title[0].upper() + title[1:] for title in params['titles']]
+        normalized = [{'from': title, 'to': normalized_title}
+                      for title, normalized_title in zip(params['titles'], titles) if title != normalized_title]
+        redirects = [{'from': title, 'to': self.redirects[title]} for title in titles if title in self.redirects]
+        targets = [self.redirects.get(title, title) for title in titles]
+        pages = [{'title': title, 'pageid': self.pages[title]} if title in self.pages
+                 else {'title': title, 'missing': ''} for title in targets]
+        return SimpleNamespace(submit=lambda: {'query': {'normalized': normalized, 'redirects': redirects,
+                                                         'pages': pages}})
+
+
+class FakeLink:
+    """Fake pywikibot Link, parsing the language prefixes of the FakeWiki sites."""
+
+    sites = {}
+
+    def __init__(self, text, source):
+        prefix, colon, title = text.partition(':')
+        self.site = self.sites.get(prefix, source) if colon else source
+        title = (title if colon and prefix in self.sites else text).split('#')[0].strip()
+        if not title:
+            from pywikibot.exceptions import InvalidTitleError
+            raise InvalidTitleError(text)
+        self.title = title[0].upper() + title[1:]
+
+    def canonical_title(self):
+        return self.title
+
+
+@pytest.fixture
+def fake_links(monkeypatch):
+    import transfer_infotable
+    monkeypatch.setattr(transfer_infotable.pw, 'Page',
+                        lambda site, title: SimpleNamespace(site=site, title=lambda: title))
+    monkeypatch.setattr(transfer_infotable.pw, 'Link', FakeLink)
+    monkeypatch.setattr(FakeLink, 'sites', {})
+    return FakeLink.sites
+
+
+class TestLinkResolver:
+
+    def test_resolve(self, fake_links):
+        from transfer_infotable import LinkResolver
+        ca = FakeWiki('ca', {'Barcelona': 1, 'Girona': 2}, redirects={'BCN': 'Barcelona'})
+        es = FakeWiki('es', {'Madrid': 3})
+        fake_links.update(ca=ca, es=es)
+        resolver = LinkResolver(sites={'ca': ca, 'es': es}, groupsize=2)
+        pages = resolver.resolve(['BCN', 'girona#Història', 'Girona', 'Madrid', 'Nowhere', '#Secció'],
+                                 langs=['ca', 'es'])
+        assert {link: page and (page.site.code, page.title(), page._pageid) for link, page in pages.items()} == {
+            'BCN': ('ca', 'Barcelona', 1), 'girona#Història': ('ca', 'Girona', 2), 'Girona': ('ca', 'Girona', 2),
+            'Madrid': ('es', 'Madrid', 3), 'Nowhere': None, '#Secció': None}
+        # Normalized and batched per site, and only the unresolved ones fall through
+        assert ca.requests == [('BCN', 'Girona'), ('Madrid', 'Nowhere')]
+        assert es.requests == [('Madrid', 'Nowhere')]
+        # Memoized
+        assert resolver.resolve(['Madrid'], langs=['ca', 'es'])['Madrid'].title() == 'Madrid'
+        assert len(ca.requests) + len(es.requests) == 3
+
+    def test_interwiki(self, fake_links):
+        from transfer_infotable import LinkResolver
+        ca = FakeWiki('ca', {'Madrid': 1})
+        es = FakeWiki('es', {'Madrid': 3})
+        fake_links.update(ca=ca, es=es)
+        resolver = LinkResolver(sites={'ca': ca, 'es': es})
+        pages = resolver.resolve(['es:Madrid', 'Madrid'], langs=['ca', 'es'])
+        assert {link: (page.site.code, page._pageid) for link, page in pages.items()} == {
+            'es:Madrid': ('es', 3), 'Madrid': ('ca', 1)}
+        assert (ca.requests, es.requests) == ([('Madrid',)], [('Madrid',)])
+
+    def test_cache(self, fake_links):
+        from transfer_infotable import LinkResolver
+        from wikidatabot.cache import LinkCache
+        ca = FakeWiki('ca', {'Barcelona': 1}, redirects={'BCN': 'Barcelona'})
+        cache = LinkCache()
+        page = LinkResolver(sites={'ca': ca}, cache=cache).resolve(['BCN', 'Nowhere'], langs=['ca'])['BCN']
+        LinkResolver(sites={'ca': ca}, cache=cache).set_qid(page, 'Q1492')
+        # Another run
+        resolver = LinkResolver(sites={'ca': ca}, cache=cache)
+        pages = resolver.resolve(['BCN', 'Nowhere'], langs=['ca'])
+        assert pages['BCN'].title() == 'Barcelona' and pages['Nowhere'] is None
+        assert resolver.get_qid(pages['BCN']) == 'Q1492'
+        assert len(ca.requests) == 1
+
+
+class TestOrganizationResolutions:
+
+    def test_resolve(self):
+        from transfer_infotable import OFFICE_HELD_BY_HEAD, OrganizationResolutions, PART
+        claims = {'P1313': [SimpleNamespace(getTarget=lambda: SimpleNamespace(id='Q2'))],
+                  'P527': [SimpleNamespace(getTarget=lambda: SimpleNamespace(id='Q3'))] * 2}
+        organizations = OrganizationResolutions(repo=None)
+        assert organizations.get('Q1', OFFICE_HELD_BY_HEAD) is None
+        assert organizations.resolve(SimpleNamespace(id='Q1', claims=claims), OFFICE_HELD_BY_HEAD) == ('Q2', None)
+        assert organizations.resolve(SimpleNamespace(id='Q1', claims=claims), PART) == (None, 'several')
+        assert organizations.get('Q1', OFFICE_HELD_BY_HEAD) == ('Q2', None)
+
+    def test_warm(self, monkeypatch):
+        import transfer_infotable
+        from transfer_infotable import (OFFICE_HELD_BY_HEAD, OFFICE_HELD_BY_HEAD_OF_STATE_OR_ORGANIZATION,
+                                        OrganizationResolutions, PART)
+        queries = []
+
+        class FakeSparqlQuery:
+            def __init__(self, repo=None):
+                pass
+
+            def select(self, query):
+                queries.append(query)
+                return [{'organization': 'http://www.wikidata.org/entity/Q1', 'property': 'P2388',
+                         'value': 'http://www.wikidata.org/entity/Q2'}]
+
+        monkeypatch.setattr(transfer_infotable, 'SparqlQuery', FakeSparqlQuery)
+        organizations = OrganizationResolutions(repo=None)
+        organizations.warm(['Q1', 'Q4', 'Q1'])
+        assert len(queries) == 1
+        assert 'wd:Q1 wd:Q4 }' in queries[0] and '("P1313" p:P1313 ps:P1313)' in queries[0]
+        assert organizations.get('Q1', OFFICE_HELD_BY_HEAD) == ('Q2', None)
+        assert organizations.get('Q1', OFFICE_HELD_BY_HEAD_OF_STATE_OR_ORGANIZATION) == ('Q2', None)
+        assert organizations.get('Q1', PART) == (None, 'none')
+        assert organizations.get('Q4', OFFICE_HELD_BY_HEAD) == (None, 'none')
+        # Already resolved
+        organizations.warm(['Q4'])
+        assert len(queries) == 1
+
+    def test_warm_failed(self, monkeypatch):
+        import transfer_infotable
+        from transfer_infotable import OFFICE_HELD_BY_HEAD, OrganizationResolutions
+
+        class FakeSparqlQuery:
+            def __init__(self, repo=None):
+                pass
+
+            def select(self, query):
+                return None
+
+        monkeypatch.setattr(transfer_infotable, 'SparqlQuery', FakeSparqlQuery)
+        organizations = OrganizationResolutions(repo=None)
+        organizations.warm(['Q1'])
+        # Not memoized as 'none': resolved from the item instead
+        assert organizations.get('Q1', OFFICE_HELD_BY_HEAD) is None
+
+    def test_warm_as_resolve(self, monkeypatch):
+        import transfer_infotable
+        from transfer_infotable import OFFICE_HELD_BY_HEAD, OrganizationResolutions, PART
+
+        class FakeSparqlQuery:
+            def __init__(self, repo=None):
+                pass
+
+            def select(self, query):
+                # Unbound value of a novalue statement; blank node of a somevalue one
+                return [{'organization': 'http://www.wikidata.org/entity/Q1', 'property': 'P1313',
+                         'value': 'http://www.wikidata.org/entity/Q2'},
+                        {'organization': 'http://www.wikidata.org/entity/Q1', 'property': 'P1313', 'value': None},
+                        {'organization': 'http://www.wikidata.org/entity/Q1', 'property': 'P527',
+                         'value': 't1234567890'}]
+
+        monkeypatch.setattr(transfer_infotable, 'SparqlQuery', FakeSparqlQuery)
+        warmed = OrganizationResolutions(repo=None)
+        warmed.warm(['Q1'], resolutions=[OFFICE_HELD_BY_HEAD, PART])
+        claims = {'P1313': [SimpleNamespace(getTarget=lambda: SimpleNamespace(id='Q2')),
+                            SimpleNamespace(getTarget=lambda: None)],
+                  'P527': [SimpleNamespace(getTarget=lambda: None)]}
+        resolved = OrganizationResolutions(repo=None)
+        for properties in (OFFICE_HELD_BY_HEAD, PART):
+            assert warmed.get('Q1', properties) == resolved.resolve(SimpleNamespace(id='Q1', claims=claims),
+                                                                    properties)
+        assert warmed.get('Q1', OFFICE_HELD_BY_HEAD) == (None, 'several')
+
+
+class TestPrefetchLinks:
+
+    def test_prefetch_links(self, fake_links, monkeypatch):
+        import transfer_infotable
+        from wikidatabot.models import Item
+        from wikidatabot.repository import CachedItemRepository
+
+        class FakeRepository:
+            def __init__(self):
+                self.requested = []
+                self.requested_pages = []
+
+            def get_many(self, item_ids, **kwargs):
+                self.requested.append(list(item_ids))
+                return [Item(id=item_id) for item_id in self.requested[-1]]
+
+            def get_many_from_pages(self, pages):
+                self.requested_pages.append([page.title() for page in pages])
+                return {(page.site.dbName(), page.title()): Item(id='Q3') for page in pages}
+
+        class FakeOrganizations:
+            warmed = []
+
+            def warm(self, organization_ids):
+                self.warmed.append(list(organization_ids))
+
+        ca = FakeWiki('ca', {'Barcelona': 1, 'Girona': 2, 'Madrid': 3})
+        links = transfer_infotable.LinkResolver(sites={'ca': ca})
+        links.LANGS = ['ca']
+        repository = FakeRepository()
+        items = CachedItemRepository(repository)
+        items.put(Item(id='Q1'))
+        organizations = FakeOrganizations()
+        monkeypatch.setattr(transfer_infotable, 'LINKS', links)
+        monkeypatch.setattr(transfer_infotable, 'ITEMS', items)
+        monkeypatch.setattr(transfer_infotable, 'ORGANIZATIONS', organizations)
+        pages = links.resolve(['Barcelona', 'Girona'])
+        links.set_qid(pages['Barcelona'], 'Q1')
+        links.set_qid(pages['Girona'], 'Q2')
+        positions = [{'carrec': "[[Barcelona]]", 'organitzacio': "[[Girona]] i [[Madrid|Madrid]]"}]
+        transfer_infotable.prefetch_links(positions)
+        # Known QIDs not cached yet fetched at once, and the other pages by page
+        assert repository.requested == [['Q2']]
+        assert repository.requested_pages == [['Madrid']]
+        assert links.get_qid(links.resolve(['Madrid'])['Madrid']) == 'Q3'
+        assert {'Q1', 'Q2', 'Q3'} <= set(items._cache)
+        # Once, after the links are resolved
+        assert organizations.warmed == [['Q1', 'Q2', 'Q3']]
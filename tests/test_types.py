@@ -1,19 +1,66 @@
+import pytest
+
 
 class TestClaim:
 
     def test_init(self, wikidatabot):
-        from wikidatabot.models import Claim
+        from wikidatabot.models import Claim, ItemId
         claim_property = 'P115'  # 'P488'
         claim_item = 'Q271'  # 'Q50'
         claim = Claim(property=claim_property, item=claim_item)
         assert claim.property == claim_property
-        assert isinstance(claim.value, wikidatabot.pywikibot.page.ItemPage)
-        assert claim.value.getID() == claim_item
+        assert isinstance(claim.value, ItemId)
+        assert claim.value.id == claim_item
+        assert claim._claim.getTarget().getID() == claim_item
         assert isinstance(claim._claim, wikidatabot.pywikibot.page.Claim)
         assert claim._claim.repo._BaseSite__code == 'test'  # 'wikidata'
         assert claim._claim.repo._BaseSite__family.name == 'wikidata'
 
 
+class TestValue:
+
+    def test_value(self):
+        import pickle
+        from wikidatabot.models import ItemId, Time
+        value = ItemId('Q1')
+        assert value == ItemId('Q1')
+        assert hash(value) == hash(ItemId('Q1'))
+        assert value != Time(1)
+        assert pickle.loads(pickle.dumps(value)) == value
+        with pytest.raises(AttributeError):
+            value.id = 'Q2'
+        assert not hasattr(value, '__dict__')
+
+    def test_time_precision(self):
+        from wikidatabot.models import Time
+        assert Time(2011).precision == 9
+        assert Time(2011, 2).precision == 10
+        assert Time(2011, 2, 17).precision == 11
+
+    def test_datavalue_metadata(self):
+        from wikidatabot.models import from_datavalue, to_datavalue
+        time = {'value': {'time': '+00000001582-10-04T00:00:00Z', 'precision': 11, 'after': 1, 'before': 2,
+                          'timezone': 60, 'calendarmodel': 'http://www.wikidata.org/entity/Q1985786'},
+                'type': 'time'}
+        assert to_datavalue(from_datavalue(time)) == time
+        quantity = {'value': {'amount': '+100', 'unit': 'http://www.wikidata.org/entity/Q11573',
+                              'upperBound': '+105', 'lowerBound': '+95'},
+                    'type': 'quantity'}
+        assert to_datavalue(from_datavalue(quantity)) == quantity
+        assert from_datavalue(quantity) != from_datavalue(dict(quantity, value={'amount': '+100', 'unit': '1'}))
+
+    def test_claim(self):
+        from wikidatabot.models import Claim, ItemId, MonolingualText, Quantity, Statement, Time
+        assert Claim(property='P39', item='Q1').value == ItemId('Q1')
+        assert Claim(property='P1082', quantity=10).value == Quantity(10)
+        assert Claim(property='P585', year=2011, month=2).value == Time(2011, 2)
+        assert Claim(property='P1476', text='a', language='fr').value == MonolingualText('a', 'fr')
+        # No pywikibot object is created
+        statement = Statement(claim=Claim(property='P39', item='Q1'), qualifiers=[Claim(property='P580', year=2011)])
+        assert statement._pwb_statement is None
+        assert statement.claim._pwb_claim is None
+
+
 class TestItem:
 
     def test_init_from_pwb_item(self, wikidatabot):
@@ -25,9 +72,9 @@ class TestItem:
         assert item.id == pwb_item.id
         assert item.labels == pwb_item.labels
         assert item.descriptions == pwb_item.descriptions
-        assert item.aliases == pwb_item.aliases
+        assert item.aliases == {language: tuple(aliases) for language, aliases in pwb_item.aliases.items()}
         assert item.statements == pwb_item.claims
-        assert item.sitelinks == pwb_item.sitelinks
+        assert item.sitelinks == {site: sitelink['title'] for site, sitelink in pwb_item.sitelinks.toJSON().items()}
 
     def test_init_from_id(self, wikidatabot):
         from wikidatabot.models import Item
@@ -39,6 +86,443 @@ class TestItem:
         assert item.id == pwb_item.id
         assert item.labels == pwb_item.labels
         assert item.descriptions == pwb_item.descriptions
-        assert item.aliases == pwb_item.aliases
+        assert item.aliases == {language: tuple(aliases) for language, aliases in pwb_item.aliases.items()}
         assert item.statements == pwb_item.claims
-        assert item.sitelinks == pwb_item.sitelinks
+        assert item.sitelinks == {site: sitelink['title'] for site, sitelink in pwb_item.sitelinks.toJSON().items()}
+
+
+class TestProjection:
+
+    def test_params(self):
+        from wikidatabot.models import Projection
+        assert Projection.create() is None
+        projection = Projection.create(properties=['P31'], languages=['ca', 'es'])
+        assert projection.params == {'props': ['info', 'labels', 'descriptions', 'aliases', 'claims'],
+                                     'languages': ['ca', 'es']}
+        assert Projection.create(properties=['P31'], languages=[]).params == {'props': ['info', 'claims']}
+
+    def test_covers(self):
+        from wikidatabot.models import covers, Projection
+        assert covers(None, Projection.create(properties=['P31']))
+        assert not covers(Projection.create(properties=['P31']), None)
+        assert covers(Projection.create(properties=['P31', 'P17']), Projection.create(properties=['P31']))
+        assert not covers(Projection.create(properties=['P31']), Projection.create(properties=['P31', 'P17']))
+        assert not covers(Projection.create(languages=['ca']), Projection.create(properties=['P31']))
+
+    def test_partial_item(self):
+        from wikidatabot.models import Item, NotFetchedError, Projection
+        data = {'id': 'Q1', 'labels': {'ca': {'language': 'ca', 'value': 'univers'},
+                                       'en': {'language': 'en', 'value': 'universe'}},
+                'sitelinks': {'cawiki': {'site': 'cawiki', 'title': 'Univers', 'badges': []}}}
+        item = Item.from_json(data, repo=None, projection=Projection.create(properties=[], languages=['ca']))
+        assert item.is_partial
+        assert item.labels == {'ca': 'univers'}
+        assert item.labels['ca'] == 'univers'
+        with pytest.raises(NotFetchedError):
+            item.labels['en']
+        with pytest.raises(NotFetchedError):
+            'P31' in item.statements
+        with pytest.raises(NotFetchedError):
+            item.sitelinks.get('cawiki')
+
+
+class TestItemRefresh:
+
+    def test_refresh(self):
+        from wikidatabot.models import Item, Projection
+        item = Item.from_json({'id': 'Q1'}, repo=None, projection=Projection.create(languages=['ca']))
+        refreshed = []
+        item._observers.append(lambda item, entity: refreshed.append(entity['lastrevid']))
+        item.refresh({'id': 'Q1', 'lastrevid': 2, 'labels': {'en': {'language': 'en', 'value': 'universe'}}})
+        assert item.labels == {'en': 'universe'}
+        assert not item.is_partial
+        assert refreshed == [2]
+
+    def test_refresh_parse(self):
+        import wikidatabot
+        from wikidatabot.models import Item, ItemId, Statement
+        claims = {'P31': [{'mainsnak': {'snaktype': 'value', 'property': 'P31',
+                                        'datavalue': {'value': {'entity-type': 'item', 'id': 'Q5'},
+                                                      'type': 'wikibase-entityid'}},
+                           'type': 'statement', 'rank': 'normal'}]}
+        backend = wikidatabot._backend
+        wikidatabot.configure('offline')
+        try:
+            # As read from a dump
+            item = Item.from_json({'id': 'Q1'}, repo=None, parse=Statement.from_json)
+            item.refresh({'id': 'Q1', 'lastrevid': 2, 'claims': claims})
+            [statement] = item.statements['P31']
+            assert isinstance(statement, Statement) and statement.claim.value == ItemId('Q5')
+        finally:
+            wikidatabot.configure(backend)
+
+
+class TestLazyStatements:
+
+    def test_parse_on_access(self, monkeypatch):
+        import wikidatabot.models as models
+        parsed = []
+        monkeypatch.setattr(models.pywikibot.Claim, 'fromJSON', lambda repo, claim: parsed.append(claim) or claim)
+        item = models.Item.from_json({'id': 'Q1', 'claims': {'P31': [{'id': 'Q1$1'}], 'P17': [{'id': 'Q1$2'}]}},
+                                     repo=None)
+        assert 'P31' in item.statements
+        assert sorted(item.statements) == ['P17', 'P31']
+        assert parsed == []
+        assert item.statements['P31'] == [{'id': 'Q1$1'}]
+        assert item.statements['P31'] == [{'id': 'Q1$1'}]
+        assert parsed == [{'id': 'Q1$1'}]
+        assert item.statements._unparsed == {'P17'}
+
+    def test_projection(self):
+        from wikidatabot.models import Item, NotFetchedError, Projection
+        item = Item.from_json({'id': 'Q1', 'claims': {}}, repo=None, projection=Projection.create(properties=['P31']))
+        assert 'P31' not in item.statements
+        with pytest.raises(NotFetchedError):
+            'P17' in item.statements
+        item.statements.setdefault('P17', []).append('claim')
+        assert item.statements['P17'] == ['claim']
+
+
+class TestItemEdit:
+
+    def test_commit(self, monkeypatch):
+        from types import SimpleNamespace
+        import wikidatabot.models as models
+        requests = []
+
+        def edit_entity(identification, data, **kwargs):
+            requests.append((identification, data, kwargs))
+            return {'entity': {'id': 'Q1', 'lastrevid': 2, 'labels': {'ca': {'language': 'ca', 'value': 'univers'}}}}
+
+        monkeypatch.setattr(models, 'repo', SimpleNamespace(editEntity=edit_entity))
+        claim = SimpleNamespace(rank='preferred', qualifiers={}, sources=[],
+                                toJSON=lambda: {'id': 'Q1$1', 'rank': claim.rank})
+        item = models.Item(id='Q1', labels={}, descriptions={}, statements={'P1082': [claim]}, lastrevid=1)
+        with item.edit(summary='test') as edit:
+            edit.change_rank(claim, 'preferred')
+            assert not edit
+            edit.set_label('ca', 'univers')
+            edit.change_rank(claim, 'normal')
+            assert item.labels == {'ca': 'univers'}
+        assert requests == [({'id': 'Q1'},
+                             {'labels': {'ca': {'language': 'ca', 'value': 'univers'}},
+                              'claims': [{'id': 'Q1$1', 'rank': 'normal'}]},
+                             {'summary': 'test', 'baserevid': 1})]
+        assert item.lastrevid == 2
+        # Nothing left to commit
+        assert edit.commit() is None
+
+    def test_rollback(self, monkeypatch):
+        from types import SimpleNamespace
+        import wikidatabot.models as models
+
+        def edit_entity(identification, data, **kwargs):
+            raise models.pywikibot.exceptions.APIError('editconflict', 'Edit conflict')
+
+        monkeypatch.setattr(models, 'repo', SimpleNamespace(editEntity=edit_entity))
+        claim = SimpleNamespace(rank='preferred', qualifiers={'P585': ['2017']}, sources=[],
+                                toJSON=lambda: {'id': 'Q1$1', 'rank': claim.rank})
+        raw = {'mainsnak': {'snaktype': 'somevalue', 'property': 'P1082'}, 'type': 'statement'}
+        item = models.Item.from_json({'id': 'Q1', 'labels': {'ca': {'language': 'ca', 'value': 'univers'}},
+                                      'claims': {'P31': [raw]}, 'lastrevid': 1}, repo=None)
+        item.statements['P1082'] = [claim]
+        statement = models.Statement(claim=models.Claim(property='P31', item='Q5'))
+        with pytest.raises(models.pywikibot.exceptions.APIError):
+            with item.edit() as edit:
+                edit.change_rank(claim, 'normal')
+                claim.qualifiers['P585'].append('2018')
+                edit.set_label('ca', 'cosmos')
+                edit.set_label('en', 'universe')
+                edit.add_statement(statement)
+                edit.add_statement(models.Statement(claim=models.Claim(property='P17', item='Q29')))
+        # The item is left as it was
+        assert item.labels == {'ca': 'univers'}
+        assert (claim.rank, claim.qualifiers) == ('preferred', {'P585': ['2017']})
+        assert models.statements_json(item.statements)['P31'] == [raw]
+        assert sorted(item.statements) == ['P1082', 'P31']
+        assert not edit
+        # Also if an exception is raised in the with block
+        with pytest.raises(RuntimeError):
+            with item.edit() as edit:
+                edit.set_label('ca', 'cosmos')
+                raise RuntimeError
+        assert item.labels == {'ca': 'univers'}
+
+    def test_add_statement(self, monkeypatch):
+        from types import SimpleNamespace
+        import wikidatabot.models as models
+        requests = []
+        monkeypatch.setattr(models, 'repo', SimpleNamespace(
+            editEntity=lambda identification, data, **kwargs: requests.append(data) or {'entity': {'id': 'Q1'}}))
+        claim = {'id': 'Q1$1', 'mainsnak': {'snaktype': 'somevalue', 'property': 'P1082'}, 'type': 'statement'}
+        item = models.Item.from_json({'id': 'Q1', 'claims': {'P1082': [claim]}}, repo=None)
+        statement = models.Statement(claim=models.Claim(property='P1082', quantity=10))
+        with item.edit() as edit:
+            edit.add_statement(statement)
+            # Not parsed into a pywikibot claim
+            assert item.statements._data['P1082'] == [claim, statement.to_json()]
+            assert statement._pwb_statement is None
+        assert requests == [{'claims': [statement.to_json()]}]
+
+
+class TestStatement:
+
+    def test_to_json(self):
+        from wikidatabot.models import Claim, Statement
+        statement = Statement(claim=Claim(property='P1082', quantity=1200), rank='preferred',
+                              qualifiers=[Claim(property='P585', year=2017)],
+                              sources=[Claim(property='P248', item='Q156616'),
+                                       Claim(property='P1476', text='Populations légales', language='fr')])
+        data = statement.to_json()
+        assert data == {
+            'mainsnak': {'snaktype': 'value', 'property': 'P1082',
+                         'datavalue': {'value': {'amount': '+1200', 'unit': '1'}, 'type': 'quantity'}},
+            'type': 'statement',
+            'rank': 'preferred',
+            'qualifiers': {'P585': [{'snaktype': 'value', 'property': 'P585', 'datavalue': {
+                'value': {'time': '+00000002017-01-01T00:00:00Z', 'precision': 9, 'after': 0, 'before': 0,
+                          'timezone': 0, 'calendarmodel': 'http://www.wikidata.org/entity/Q1985727'},
+                'type': 'time'}}]},
+            'qualifiers-order': ['P585'],
+            'references': [{'snaks': {
+                'P248': [{'snaktype': 'value', 'property': 'P248', 'datavalue': {
+                    'value': {'entity-type': 'item', 'numeric-id': 156616, 'id': 'Q156616'},
+                    'type': 'wikibase-entityid'}}],
+                'P1476': [{'snaktype': 'value', 'property': 'P1476', 'datavalue': {
+                    'value': {'text': 'Populations légales', 'language': 'fr'}, 'type': 'monolingualtext'}}]},
+                'snaks-order': ['P248', 'P1476']}],
+        }
+        # Cached until changed
+        assert statement.to_json() is data
+        statement.rank = 'normal'
+        assert statement.to_json()['rank'] == 'normal'
+        assert statement._pwb_statement is None
+
+    def test_from_json(self):
+        from wikidatabot.models import Claim, Statement
+        data = Statement(claim=Claim(property='P1082', quantity=1200), id='Q90$1').to_json()
+        assert data['id'] == 'Q90$1'
+        assert Statement.from_json(data).id == 'Q90$1'
+        assert Statement.from_json(data).to_json() == data
+
+
+class TestStatementIndex:
+
+    def test_find(self):
+        from types import SimpleNamespace
+        from wikidatabot.models import ItemId, StatementIndex, Time
+
+        def claim(target, **qualifiers):
+            return SimpleNamespace(target=target, qualifiers={
+                pid: [SimpleNamespace(target=value)] for pid, value in qualifiers.items()})
+
+        def ids(statements):
+            return {id(statement) for statement in statements}
+
+        deputy = claim(ItemId('Q18171345'), P580=Time(2011, 2, 17), P768=ItemId('Q28496610'))
+        senator = claim(ItemId('Q19323171'), P580=Time(2011))
+        index = StatementIndex({'P39': [deputy, senator], 'P1082': [claim('1200')]})
+        assert index.find('P39', ItemId('Q18171345')) == [deputy]
+        assert index.find('P39', ItemId('Q1')) == []
+        assert index.find('P1082', '1200') != []
+        assert index.find_qualified('P39', 'P768', ItemId('Q28496610')) == [deputy]
+        # Times are equal up to the coarser precision of both
+        assert ids(index.find_qualified('P39', 'P580', Time(2011))) == ids([deputy, senator])
+        assert ids(index.find_qualified('P39', 'P580', Time(2011, 2))) == ids([deputy, senator])
+        assert index.find_qualified('P39', 'P580', Time(2011, 3, 1)) == [senator]
+        assert index.find_qualified('P39', 'P580', Time(2012)) == []
+
+    def test_find_overlapping(self):
+        from types import SimpleNamespace
+        from wikidatabot.models import ItemId, StatementIndex, Time
+
+        def claim(target, start=None, end=None):
+            qualifiers = {}
+            if start:
+                qualifiers['P580'] = [SimpleNamespace(target=start)]
+            if end:
+                qualifiers['P582'] = [SimpleNamespace(target=end)]
+            return SimpleNamespace(target=target, qualifiers=qualifiers)
+
+        first = claim(ItemId('Q1'), start=Time(2004, 4, 2), end=Time(2008))
+        second = claim(ItemId('Q1'), start=Time(2008, 4, 1), end=Time(2011, 2, 17))
+        open_ = claim(ItemId('Q2'), start=Time(2015))
+        index = StatementIndex({'P39': [second, open_, first]})
+        assert index.find_overlapping('P39', start=Time(2005), end=Time(2006)) == [first]
+        assert index.find_overlapping('P39', start=Time(2008, 3, 1), end=Time(2008, 3, 2)) == [first]
+        assert index.find_overlapping('P39', start=Time(2010), end=Time(2016)) == [second, open_]
+        assert index.find_overlapping('P39', start=Time(2010), value=ItemId('Q1')) == [second]
+        assert len(index.find_overlapping('P39')) == 3
+
+    def test_index_on_demand(self, monkeypatch):
+        from types import SimpleNamespace
+        import wikidatabot.models as models
+        monkeypatch.setattr(models.pywikibot.Claim, 'fromJSON',
+                            lambda repo, claim: SimpleNamespace(target=claim['value'], qualifiers={}))
+        statements = models.LazyStatements({'P39': [{'value': models.ItemId('Q1')}], 'P1082': [{'value': '1200'}]},
+                                           repo=None)
+        index = models.StatementIndex(statements)
+        assert statements._unparsed == {'P39', 'P1082'}
+        assert len(index.find('P39', models.ItemId('Q1'))) == 1
+        # Only the statements of the property looked up are parsed
+        assert statements._unparsed == {'P1082'}
+        assert index.find_overlapping('P31') == []
+
+    def test_update(self, monkeypatch):
+        from types import SimpleNamespace
+        import wikidatabot.models as models
+        monkeypatch.setattr(models.pywikibot.Claim, 'fromJSON', lambda repo, claim: SimpleNamespace(
+            target=models.from_datavalue(claim['mainsnak']['datavalue']), qualifiers={}))
+        position = models.Statement(claim=models.Claim(property='P39', item='Q1')).to_json()
+        item = models.Item.from_json({'id': 'Q1', 'claims': {'P39': [position]}}, repo=None)
+        index = item.index
+        assert len(index.find('P39', models.ItemId('Q1'))) == 1
+        edit = item.edit()
+        edit.add_statement(models.Statement(claim=models.Claim(property='P39', item='Q2')))
+        edit.add_statement(models.Statement(claim=models.Claim(property='P17', item='Q29')))
+        # Updated, not rebuilt
+        assert item.index is index
+        assert [statement.target for statement in index.find('P39', models.ItemId('Q2'))] == [models.ItemId('Q2')]
+        assert 'P17' in item.statements._unparsed
+        assert len(index.find('P17', models.ItemId('Q29'))) == 1
+
+    def test_time_key(self):
+        from wikidatabot.models import Time, time_key, time_matches, time_refines
+        assert time_key(Time(2011, 2, 17)) == (2011, 2, 17)
+        assert time_key(Time(2011, 2, 17, precision=9)) == (2011,)
+        assert time_matches((2011,), (2011, 2, 17))
+        assert not time_matches((2011, 3), (2011, 2, 17))
+        assert time_refines((2011, 2, 17), (2011,))
+        assert not time_refines((2011,), (2011,))
+
+
+class TestSourceContainer:
+
+    def test_sources(self):
+        from wikidatabot.models import Source, SourceContainer, Statement, Claim
+        stated_in = Source(property='P248', item='Q156616')
+        sources = SourceContainer([[stated_in, Source(property='P577', year=2019)]])
+        assert [Source(property='P577', year=2019), Source(property='P248', item='Q156616')] in sources
+        assert [stated_in] not in sources
+        assert sources.has_source(Source(property='P248', item='Q156616'))
+        assert not sources.has_source(Source(property='P248', item='Q1'))
+        # Identical blocks are shared
+        statements = [Statement(claim=Claim(property='P374', value=code),
+                                sources=[Source(property='P248', item='Q156616'), Source(property='P577', year=2019)])
+                      for code in ['01001', '01002']]
+        assert list(statements[0].sources)[0] is list(statements[1].sources)[0] is list(sources)[0]
+        assert statements[0].to_json()['references'][0] is statements[1].to_json()['references'][0]
+
+    def test_unsupported_and_no_values(self):
+        from types import SimpleNamespace
+        from wikidatabot.models import Claim, RawValue, Source, SourceContainer, Statement
+        coordinate = {'value': {'latitude': 41.4, 'longitude': 2.2, 'altitude': None, 'precision': 0.01,
+                                'globe': 'http://www.wikidata.org/entity/Q2'},
+                      'type': 'globecoordinate'}
+        pwb_source = SimpleNamespace(getID=lambda: 'P625', getSnakType=lambda: 'value', getTarget=lambda: object(),
+                                     _formatDataValue=lambda: coordinate)
+        sources = SourceContainer.from_pwb([{'P625': [pwb_source]}])
+        source = Source.from_json({'snaktype': 'value', 'property': 'P625', 'datavalue': coordinate})
+        assert isinstance(source.value, RawValue)
+        assert sources.has_source(source)
+        assert source.to_json()['datavalue'] == coordinate
+        # novalue is not somevalue
+        novalue = Claim.from_json({'snaktype': 'novalue', 'property': 'P1082'})
+        somevalue = Claim.from_json({'snaktype': 'somevalue', 'property': 'P1082'})
+        assert novalue.value is somevalue.value is None
+        assert novalue.to_json() == {'snaktype': 'novalue', 'property': 'P1082'}
+        assert novalue._key() != somevalue._key()
+        assert Claim(property='P1082').snaktype == 'somevalue'
+        statement = Statement(claim=novalue, sources=[source])
+        assert Statement.from_json(statement.to_json())._key() == statement._key()
+
+
+class TestTermContainer:
+
+    def test_languages(self):
+        from wikidatabot.models import Label, LabelContainer
+        labels = LabelContainer.from_json({'fr': {'language': 'fr', 'value': 'Paris'},
+                                           'ca': {'language': 'ca', 'value': 'París'},
+                                           'de': {'language': 'de', 'value': 'Paris'}}, languages={'ca', 'fr', 'es'})
+        assert labels == {'ca': 'París', 'fr': 'Paris'}
+        assert labels.term('ca') == Label(language='ca', text='París')
+        assert labels.get('es') is None
+        labels['de'] = 'Paris'
+        labels['es'] = 'París'
+        assert list(labels) == ['ca', 'es', 'fr']
+        del labels['ca']
+        assert 'ca' not in labels
+        assert not hasattr(labels, '__dict__')
+
+    def test_aliases(self):
+        from wikidatabot.models import Alias, AliasContainer
+        aliases = AliasContainer.from_json({'fr': [{'language': 'fr', 'value': 'Lutèce'},
+                                                   {'language': 'fr', 'value': 'Ville Lumière'}]})
+        assert aliases['fr'] == ('Lutèce', 'Ville Lumière')
+        assert aliases.term('fr') == [Alias(language='fr', text='Lutèce'), Alias(language='fr', text='Ville Lumière')]
+
+    def test_item_languages(self, monkeypatch):
+        from wikidatabot.models import AliasContainer, Item, LabelContainer, TermContainer
+        monkeypatch.setattr(TermContainer, 'default_languages', frozenset({'ca'}))
+        labels = {'ca': {'language': 'ca', 'value': 'univers'}, 'en': {'language': 'en', 'value': 'universe'}}
+        aliases = {'en': [{'language': 'en', 'value': 'cosmos'}]}
+        item = Item.from_json({'id': 'Q1', 'labels': labels, 'aliases': aliases}, repo=None)
+        assert isinstance(item.labels, LabelContainer) and isinstance(item.aliases, AliasContainer)
+        assert item.labels == {'ca': 'univers'}
+        assert not item.aliases
+        assert Item.loads(item.dumps(), repo=None).labels == {'ca': 'univers'}
+        assert Item(id='Q1', labels={'ca': 'univers', 'en': 'universe'}).labels == {'ca': 'univers'}
+
+
+class TestSerialization:
+
+    def test_compact_json(self):
+        from wikidatabot.models import compact_json, expand_json, ItemId
+        snak = {'snaktype': 'value', 'property': 'P31', 'hash': 'abc', 'datavalue': ItemId('Q5').to_json()}
+        assert compact_json(snak) == {'snaktype': 'value', 'property': 'P31',
+                                      'datavalue': {'value': 5, 'type': 'wikibase-entityid'}}
+        assert expand_json(compact_json(snak)) == {key: value for key, value in snak.items() if key != 'hash'}
+
+    def test_statement(self):
+        import pickle
+        from wikidatabot.models import Claim, Qualifier, Source, Statement
+        statement = Statement(claim=Claim(property='P39', item='Q1'), rank='preferred',
+                              qualifiers=[Qualifier(property='P580', year=2011, month=2),
+                                          Qualifier(property='P1082', quantity=10)],
+                              sources=[Source(property='P143', item='Q199693')])
+        for loaded in [Statement.loads(statement.dumps()), pickle.loads(pickle.dumps(statement))]:
+            assert loaded.to_json() == statement.to_json()
+            assert loaded._key() == statement._key()
+
+    def test_item(self):
+        import pickle
+        import wikidatabot
+        import wikidatabot.models as models
+        claim = {'mainsnak': {'snaktype': 'value', 'property': 'P31', 'datatype': 'wikibase-item',
+                              'datavalue': models.ItemId('Q5').to_json()},
+                 'type': 'statement', 'id': 'Q1$1', 'rank': 'normal'}
+        data = {'id': 'Q1', 'lastrevid': 2,
+                'labels': {'ca': {'language': 'ca', 'value': 'univers'}},
+                'aliases': {'ca': [{'language': 'ca', 'value': 'cosmos'}]},
+                'claims': {'P31': [claim]},
+                'sitelinks': {'cawiki': {'site': 'cawiki', 'title': 'Univers', 'badges': []}}}
+        backend = wikidatabot._backend
+        # No site is constructed
+        wikidatabot.configure('offline')
+        try:
+            item = models.Item.from_json(data)
+            item._observers.append(lambda item, entity: None)
+            loaded = pickle.loads(pickle.dumps(item))
+            assert (loaded.id, loaded.lastrevid, loaded.labels, loaded.aliases, loaded.sitelinks) == \
+                ('Q1', 2, {'ca': 'univers'}, {'ca': ('cosmos',)}, {'cawiki': 'Univers'})
+            assert models.statements_json(loaded.statements) == {'P31': [claim]}
+            # The pywikibot item is only created on first use
+            with pytest.raises(wikidatabot.OfflineError):
+                loaded._item
+            assert loaded._pwb_content['claims']['P31'][0]['mainsnak'] == claim['mainsnak']
+        finally:
+            wikidatabot.configure(backend)
+        partial = models.Item.from_json(data, repo=None, projection=models.Projection.create(properties=['P17']))
+        loaded = models.Item.loads(partial.dumps(), repo=None)
+        assert loaded.projection == partial.projection
+        assert 'P17' not in loaded.statements
@@ -1,22 +1,101 @@
-""""""
+"""Wikidata bot.
+
+`site` and `repo` are lazy proxies: the underlying pywikibot objects are only constructed (and logged in) on first
+use. The backend is selected with `configure` or the WIKIDATABOT_BACKEND environment variable:
+
+- 'live': wikidata:wikidata (default)
+- 'test': wikidata:test
+- 'offline': no site is ever constructed; any use raises OfflineError
+"""
+import os
 
 import pywikibot
 
-# class Site:
-#     _instance = None
-#
-#     def __init__(self, language='wikidata', family='wikidata'):
-#         if Site._instance is None:
-#             Site._instance = pywikibot.Site(language, fam=family)
-#
-#     def __getattr__(self, item):
-#         return getattr(Site._instance, item)
-#
-#     def __setattr__(self, key, value):
-#         return setattr(Site._instance, key, value)
-#
-#
-# SITE = Site()
-
-site = pywikibot.Site('wikidata', "wikidata")
-repo = site.data_repository()
\ No newline at end of file
+
+BACKENDS = {
+    'live': ('wikidata', 'wikidata'),
+    'test': ('test', 'wikidata'),
+    'offline': None,
+}
+
+_backend = os.environ.get('WIKIDATABOT_BACKEND', 'live')
+
+
+class OfflineError(RuntimeError):
+    pass
+
+
+class Lazy:
+    """Proxy to an object constructed on first use.
+
+    Attribute access, equality and hashing are delegated to the constructed object, which also answers
+    `isinstance` checks (pywikibot validates its site arguments this way).
+    """
+    __slots__ = ('_factory', '_instance')
+
+    def __init__(self, factory):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_instance', None)
+
+    def _get(self):
+        if self._instance is None:
+            object.__setattr__(self, '_instance', self._factory())
+        return self._instance
+
+    def _reset(self):
+        object.__setattr__(self, '_instance', None)
+
+    @property
+    def __class__(self):
+        return self._get().__class__
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+    def __eq__(self, other):
+        if type(other) is Lazy:
+            other = other._get()
+        return self._get() == other
+
+    def __hash__(self):
+        return hash(self._get())
+
+    def __str__(self):
+        return str(self._get())
+
+    def __repr__(self):
+        if self._instance is None:
+            return f"<Lazy {self._factory!r}>"
+        return repr(self._instance)
+
+
+def _create_site(code=None, fam=None):
+    if _backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {_backend!r}: use one of {list(BACKENDS)}")
+    if BACKENDS[_backend] is None:
+        raise OfflineError(f"No site available with backend {_backend!r}")
+    if code is None:
+        code, fam = BACKENDS[_backend]
+    return pywikibot.Site(code, fam)
+
+
+def lazy_site(code, fam):
+    """Return a lazy proxy to pywikibot.Site(code, fam), honouring the offline backend."""
+    return Lazy(lambda: _create_site(code, fam))
+
+
+def configure(backend='live'):
+    """Select the backend of `site` and `repo`; they are reconstructed on next use."""
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}: use one of {list(BACKENDS)}")
+    _backend = backend
+    site._reset()
+    repo._reset()
+
+
+site = Lazy(_create_site)
+repo = Lazy(lambda: site.data_repository())
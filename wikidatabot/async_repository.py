@@ -0,0 +1,160 @@
+"""Asyncio ItemRepository, over the MediaWiki API with aiohttp (extra: async)."""
+import asyncio
+import json
+from typing import AsyncIterator, Iterable, List
+
+import aiohttp
+from pywikibot.backports import batched
+from pywikibot.exceptions import APIError, NoPageError
+
+from wikidatabot import repo
+from wikidatabot.models import Item, Projection
+from wikidatabot.repository import paginate_query
+
+
+WIKIDATA_API_URL = 'https://www.wikidata.org/w/api.php'
+WIKIDATA_SPARQL_URL = 'https://query.wikidata.org/sparql'
+USER_AGENT = 'wikidatabot (https://github.com/albertvillanova/avmbot)'
+
+
+class AsyncItemRepository:
+    """Asyncio implementation of ItemRepository.
+
+    Reads run concurrently, at most concurrency requests at a time, over a pool of at most limit_per_host
+    connections per host. Writes are sent one at a time, in the order edit is called.
+
+    Use it as an async context manager, which opens and closes its HTTP session. Edits need a session logged in to
+    the API (e.g. with its cookies), given as session; items are parsed into pywikibot claims of repo.
+    """
+    def __init__(self, api_url: str = WIKIDATA_API_URL, sparql_url: str = WIKIDATA_SPARQL_URL, repo=repo,
+                 concurrency: int = 100, limit_per_host: int = 10, session: aiohttp.ClientSession = None):
+        self.api_url = api_url
+        self.sparql_url = sparql_url
+        self.repo = repo
+        self.concurrency = concurrency
+        self.limit_per_host = limit_per_host
+        self.session = session
+        self._owns_session = session is None
+        self._semaphore = None
+        self._write_lock = None
+        self._token = None
+
+    async def __aenter__(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host),
+                headers={'User-Agent': USER_AGENT})
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        # Fair: waiting writes acquire it in order
+        self._write_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._owns_session:
+            await self.session.close()
+            self.session = None
+
+    async def get(self, item_id: str, properties: Iterable[str] = None, languages: Iterable[str] = None) -> Item:
+        """Get an item.
+
+        :raises pywikibot.exceptions.NoPageError: if the item does not exist, as in the other repositories.
+        """
+        items = await self.get_many([item_id], properties=properties, languages=languages)
+        if not items:
+            raise NoPageError(item_id, f"Item {item_id} doesn't exist.")
+        return items[0]
+
+    async def get_many(self, item_ids: Iterable[str], groupsize: int = 50, properties: Iterable[str] = None,
+                       languages: Iterable[str] = None) -> List[Item]:
+        """Get items with concurrent wbgetentities requests, one per group of ids; missing items are skipped.
+
+        See `ItemPywikibotRepository.get_many`.
+        """
+        projection = Projection.create(properties=properties, languages=languages)
+        params = {key: '|'.join(value) for key, value in projection.params.items()} if projection else {}
+        responses = await asyncio.gather(*(
+            self._request(action='wbgetentities', ids='|'.join(batch), **params)
+            for batch in batched(item_ids, groupsize)))
+        return [Item.from_json(entity, repo=self.repo, projection=projection)
+                for data in responses for entity in data['entities'].values() if 'missing' not in entity]
+
+    async def list(self, query: str, page_size: int = 5000, item_name: str = 'item', properties: Iterable[str] = None,
+                   languages: Iterable[str] = None) -> AsyncIterator[Item]:
+        """Stream the items selected by a SPARQL query: see `ItemPywikibotRepository.list`.
+
+        The items of each page are fetched concurrently while the next page is queried. If the stream is not consumed
+        to the end (e.g. the consumer breaks early), the requests in flight are cancelled when it is closed.
+        """
+        cursor = None
+        items = None
+        page = asyncio.ensure_future(self._select(paginate_query(query, limit=page_size, item_name=item_name)))
+        try:
+            while True:
+                results = await page
+                if not results:
+                    return
+                uris = list(dict.fromkeys(result[item_name]['value'] for result in results))
+                items = asyncio.ensure_future(self.get_many(
+                    (uri.rsplit('/', 1)[-1] for uri in uris), properties=properties, languages=languages))
+                if len(results) < page_size:
+                    page = None
+                else:
+                    cursor = uris[-1]
+                    page = asyncio.ensure_future(
+                        self._select(paginate_query(query, cursor=cursor, limit=page_size, item_name=item_name)))
+                for item in await items:
+                    yield item
+                if page is None:
+                    return
+        finally:
+            for task in (page, items):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def edit(self, item: Item, data: dict, summary: str = None) -> dict:
+        """Edit the item with wbeditentity data, based on its lastrevid, and refresh it from the response.
+
+        Edits are sent in the order they are called. The csrf token is fetched once and, if it is no longer valid
+        (badtoken error, e.g. the session expired), fetched again and the edit retried once.
+        """
+        async with self._write_lock:
+            params = {'id': item.id, 'data': json.dumps(data), 'bot': '1'}
+            if item.lastrevid is not None:
+                params['baserevid'] = str(item.lastrevid)
+            if summary:
+                params['summary'] = summary
+            try:
+                response = await self._request(method='POST', action='wbeditentity', token=await self._csrf_token(),
+                                               **params)
+            except APIError as e:
+                if e.code != 'badtoken':
+                    raise
+                self._token = None
+                response = await self._request(method='POST', action='wbeditentity', token=await self._csrf_token(),
+                                               **params)
+            item.refresh(response['entity'])
+            return response
+
+    async def _csrf_token(self) -> str:
+        if self._token is None:
+            tokens = await self._request(action='query', meta='tokens', type='csrf')
+            self._token = tokens['query']['tokens']['csrftoken']
+        return self._token
+
+    async def _select(self, query: str) -> List[dict]:
+        async with self._semaphore:
+            async with self.session.get(self.sparql_url, params={'query': query, 'format': 'json'}) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+        return data['results']['bindings']
+
+    async def _request(self, method: str = 'GET', **params) -> dict:
+        params = dict(params, format='json', formatversion='2')
+        kwargs = {'data': params} if method == 'POST' else {'params': params}
+        async with self._semaphore:
+            async with self.session.request(method, self.api_url, **kwargs) as response:
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+        if 'error' in data:
+            raise APIError(data['error'].get('code'), data['error'].get('info'))
+        return data
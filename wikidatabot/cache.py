@@ -0,0 +1,126 @@
+"""Persistent caches."""
+import json
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class EntityCache:
+    """SQLite cache of raw entity JSON, keyed by entity id.
+
+    The lastrevid of each entity is stored alongside, so that cached entities can be revalidated cheaply.
+    """
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(str(path))
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entities (id TEXT PRIMARY KEY, lastrevid INTEGER, data TEXT)")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+
+    def get(self, entity_id: str) -> dict:
+        return self.get_many([entity_id]).get(entity_id)
+
+    def get_many(self, entity_ids: Iterable[str]) -> Dict[str, dict]:
+        entity_ids = list(entity_ids)
+        if not entity_ids:
+            return {}
+        rows = self.connection.execute(
+            f"SELECT id, data FROM entities WHERE id IN ({', '.join('?' * len(entity_ids))})", entity_ids)
+        return {entity_id: json.loads(data) for entity_id, data in rows}
+
+    def put(self, entity: dict):
+        self.put_many([entity])
+
+    def put_many(self, entities: Iterable[dict]):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO entities (id, lastrevid, data) VALUES (?, ?, ?)",
+                ((entity['id'], entity.get('lastrevid'), json.dumps(entity, separators=(',', ':')))
+                 for entity in entities))
+
+    def delete_many(self, entity_ids: Iterable[str]):
+        with self.connection:
+            self.connection.executemany("DELETE FROM entities WHERE id = ?", ((entity_id,) for entity_id in entity_ids))
+
+    def close(self):
+        self.connection.close()
+
+
+class LinkCache:
+    """SQLite cache of page link resolution, keyed by (language, title): resolved title and page id, or missing (None).
+
+    The QID of the resolved page is stored alongside, once known. Entries expire after ttl seconds, or missing_ttl if
+    missing (never if None), and their QIDs with them. When the resolved title of a link changes (e.g. its redirect
+    target), the entries resolved to its former title are invalidated too, as the redirects to it may have changed as
+    well.
+    """
+    def __init__(self, path=':memory:', ttl: float = None, missing_ttl: float = None):
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.connection = sqlite3.connect(str(path))
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS links (lang TEXT, title TEXT, resolved TEXT, page_id INTEGER, qid TEXT, "
+                "fetched_at REAL, PRIMARY KEY (lang, title))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS links_resolved ON links (lang, resolved)")
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+    def get_many(self, lang: str, titles: Iterable[str]) -> Dict[str, Optional[Tuple[str, int]]]:
+        """Return the unexpired (resolved title, page id) of the titles; None if missing."""
+        titles = list(titles)
+        if not titles:
+            return {}
+        now = time.time()
+        rows = self.connection.execute(
+            f"SELECT title, resolved, page_id, fetched_at FROM links "
+            f"WHERE lang = ? AND title IN ({', '.join('?' * len(titles))})", [lang] + titles)
+        entries = {}
+        for title, resolved, page_id, fetched_at in rows:
+            ttl = self.ttl if resolved is not None else self.missing_ttl
+            if ttl is None or now - fetched_at <= ttl:
+                entries[title] = (resolved, page_id) if resolved is not None else None
+        return entries
+
+    def put_many(self, lang: str, entries: Dict[str, Optional[Tuple[str, int]]]):
+        """Store the (resolved title, page id) of the titles, or None if missing."""
+        if not entries:
+            return
+        titles = list(entries)
+        previous = dict(self.connection.execute(
+            f"SELECT title, resolved FROM links WHERE lang = ? AND title IN ({', '.join('?' * len(titles))})",
+            [lang] + titles))
+        now = time.time()
+        fetched_since = self._fetched_since(now)
+        with self.connection:
+            changed = [(lang, previous[title]) for title, entry in entries.items()
+                       if previous.get(title) is not None and (entry[0] if entry else None) != previous[title]]
+            self.connection.executemany("DELETE FROM links WHERE lang = ? AND resolved = ?", changed)
+            # Keep the unexpired QID of the resolved title, if known
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO links (lang, title, resolved, page_id, qid, fetched_at) "
+                "VALUES (?, ?, ?, ?, (SELECT qid FROM links WHERE lang = ? AND resolved = ? AND fetched_at >= ? "
+                "AND qid IS NOT NULL LIMIT 1), ?)",
+                ((lang, title, *(entry or (None, None)), lang, entry[0] if entry else None, fetched_since, now)
+                 for title, entry in entries.items()))
+
+    def get_qid(self, lang: str, resolved: str) -> Optional[str]:
+        """Return the unexpired QID of a resolved title, if known."""
+        row = self.connection.execute(
+            "SELECT qid FROM links WHERE lang = ? AND resolved = ? AND fetched_at >= ? AND qid IS NOT NULL LIMIT 1",
+            (lang, resolved, self._fetched_since(time.time()))).fetchone()
+        return row[0] if row else None
+
+    def set_qid(self, lang: str, resolved: str, qid: str):
+        with self.connection:
+            self.connection.execute("UPDATE links SET qid = ? WHERE lang = ? AND resolved = ?", (qid, lang, resolved))
+
+    def _fetched_since(self, now: float) -> float:
+        # Oldest unexpired fetch time of resolved entries
+        return now - self.ttl if self.ttl is not None else float('-inf')
+
+    def close(self):
+        self.connection.close()
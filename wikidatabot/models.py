@@ -1,8 +1,14 @@
 """"""
-from collections import defaultdict, OrderedDict, UserDict
+from bisect import bisect_right
+from collections import defaultdict, OrderedDict
 import copy
 from dataclasses import dataclass
-from typing import MutableMapping, List, AbstractSet
+from decimal import Decimal
+import hashlib
+import json
+import sys
+from typing import AbstractSet, Callable, FrozenSet, List, MutableMapping, Optional
+import weakref
 
 import pywikibot
 
@@ -27,17 +33,111 @@ from wikidatabot import site, repo
 # REPO = SITE.get_repo()
 
 
+class NotFetchedError(LookupError):
+    """Lookup of an entity part that was not fetched."""
+    pass
+
+
 @dataclass
 class Label:
     language: str = ''
     text: str = ''
 
 
-class LabelContainer(UserDict):
-    data: MutableMapping[str, str]
+class TermContainer(MutableMapping):
+    """Terms by language, restricted to a whitelist of languages if given (default_languages by default): the terms
+    in other languages are dropped.
+
+    If fetched is given, only the terms in those languages are known: looking up any other one raises
+    NotFetchedError (see Projection).
+
+    They are stored compactly: sorted tuple of interned language codes, and tuple of their values.
+    """
+    __slots__ = ('languages', 'fetched', '_languages', '_values')
+    # Language whitelist used when none is given; all languages if None. Set it to the languages the bot uses.
+    default_languages: Optional[FrozenSet[str]] = None
+
+    def __init__(self, data=None, languages: AbstractSet[str] = None, fetched: AbstractSet[str] = None):
+        if languages is None:
+            languages = self.default_languages
+        self.languages = frozenset(languages) if languages is not None else None
+        self.fetched = fetched
+        self._languages = ()
+        self._values = ()
+        if data:
+            self.update(data)
+
+    @classmethod
+    def from_json(cls, data: dict, languages: AbstractSet[str] = None, fetched: AbstractSet[str] = None):
+        """Create from Wikibase JSON terms: {language: {'language': language, 'value': text}}."""
+        return cls({language: term['value'] for language, term in data.items()}, languages=languages,
+                   fetched=fetched)
+
+    @staticmethod
+    def _compact(value):
+        return value
+
+    def _index(self, language):
+        i = bisect_right(self._languages, language) - 1
+        if i >= 0 and self._languages[i] == language:
+            return i
+        raise KeyError(language)
+
+    def __getitem__(self, language):
+        if self.fetched is not None and language not in self.fetched:
+            raise NotFetchedError(language)
+        return self._values[self._index(language)]
+
+    def __setitem__(self, language, value):
+        if self.languages is not None and language not in self.languages:
+            return
+        value = self._compact(value)
+        try:
+            i = self._index(language)
+        except KeyError:
+            i = bisect_right(self._languages, language)
+            self._languages = self._languages[:i] + (sys.intern(language),) + self._languages[i:]
+            self._values = self._values[:i] + (value,) + self._values[i:]
+        else:
+            self._values = self._values[:i] + (value,) + self._values[i + 1:]
+
+    def __delitem__(self, language):
+        i = self._index(language)
+        self._languages = self._languages[:i] + self._languages[i + 1:]
+        self._values = self._values[:i] + self._values[i + 1:]
+
+    def __iter__(self):
+        return iter(self._languages)
+
+    def __len__(self):
+        return len(self._languages)
 
-    def get(self, language: str = '') -> Label:
-        return Label(language=language, text=self.data[language])
+    def update(self, data=(), **kwargs):
+        data = dict(data, **kwargs)
+        if self.languages is not None:
+            data = {language: value for language, value in data.items() if language in self.languages}
+        if not self._languages:
+            # Build all at once
+            languages = sorted(data)
+            self._languages = tuple(sys.intern(language) for language in languages)
+            self._values = tuple(self._compact(data[language]) for language in languages)
+        else:
+            for language, value in data.items():
+                self[language] = value
+
+    @property
+    def data(self) -> dict:
+        return dict(zip(self._languages, self._values))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.data})"
+
+
+class LabelContainer(TermContainer):
+    __slots__ = ()
+
+    def term(self, language: str = '') -> Label:
+        return Label(language=language, text=self[language])
 
 
 @dataclass
@@ -46,11 +146,11 @@ class Description:
     text: str = ''
 
 
-class DescriptionContainer(UserDict):
-    data: MutableMapping[str, str]
+class DescriptionContainer(TermContainer):
+    __slots__ = ()
 
-    def get(self, language: str = '') -> Description:
-        return Description(language=language, text=self.data[language])
+    def term(self, language: str = '') -> Description:
+        return Description(language=language, text=self[language])
 
 
 @dataclass
@@ -59,39 +159,312 @@ class Alias:
     text: str = ''
 
 
-class AliasContainer(UserDict):
-    data: MutableMapping[str, AbstractSet[str]]
+class AliasContainer(TermContainer):
+    """Aliases by language, stored as tuples of texts."""
+    __slots__ = ()
+
+    @classmethod
+    def from_json(cls, data: dict, languages: AbstractSet[str] = None, fetched: AbstractSet[str] = None):
+        """Create from Wikibase JSON aliases: {language: [{'language': language, 'value': text}, ...]}."""
+        return cls({language: [alias['value'] for alias in aliases] for language, aliases in data.items()},
+                   languages=languages, fetched=fetched)
+
+    @staticmethod
+    def _compact(value):
+        return tuple(dict.fromkeys(value))
+
+    def term(self, language: str = '') -> List[Alias]:
+        return [Alias(language=language, text=text) for text in self[language]]
+
+
+ENTITY_URI = 'http://www.wikidata.org/entity/'
+
+# Datatypes by property id, given to the pywikibot claims so that they are not fetched: see PropertyRepository
+datatypes: MutableMapping[str, str] = {}
+GREGORIAN_CALENDAR = ENTITY_URI + 'Q1985727'
+
+
+class Value:
+    """Immutable value of a claim, converted to its Wikibase datavalue JSON with to_json and to its pywikibot
+    counterpart with to_pwb.
+    """
+    __slots__ = ()
+
+    def __init__(self, *args):
+        for name, arg in zip(self.__slots__, args):
+            object.__setattr__(self, name, arg)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-    def get(self, language: str = '') -> List[Alias]:
-        return [Alias(language=language, text=text) for text in self.data[language]]
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _key(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._key() == self._key()
+
+    def __hash__(self):
+        return hash((type(self), self._key()))
+
+    def __reduce__(self):
+        return type(self), self._key()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(repr(value) for value in self._key())})"
+
+    def to_json(self) -> dict:
+        raise NotImplementedError
+
+    def to_pwb(self):
+        raise NotImplementedError
+
+
+class ItemId(Value):
+    __slots__ = ('id',)
+
+    def __init__(self, id: str):
+        super().__init__(id)
+
+    def __str__(self):
+        return self.id
+
+    def to_json(self) -> dict:
+        return {'value': {'entity-type': 'item', 'numeric-id': int(self.id[1:]), 'id': self.id},
+                'type': 'wikibase-entityid'}
+
+    def to_pwb(self):
+        return pywikibot.ItemPage(repo, self.id)
+
+
+class Quantity(Value):
+    """Amount with unit (an item id; None if unitless) and, if known, its upper and lower bounds."""
+    __slots__ = ('amount', 'unit', 'upper_bound', 'lower_bound')
+
+    def __init__(self, amount, unit: str = None, upper_bound=None, lower_bound=None):
+        super().__init__(amount, unit, upper_bound, lower_bound)
+
+    def to_json(self) -> dict:
+        value = {'amount': format(Decimal(str(self.amount)), '+g'),
+                 'unit': ENTITY_URI + self.unit if self.unit else '1'}
+        if self.upper_bound is not None:
+            value['upperBound'] = format(Decimal(str(self.upper_bound)), '+g')
+        if self.lower_bound is not None:
+            value['lowerBound'] = format(Decimal(str(self.lower_bound)), '+g')
+        return {'value': value, 'type': 'quantity'}
+
+    def to_pwb(self):
+        unit = pywikibot.ItemPage(repo, self.unit) if self.unit else None
+        error = None
+        if self.upper_bound is not None and self.lower_bound is not None:
+            amount = Decimal(str(self.amount))
+            error = (Decimal(str(self.upper_bound)) - amount, amount - Decimal(str(self.lower_bound)))
+        return pywikibot.WbQuantity(self.amount, unit=unit, error=error, site=site)
+
+
+class Time(Value):
+    """Date, with precision (as in Wikibase) given by its most specific component: 9 year, 10 month, 11 day.
+
+    Its uncertainty (before and after, in precision units), timezone (minutes from UTC) and calendar model are
+    kept as given, by default as in Wikibase: 0 and the proleptic Gregorian calendar.
+    """
+    __slots__ = ('year', 'month', 'day', 'precision', 'before', 'after', 'timezone', 'calendarmodel')
+
+    def __init__(self, year: int, month: int = None, day: int = None, precision: int = None, before: int = 0,
+                 after: int = 0, timezone: int = 0, calendarmodel: str = GREGORIAN_CALENDAR):
+        if precision is None:
+            precision = 11 if day is not None else 10 if month is not None else 9
+        super().__init__(year, month, day, precision, before, after, timezone, calendarmodel)
+
+    def to_json(self) -> dict:
+        # As pywikibot WbTime
+        time = f"{self.year:+012d}-{self.month or 1:02d}-{self.day or 1:02d}T00:00:00Z"
+        return {'value': {'time': time, 'precision': self.precision, 'after': self.after, 'before': self.before,
+                          'timezone': self.timezone, 'calendarmodel': self.calendarmodel},
+                'type': 'time'}
+
+    def to_pwb(self):
+        return pywikibot.WbTime(year=self.year, month=self.month, day=self.day, precision=self.precision,
+                                before=self.before, after=self.after, timezone=self.timezone,
+                                calendarmodel=self.calendarmodel)
+
+
+class MonolingualText(Value):
+    __slots__ = ('text', 'language')
+
+    def __init__(self, text: str, language: str):
+        super().__init__(text, language)
+
+    def to_json(self) -> dict:
+        return {'value': {'text': self.text, 'language': self.language}, 'type': 'monolingualtext'}
+
+    def to_pwb(self):
+        return pywikibot.WbMonolingualText(self.text, self.language)
+
+
+class RawValue(Value):
+    """Value of a datavalue type without its own Value type (e.g. globe coordinates): its datavalue JSON, kept as
+    canonical JSON, so that it can be compared and hashed.
+    """
+    __slots__ = ('type', 'json')
+
+    def __init__(self, type: str, json: str):
+        super().__init__(type, json)
+
+    @classmethod
+    def from_json(cls, datavalue: dict) -> 'RawValue':
+        return cls(datavalue['type'],
+                   json.dumps(datavalue['value'], sort_keys=True, separators=(',', ':'), ensure_ascii=False))
+
+    def to_json(self) -> dict:
+        return {'value': json.loads(self.json), 'type': self.type}
+
+
+def to_datavalue(value) -> dict:
+    """Return the Wikibase datavalue JSON of a claim value: a Value or a str."""
+    if isinstance(value, Value):
+        return value.to_json()
+    elif isinstance(value, str):
+        return {'value': value, 'type': 'string'}
+    raise TypeError(f"Unsupported claim value: {value!r}")
+
+
+def from_datavalue(datavalue: dict):
+    """Return the claim value of a Wikibase datavalue JSON: a Value or a str (inverse of to_datavalue).
+
+    Datavalue types without their own Value type are returned as RawValue.
+    """
+    value = datavalue['value']
+    type = datavalue['type']
+    if type == 'wikibase-entityid' and value.get('entity-type', 'item') == 'item':
+        return ItemId(value['id'] if 'id' in value else f"Q{value['numeric-id']}")
+    elif type == 'quantity':
+        unit = value['unit'] if value['unit'] != '1' else None
+        upper_bound, lower_bound = value.get('upperBound'), value.get('lowerBound')
+        return Quantity(Decimal(value['amount']), unit=unit.rsplit('/', 1)[-1] if unit else None,
+                        upper_bound=Decimal(upper_bound) if upper_bound is not None else None,
+                        lower_bound=Decimal(lower_bound) if lower_bound is not None else None)
+    elif type == 'time':
+        precision = value['precision']
+        year, month, day = value['time'][1:].split('T')[0].split('-')
+        year = int(value['time'][0] + year)
+        return Time(year, month=int(month) if precision >= 10 else None, day=int(day) if precision >= 11 else None,
+                    precision=precision, before=value.get('before', 0), after=value.get('after', 0),
+                    timezone=value.get('timezone', 0), calendarmodel=value.get('calendarmodel', GREGORIAN_CALENDAR))
+    elif type == 'monolingualtext':
+        return MonolingualText(value['text'], value['language'])
+    elif type == 'string':
+        return value
+    return RawValue.from_json(datavalue)
+
+
+def from_pwb_value(target):
+    """Return the value of a pywikibot claim target: a Value, or the target itself (str, None or, if not supported,
+    its pywikibot object).
+    """
+    if isinstance(target, pywikibot.ItemPage):
+        return ItemId(target.getID())
+    elif isinstance(target, pywikibot.WbTime):
+        precision = target.precision
+        return Time(target.year, month=target.month if precision >= 10 else None,
+                    day=target.day if precision >= 11 else None, precision=precision, before=target.before,
+                    after=target.after, timezone=target.timezone, calendarmodel=target.calendarmodel)
+    elif isinstance(target, pywikibot.WbQuantity):
+        unit = target.unit if target.unit != '1' else None
+        return Quantity(target.amount, unit=unit.rsplit('/', 1)[-1] if unit else None,
+                        upper_bound=target.upperBound, lower_bound=target.lowerBound)
+    elif isinstance(target, pywikibot.WbMonolingualText):
+        return MonolingualText(target.text, target.language)
+    return target
 
 
 class Claim:
+    """Property and value.
+
+    Its snak type is 'value', 'somevalue' or 'novalue': the latter ones have None value. The pywikibot Claim (_claim)
+    is only created on first use.
+    """
+    __slots__ = ('_property', 'value', 'snaktype', '_pwb_claim', '_json')
 
     def __init__(self, property=None, value=None, item=None, quantity=None, year=None, month=None, day=None, text=None,
-                 language=None):
+                 language=None, snaktype=None):
         self.property = property
         if item is not None:
             # TODO: refactorize this; now both str 'Q123' and ItemPage instance are accepted
             if isinstance(item, str):
-                value = pywikibot.ItemPage(repo, item)
+                value = ItemId(item)
             elif isinstance(item, pywikibot.ItemPage):
-                value = item
+                value = ItemId(item.getID())
             else:
                 # TODO
                 raise NotImplementedError
         elif quantity is not None:
-            value = pywikibot.WbQuantity(quantity, site=site)
+            value = Quantity(quantity)
         elif year is not None:
-            value = pywikibot.WbTime(year=year, month=month, day=day)
+            value = Time(year, month=month, day=day)
         elif text is not None:
             if language is not None:
-                value = pywikibot.WbMonolingualText(text, language)
+                value = MonolingualText(text, language)
         self.value = value
+        if snaktype is None:
+            snaktype = 'value' if value is not None else 'somevalue'
+        self.snaktype = snaktype
+        self._pwb_claim = None
+        self._json = None  # (key, snak JSON)
 
-        claim = pywikibot.Claim(repo, property)
-        claim.setTarget(value)
-        self._claim = claim
+    @classmethod
+    def from_pwb(cls, pwb_claim):
+        snaktype = pwb_claim.getSnakType()
+        value = None
+        if snaktype == 'value':
+            value = from_pwb_value(pwb_claim.getTarget())
+            if not isinstance(value, (Value, str)):
+                value = RawValue.from_json(pwb_claim._formatDataValue())
+        claim = cls(property=pwb_claim.getID(), value=value, snaktype=snaktype)
+        claim._pwb_claim = pwb_claim
+        return claim
+
+    @classmethod
+    def from_json(cls, snak: dict):
+        """Create a claim from its Wikibase snak JSON."""
+        value = from_datavalue(snak['datavalue']) if snak['snaktype'] == 'value' else None
+        return cls(property=snak['property'], value=value, snaktype=snak['snaktype'])
+
+    def __reduce__(self):
+        # Without the pywikibot claim
+        return type(self).from_json, (self.to_json(),)
+
+    def _key(self):
+        return self.property, self.snaktype, self.value
+
+    def to_json(self) -> dict:
+        """Return the Wikibase snak JSON; cached while property and value are unchanged."""
+        key = self._key()
+        if self._json is None or self._json[0] != key:
+            if self.snaktype != 'value':
+                snak = {'snaktype': self.snaktype, 'property': self.property}
+            else:
+                snak = {'snaktype': 'value', 'property': self.property, 'datavalue': to_datavalue(self.value)}
+            self._json = key, snak
+        return self._json[1]
+
+    @property
+    def _claim(self):
+        # TODO: remove; pywikibot wrapper
+        if self._pwb_claim is None:
+            if isinstance(self.value, RawValue):
+                snak = dict(self.to_json(), datatype=datatypes.get(self.property))
+                claim = pywikibot.Claim.fromJSON(repo, {'mainsnak': snak})
+            else:
+                claim = pywikibot.Claim(repo, self.property, datatype=datatypes.get(self.property))
+                if self.snaktype != 'value':
+                    claim.setSnakType(self.snaktype)
+                else:
+                    claim.setTarget(self.value.to_pwb() if isinstance(self.value, Value) else self.value)
+            self._pwb_claim = claim
+        return self._pwb_claim
 
     @property
     def property(self):
@@ -128,7 +501,7 @@ class Claim:
 
 
 class Qualifier(Claim):
-    pass
+    __slots__ = ()
 
 
 class QualifierContainer(OrderedDict):
@@ -144,32 +517,185 @@ class QualifierContainer(OrderedDict):
 
 
 class Source(Claim):
-    pass
+    __slots__ = ()
+
+
+def snak_hash(snak: dict) -> str:
+    """Return the local hash of a snak JSON: the sha1 of its canonical JSON.
+
+    It identifies equal snaks within this package, but it is not the hash computed by Wikibase.
+    """
+    return hashlib.sha1(
+        json.dumps(snak, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ReferenceBlock:
+    """Immutable reference block: its sources and, as key, the frozenset of their snak hashes."""
+    __slots__ = ('sources', 'key', '_json', '__weakref__')
+
+    def __init__(self, sources, key: FrozenSet[str]):
+        self.sources = tuple(sources)
+        self.key = key
+        self._json = None
+
+    def __iter__(self):
+        return iter(self.sources)
+
+    def __len__(self):
+        return len(self.sources)
+
+    def to_json(self) -> dict:
+        """Return the Wikibase reference JSON; cached: do not modify it."""
+        if self._json is None:
+            snaks = {}
+            for source in self.sources:
+                snaks.setdefault(source.property, []).append(source.to_json())
+            self._json = {'snaks': snaks, 'snaks-order': list(snaks)}
+        return self._json
 
 
 class SourceContainer:
-    pass
+    """Reference blocks of a statement, keyed by the frozenset of the snak hashes of their sources.
+
+    Blocks are interned: identical blocks, also across statements, are the same ReferenceBlock while in use.
+    """
+    _interned = weakref.WeakValueDictionary()  # key: ReferenceBlock
+
+    def __init__(self, blocks=()):
+        self._blocks = {}  # key: ReferenceBlock
+        self._snaks = set()  # snak hashes of all the blocks
+        for block in blocks:
+            self.add(block)
+
+    @classmethod
+    def from_pwb(cls, sources) -> 'SourceContainer':
+        """Create a SourceContainer from the sources of a pywikibot claim: a list of {property: [claims]}."""
+        return cls([Source.from_pwb(claim) for claims in block.values() for claim in claims] for block in sources)
+
+    @staticmethod
+    def block_key(sources) -> FrozenSet[str]:
+        return frozenset(snak_hash(source.to_json()) for source in sources)
+
+    def add(self, sources) -> ReferenceBlock:
+        """Add a reference block, given its sources; return the (interned) block."""
+        key = self.block_key(sources)
+        block = self._interned.get(key)
+        if block is None:
+            block = self._interned[key] = ReferenceBlock(sources, key)
+        self._blocks[key] = block
+        self._snaks.update(key)
+        return block
+
+    def __contains__(self, sources) -> bool:
+        """Whether a reference block with the same sources exists."""
+        return self.block_key(sources) in self._blocks
+
+    def has_source(self, source: 'Source') -> bool:
+        """Whether any reference block contains source."""
+        return snak_hash(source.to_json()) in self._snaks
+
+    def keys(self):
+        return self._blocks.keys()
+
+    def __iter__(self):
+        return iter(self._blocks.values())
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def __reduce__(self):
+        # Blocks are interned again when loaded
+        return type(self), ([block.sources for block in self],)
 
 
 class Statement:
-    """TODO"""
-    def __init__(self, claim: Claim = None, rank='normal', qualifiers=None, sources=None):
+    """Claim with rank, qualifiers and sources.
+
+    The pywikibot Claim (_statement) is only created on first use.
+    """
+    def __init__(self, claim: Claim = None, rank='normal', qualifiers=None, sources=None, id: str = None):
                  # qualifiers: QualifierContainer = None, sources: SourceContainer = None):
+        # Statement GUID; None if new
+        self.id = id
         self.claim = claim
         self.rank = rank
         self.qualifiers = qualifiers if qualifiers else []  # TODO: better a dict or a Container
-        self.sources = sources if sources else []  # TODO: better a dict or a Container
+        # A list of sources is a single reference block
+        if not isinstance(sources, SourceContainer):
+            sources = SourceContainer([sources] if sources else [])
+        self.sources = sources
         # TODO: refactorize to repo
         # self._statement = copy.deepcopy(claim._claim)  # TODO: TypeError: 'SiteLink' object is not subscriptable
         # where: claim._claim = Claim.fromJSON(DataSite("wikidata", "wikidata"), {'mainsnak': {'snaktype': 'value',
         # 'property': 'P39', 'datatype': 'wikibase-item', 'datavalue': {'value': {'entity-type': 'item',
         # 'numeric-id': 54875187}, 'type': 'wikibase-entityid'}}, 'type': 'statement', 'rank': 'normal'})
-        self._statement = claim._claim
-        self._set_rank(rank)
-        if qualifiers is not None:
-            self._set_qualifiers(qualifiers)
-        if sources is not None:
-            self._set_sources(sources)
+        self._pwb_statement = None
+        self._json = None  # (key, statement JSON)
+
+    def _key(self):
+        return (self.id, self.claim._key(), self.rank, tuple(qualifier._key() for qualifier in self.qualifiers),
+                tuple(self.sources.keys()))
+
+    def to_json(self) -> dict:
+        """Return the Wikibase statement JSON, as sent in wbeditentity data, without creating pywikibot objects.
+
+        The result is cached while the statement is unchanged: do not modify it.
+        """
+        key = self._key()
+        if self._json is None or self._json[0] != key:
+            data = {'mainsnak': self.claim.to_json(), 'type': 'statement', 'rank': self.rank}
+            if self.id is not None:
+                data['id'] = self.id
+            if self.qualifiers:
+                qualifiers = {}
+                for qualifier in self.qualifiers:
+                    qualifiers.setdefault(qualifier.property, []).append(qualifier.to_json())
+                data['qualifiers'] = qualifiers
+                data['qualifiers-order'] = list(qualifiers)
+            if self.sources:
+                data['references'] = [block.to_json() for block in self.sources]
+            self._json = key, data
+        return self._json[1]
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'Statement':
+        """Create a statement from its Wikibase statement JSON (inverse of to_json)."""
+        qualifiers = data.get('qualifiers', {})
+        qualifiers = [Qualifier.from_json(snak)
+                      for property in data.get('qualifiers-order', qualifiers) for snak in qualifiers[property]]
+        sources = SourceContainer(
+            [Source.from_json(snak)
+             for property in reference.get('snaks-order', reference['snaks']) for snak in reference['snaks'][property]]
+            for reference in data.get('references', []))
+        return cls(claim=Claim.from_json(data['mainsnak']), rank=data.get('rank', 'normal'), qualifiers=qualifiers,
+                   sources=sources, id=data.get('id'))
+
+    def dumps(self) -> bytes:
+        """Serialize compactly: see compact_json."""
+        return dumps_compact(self.to_json())
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'Statement':
+        return cls.from_json(loads_compact(data))
+
+    def __getstate__(self):
+        # Without the pywikibot claim
+        state = self.__dict__.copy()
+        state['_pwb_statement'] = None
+        state['_json'] = None
+        return state
+
+    @property
+    def _statement(self):
+        # TODO: remove; pywikibot wrapper
+        if self._pwb_statement is None:
+            self._pwb_statement = self.claim._claim
+            self._set_rank(self.rank)
+            if self.qualifiers:
+                self._set_qualifiers(self.qualifiers)
+            if self.sources:
+                self._set_sources(self.sources)
+        return self._pwb_statement
 
     @property
     def claim(self):
@@ -201,12 +727,13 @@ class Statement:
         #         source_group[source.getID()].append(source)
         #     claim.sources.append(source_group)
         #     return claim
-        source_group = defaultdict(list)
-        for source in sources:
-            source_claim = source._claim
-            source_claim.isReference = True
-            source_group[source_claim.getID()].append(source_claim)
-        self._statement.sources.append(source_group)
+        for block in sources:
+            source_group = defaultdict(list)
+            for source in block:
+                source_claim = source._claim
+                source_claim.isReference = True
+                source_group[source_claim.getID()].append(source_claim)
+            self._statement.sources.append(source_group)
 
     # # TODO: refactorize to repo
     # def _persist_qualifier(self, qualifier, summary=""):
@@ -222,32 +749,591 @@ class Statement:
     #     self.sources.append(source)
 
 
+class PartialDict(dict):
+    """Dict of which only the keys in fetched are known: looking up any other key raises NotFetchedError."""
+    def __init__(self, data=(), fetched: AbstractSet[str] = frozenset()):
+        super().__init__(data)
+        self.fetched = fetched
+
+    def _check(self, key):
+        if key not in self.fetched:
+            raise NotFetchedError(key)
+
+    def __getitem__(self, key):
+        self._check(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self._check(key)
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self._check(key)
+        return super().get(key, default)
+
+
+class LazyStatements(MutableMapping):
+    """Statements by property, parsed from their raw JSON into pywikibot claims of repo on first access, and cached.
+
+    If parse is given, claims are parsed with it instead (e.g. Statement.from_json, which does not need the site).
+    If fetched is given, only those properties (and those set afterwards) are known: looking up any other one
+    raises NotFetchedError.
+    """
+    def __init__(self, data: dict, repo=repo, fetched: AbstractSet[str] = None, parse: Callable[[dict], object] = None):
+        self.repo = repo
+        self.fetched = fetched
+        self.parse = parse
+        self._data = dict(data)
+        self._unparsed = set(self._data)
+
+    def _parse(self, claim: dict):
+        if self.parse is not None:
+            return self.parse(claim)
+        return pywikibot.Claim.fromJSON(self.repo, claim)
+
+    def _check(self, property):
+        if self.fetched is not None and property not in self.fetched and property not in self._data:
+            raise NotFetchedError(property)
+
+    def __getitem__(self, property):
+        self._check(property)
+        claims = self._data[property]
+        if property in self._unparsed:
+            claims = self._data[property] = [self._parse(claim) for claim in claims]
+            self._unparsed.discard(property)
+        return claims
+
+    def __setitem__(self, property, claims):
+        self._data[property] = claims
+        self._unparsed.discard(property)
+
+    def truncate(self, property, length: int):
+        """Keep only the first length claims of property, whether parsed or not (e.g. to undo append_json)."""
+        self._data[property] = self._data[property][:length]
+
+    def parsed(self, property) -> bool:
+        """Whether the claims of property are already parsed."""
+        return property in self._data and property not in self._unparsed
+
+    def append_json(self, property, claim: dict) -> int:
+        """Add a claim of property from its raw JSON; it is parsed with the others of property, at once if they
+        already are. Return its position.
+        """
+        if self.parsed(property):
+            claim = self._parse(claim)
+        elif property not in self._data:
+            self._data[property] = []
+            self._unparsed.add(property)
+        # Copy: the raw claims may be shared with the entity JSON
+        self._data[property] = self._data[property] + [claim]
+        return len(self._data[property]) - 1
+
+    def __delitem__(self, property):
+        del self._data[property]
+        self._unparsed.discard(property)
+
+    def __contains__(self, property):
+        self._check(property)
+        return property in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def setdefault(self, property, default=None):
+        if property not in self._data:
+            self[property] = default
+        return self[property]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({list(self._data)})"
+
+
+@dataclass(frozen=True)
+class Projection:
+    """Parts of an entity to fetch.
+
+    None properties or languages means all of them.
+    """
+    properties: Optional[FrozenSet[str]] = None
+    languages: Optional[FrozenSet[str]] = None
+    sitelinks: bool = True
+
+    @classmethod
+    def create(cls, properties=None, languages=None, sitelinks=None):
+        """Return the projection; None if the whole entity is requested.
+
+        Sitelinks are only included by default if neither properties nor languages are given.
+        """
+        if properties is None and languages is None and sitelinks in (None, True):
+            return None
+        return cls(properties=None if properties is None else frozenset(properties),
+                   languages=None if languages is None else frozenset(languages),
+                   sitelinks=sitelinks if sitelinks is not None else properties is None and languages is None)
+
+    @property
+    def params(self) -> dict:
+        """wbgetentities parameters."""
+        props = ['info']
+        if self.languages is None or self.languages:
+            props.extend(['labels', 'descriptions', 'aliases'])
+        if self.properties is None or self.properties:
+            props.append('claims')
+        if self.sitelinks:
+            props.append('sitelinks')
+        params = {'props': props}
+        if self.languages:
+            params['languages'] = sorted(self.languages)
+        return params
+
+    def covers(self, projection: 'Projection' = None) -> bool:
+        """Whether this projection includes all the parts of projection (the whole entity if None)."""
+        if projection is None:
+            return False
+        return ((self.properties is None or
+                 (projection.properties is not None and projection.properties <= self.properties)) and
+                (self.languages is None or
+                 (projection.languages is not None and projection.languages <= self.languages)) and
+                (self.sitelinks or not projection.sitelinks))
+
+    def apply(self, data: dict) -> dict:
+        """Return the projection of the entity JSON data."""
+        data = dict(data)
+        if self.properties is not None:
+            data['claims'] = {property: claims for property, claims in data.get('claims', {}).items()
+                              if property in self.properties}
+        if self.languages is not None:
+            for key in ['labels', 'descriptions', 'aliases']:
+                data[key] = {language: value for language, value in data.get(key, {}).items()
+                             if language in self.languages}
+        if not self.sitelinks:
+            data['sitelinks'] = {}
+        return data
+
+
+def covers(projection: Optional[Projection], requested: Optional[Projection]) -> bool:
+    """Whether an entity fetched with projection contains the parts requested (None means the whole entity)."""
+    return projection is None or projection.covers(requested)
+
+
+START_TIME = 'P580'
+END_TIME = 'P582'
+
+
+def is_time(value) -> bool:
+    return hasattr(value, 'precision') and hasattr(value, 'year')
+
+
+def time_key(value) -> tuple:
+    """Return the precision-aware key of a time (pywikibot WbTime or Time): (year,), (year, month) or
+    (year, month, day), according to its precision.
+    """
+    return (value.year, value.month, value.day)[:min(max(value.precision - 8, 1), 3)]
+
+
+def time_matches(key: tuple, other: tuple) -> bool:
+    """Whether two time keys are equal up to the coarser precision of both."""
+    length = min(len(key), len(other))
+    return key[:length] == other[:length]
+
+
+def time_refines(key: tuple, other: tuple) -> bool:
+    """Whether time key is other with a finer precision."""
+    return len(key) > len(other) and key[:len(other)] == other
+
+
+def time_le(key: tuple, other: tuple) -> bool:
+    """Whether time key may be before or equal to other, compared up to the coarser precision of both."""
+    length = min(len(key), len(other))
+    return key[:length] <= other[:length]
+
+
+def value_keys(value) -> list:
+    """Return the hashable keys of a claim value (pywikibot target or Value), from the coarsest to the exact one.
+
+    Item ids, texts and quantity amounts have a single key. Times have one key per precision up to theirs: (year,),
+    (year, month) and (year, month, day).
+    """
+    if is_time(value):
+        key = time_key(value)
+        return [key[:length] for length in range(1, len(key) + 1)]
+    elif hasattr(value, 'id'):
+        return [value.id]
+    elif hasattr(value, 'amount'):
+        unit = value.unit if isinstance(value.unit, str) and value.unit != '1' else None
+        return [(Decimal(str(value.amount)), unit.rsplit('/', 1)[-1] if unit else None)]
+    elif hasattr(value, 'text') and hasattr(value, 'language'):
+        return [(value.language, value.text)]
+    return [value]
+
+
+class StatementIndex:
+    """Index of statements (pywikibot claims by property) by value and by qualifier value, and of their terms.
+
+    Lookups match values with equal keys (see value_keys); times match if equal up to the coarser precision of
+    both, as the duplicate checks of the scripts compare them.
+
+    The term of a statement is the interval between its start time (P580) and end time (P582) qualifiers; a missing
+    one leaves it open.
+
+    The statements of each property are only indexed (and so parsed, see LazyStatements) on its first lookup. Keep
+    it up to date with add, for new statements, and discard, for changed ones.
+    """
+    def __init__(self, statements):
+        self.statements = statements
+        self._by_value = {}  # property: {(key,): [(statement, exact key)]}
+        self._by_qualifier = {}  # property: {(qualifier property, key): [(statement, exact key)]}
+        self._terms = {}  # property: ([start key], [(end key, statement)]), sorted by start key
+
+    def _index(self, property):
+        """Index the statements of property, unless already indexed."""
+        if property in self._terms:
+            return
+        self._by_value[property] = defaultdict(list)
+        self._by_qualifier[property] = defaultdict(list)
+        self._terms[property] = ([], [])
+        for statement in self.statements.get(property, ()):
+            self.add(property, statement)
+
+    def add(self, property: str, statement):
+        """Index a new statement of property, if its statements are already indexed."""
+        if property not in self._terms:
+            return
+        self._add(self._by_value[property], (), statement, statement.target)
+        for qualifier_property, qualifiers in statement.qualifiers.items():
+            for qualifier in qualifiers:
+                self._add(self._by_qualifier[property], (qualifier_property,), statement, qualifier.target)
+        start, end = self._term(statement)
+        starts, ends = self._terms[property]
+        i = bisect_right(starts, start)
+        starts.insert(i, start)
+        ends.insert(i, (end, statement))
+
+    def discard(self, property: str):
+        """Drop the index of the statements of property (e.g. after changing any of them): it is rebuilt on next
+        lookup.
+        """
+        self._by_value.pop(property, None)
+        self._by_qualifier.pop(property, None)
+        self._terms.pop(property, None)
+
+    @staticmethod
+    def _term(statement):
+        """Return the start key (() if open) and end key (None if open) of a statement."""
+        start, end = (), None
+        for qualifier in statement.qualifiers.get(START_TIME, [])[:1]:
+            if is_time(qualifier.target):
+                start = time_key(qualifier.target)
+        for qualifier in statement.qualifiers.get(END_TIME, [])[:1]:
+            if is_time(qualifier.target):
+                end = time_key(qualifier.target)
+        return start, end
+
+    @staticmethod
+    def _add(index, prefix, statement, value):
+        if value is None:  # somevalue or novalue
+            return
+        keys = value_keys(value)
+        for key in keys:
+            index[prefix + (key,)].append((statement, keys[-1]))
+
+    @staticmethod
+    def _find(index, prefix, value) -> list:
+        keys = value_keys(value)
+        found = {}
+        for key in keys:
+            for statement, statement_key in index.get(prefix + (key,), ()):
+                # Same or finer statement value, or coarser statement value
+                if key == keys[-1] or statement_key == key:
+                    found[id(statement)] = statement
+        return list(found.values())
+
+    def find(self, property: str, value) -> list:
+        """Return the statements of property with value."""
+        self._index(property)
+        return self._find(self._by_value[property], (), value)
+
+    def find_qualified(self, property: str, qualifier_property: str, qualifier_value) -> list:
+        """Return the statements of property with a qualifier_property qualifier with qualifier_value."""
+        self._index(property)
+        return self._find(self._by_qualifier[property], (qualifier_property,), qualifier_value)
+
+    def find_overlapping(self, property: str, start=None, end=None, value=None) -> list:
+        """Return the statements of property (with value, if given) whose term overlaps the term from start to end
+        (times; None if open). Bounds are included and compared up to the coarser precision of both.
+        """
+        self._index(property)
+        starts, ends = self._terms[property]
+        if end is not None:
+            end = time_key(end)
+            # Last statement starting before or at end, whatever its precision
+            ends = ends[:bisect_right(starts, end + (float('inf'),) * (3 - len(end)))]
+        if start is not None:
+            start = time_key(start)
+            ends = [(statement_end, statement) for statement_end, statement in ends
+                    if statement_end is None or time_le(start, statement_end)]
+        statements = [statement for _, statement in ends]
+        if value is not None:
+            statements_with_value = {id(statement) for statement in self.find(property, value)}
+            statements = [statement for statement in statements if id(statement) in statements_with_value]
+        return statements
+
+
+def compact_json(data):
+    """Return a compact copy of Wikibase JSON: item ids as integers and without snak hashes.
+
+    It is the inverse of expand_json.
+    """
+    if isinstance(data, dict):
+        if data.get('type') == 'wikibase-entityid' and data['value'].get('entity-type') == 'item':
+            return {'value': data['value']['numeric-id'], 'type': 'wikibase-entityid'}
+        return {key: compact_json(value) for key, value in data.items() if key != 'hash'}
+    elif isinstance(data, list):
+        return [compact_json(value) for value in data]
+    return data
+
+
+def expand_json(data):
+    """Return the Wikibase JSON of a compact copy made with compact_json."""
+    if isinstance(data, dict):
+        if data.get('type') == 'wikibase-entityid' and isinstance(data['value'], int):
+            numeric_id = data['value']
+            return {'value': {'entity-type': 'item', 'numeric-id': numeric_id, 'id': f"Q{numeric_id}"},
+                    'type': 'wikibase-entityid'}
+        return {key: expand_json(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [expand_json(value) for value in data]
+    return data
+
+
+def dumps_compact(data) -> bytes:
+    return json.dumps(compact_json(data), separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads_compact(data: bytes):
+    return expand_json(json.loads(data))
+
+
+def typed_json(data):
+    """Return a copy of Wikibase JSON with the datatypes of its snaks, where known by datatypes, so that pywikibot
+    parses it without fetching them.
+    """
+    if isinstance(data, dict):
+        data = {key: typed_json(value) for key, value in data.items()}
+        if 'snaktype' in data and 'datatype' not in data and data.get('property') in datatypes:
+            data['datatype'] = datatypes[data['property']]
+        return data
+    elif isinstance(data, list):
+        return [typed_json(value) for value in data]
+    return data
+
+
+def statements_json(statements) -> dict:
+    """Return the Wikibase JSON of statements by property: Statement, pywikibot claims or, if not parsed yet by
+    LazyStatements, their raw JSON.
+    """
+    if isinstance(statements, LazyStatements):
+        return {property: claims if property in statements._unparsed else statements_json({property: claims})[property]
+                for property, claims in statements._data.items()}
+    return {property: [claim.to_json() if isinstance(claim, Statement) else claim.toJSON() for claim in claims]
+            for property, claims in statements.items()}
+
+
 class Item:
     """TODO"""
 
-    def __init__(self, id=None, labels=None, descriptions=None, aliases=None, statements=None, sitelinks=None):
+    def __init__(self, id=None, labels=None, descriptions=None, aliases=None, statements=None, sitelinks=None,
+                 projection: Projection = None, lastrevid: int = None):
         self.id = id
-        self.labels = labels
-        self.descriptions = descriptions
-        self.aliases = aliases
+        # Terms are stored in containers, filtered by their language whitelist
+        self.labels = labels if labels is None or isinstance(labels, TermContainer) else LabelContainer(labels)
+        self.descriptions = (descriptions if descriptions is None or isinstance(descriptions, TermContainer) else
+                             DescriptionContainer(descriptions))
+        self.aliases = aliases if aliases is None or isinstance(aliases, TermContainer) else AliasContainer(aliases)
         self.statements = statements
+        # Titles by site id
         self.sitelinks = sitelinks
-        # TODO: remove; Itpywikibot wrapper
-        self._item = None
+        # Fetched parts; None if complete
+        self.projection = projection
+        # Revision the item data belongs to; base revision of its edits
+        self.lastrevid = lastrevid
+        # TODO: remove; pywikibot wrapper: see _item
+        self._pwb_item = None
+        self._pwb_repo = None
+        self._pwb_content = None
+        # Callables of (item, entity), called after the item is refreshed; used by repository caches
+        self._observers = []
+        self._index = None
+
+    @property
+    def is_partial(self) -> bool:
+        return self.projection is not None
+
+    @property
+    def _item(self):
+        # TODO: remove; pywikibot wrapper, created on first use (see _wrap)
+        if self._pwb_item is None and self._pwb_repo is not None:
+            self._pwb_item = pywikibot.ItemPage(self._pwb_repo, self.id)
+            if self._pwb_content is not None:
+                # Loaded on first access to its data, without API call because _content is given
+                self._pwb_item._content = self._pwb_content
+                self._pwb_content = None
+        return self._pwb_item
+
+    @_item.setter
+    def _item(self, pwb_item):
+        self._pwb_item = pwb_item
+
+    def _wrap(self, repo, entity: dict = None):
+        """Create the pywikibot item of repo on first use of _item, loaded from entity if given.
+
+        Only give the whole entity: partial content must not be taken for it.
+        """
+        self._pwb_item = None
+        self._pwb_repo = repo
+        self._pwb_content = entity
+
+    @property
+    def index(self) -> StatementIndex:
+        """Index of the statements, built on first use and rebuilt after they change."""
+        if self._index is None:
+            self._index = StatementIndex(self.statements)
+        return self._index
 
     @classmethod
     def from_pwb(cls, pwb_item):
         if isinstance(pwb_item, str):
             pwb_item = pywikibot.ItemPage(repo, pwb_item)
             _ = pwb_item.get()
+        # Sitelinks as their titles, as in from_json
+        sitelinks = {site: sitelink['title'] for site, sitelink in pwb_item.sitelinks.toJSON().items()}
         item = cls(id=pwb_item.id, labels=pwb_item.labels, descriptions=pwb_item.descriptions, aliases=pwb_item.aliases,
-                   statements=pwb_item.claims, sitelinks=pwb_item.sitelinks)  # Renamed: statements = pwb_item.claims
+                   statements=pwb_item.claims, sitelinks=sitelinks,  # Renamed: statements = pwb_item.claims
+                   lastrevid=pwb_item.latest_revision_id)
         # pywikibot wrapper
         item._item = pwb_item
         return item
 
+    @classmethod
+    def from_json(cls, data, repo=repo, projection: Projection = None, parse: Callable[[dict], object] = None):
+        """Create an Item from its raw entity JSON (as in wbgetentities responses and dumps).
+
+        Terms are kept in containers, only in the languages of their whitelist (see TermContainer). Statements are
+        parsed into pywikibot claims of repo (or with parse, if given), without API calls, and only on first access
+        to each property (see LazyStatements). If a projection is given, the item only contains its parts, and
+        looking up any other part raises NotFetchedError.
+        """
+        if projection is not None:
+            data = projection.apply(data)
+        fetched = projection.languages if projection is not None else None
+        labels = LabelContainer.from_json(data.get('labels', {}), fetched=fetched)
+        descriptions = DescriptionContainer.from_json(data.get('descriptions', {}), fetched=fetched)
+        aliases = AliasContainer.from_json(data.get('aliases', {}), fetched=fetched)
+        statements = LazyStatements(data.get('claims', {}), repo=repo,
+                                    fetched=projection.properties if projection is not None else None, parse=parse)
+        sitelinks = {site: sitelink['title'] for site, sitelink in data.get('sitelinks', {}).items()}
+        if projection is not None and not projection.sitelinks:
+            sitelinks = PartialDict()
+        return cls(id=data['id'], labels=labels, descriptions=descriptions, aliases=aliases, statements=statements,
+                   sitelinks=sitelinks, projection=projection, lastrevid=data.get('lastrevid'))
+
+    def dumps(self) -> bytes:
+        """Serialize compactly, without pywikibot objects: as compact JSON (see compact_json) of its parts.
+
+        Only the titles of the sitelinks are kept.
+        """
+        data = {
+            'id': int(self.id[1:]),
+            'lastrevid': self.lastrevid,
+            'labels': dict(self.labels or {}),
+            'descriptions': dict(self.descriptions or {}),
+            'aliases': {language: list(aliases) for language, aliases in (self.aliases or {}).items()},
+            'claims': statements_json(self.statements or {}),
+            'sitelinks': {site: sitelink if isinstance(sitelink, str) else sitelink.toJSON()['title']
+                          for site, sitelink in (self.sitelinks or {}).items()},
+        }
+        projection = self.projection
+        if projection is not None:
+            data['projection'] = [sorted(projection.properties) if projection.properties is not None else None,
+                                  sorted(projection.languages) if projection.languages is not None else None,
+                                  projection.sitelinks]
+        return dumps_compact(data)
+
+    @classmethod
+    def loads(cls, data: bytes, repo=repo) -> 'Item':
+        """Load an item serialized with dumps, without API calls nor constructing repo: its statements are parsed
+        lazily into pywikibot claims of repo, and its pywikibot item (if repo is given) created on first use, loaded
+        from the same data if complete.
+        """
+        data = loads_compact(data)
+        projection = data.pop('projection', None)
+        if projection is not None:
+            properties, languages, sitelinks = projection
+            projection = Projection(properties=frozenset(properties) if properties is not None else None,
+                                    languages=frozenset(languages) if languages is not None else None,
+                                    sitelinks=sitelinks)
+        entity = {
+            'id': f"Q{data['id']}",
+            'lastrevid': data['lastrevid'],
+            'labels': {language: {'language': language, 'value': text} for language, text in data['labels'].items()},
+            'descriptions': {language: {'language': language, 'value': text}
+                             for language, text in data['descriptions'].items()},
+            'aliases': {language: [{'language': language, 'value': text} for text in aliases]
+                        for language, aliases in data['aliases'].items()},
+            'claims': data['claims'],
+            'sitelinks': {site: {'site': site, 'title': title, 'badges': []}
+                          for site, title in data['sitelinks'].items()},
+        }
+        item = cls.from_json(entity, repo=repo, projection=projection)
+        if repo is not None:
+            item._wrap(repo, entity if projection is None else None)
+        return item
+
+    def __reduce__(self):
+        # Without pywikibot objects nor observers
+        return type(self).loads, (self.dumps(),)
+
+    def refresh(self, entity: dict):
+        """Update the item from its whole entity JSON, as returned by wbeditentity, without fetching it again.
+
+        Its statements are parsed as they were before: by the same LazyStatements repo and parse, else into pywikibot
+        claims of its pywikibot repo, else into Statements.
+        """
+        if isinstance(self.statements, LazyStatements):
+            item_repo, parse = self.statements.repo, self.statements.parse
+        else:
+            item_repo = self._pwb_item.repo if self._pwb_item is not None else self._pwb_repo
+            parse = None
+        if item_repo is None and parse is None:
+            parse = Statement.from_json
+        updated = self.from_json(entity, repo=item_repo, parse=parse)
+        if isinstance(self._pwb_item, pywikibot.ItemPage):
+            # No API call is made because _content is given
+            self._pwb_item._content = entity
+            if hasattr(self._pwb_item, 'claims'):
+                # Already loaded: reload its data
+                _ = self._pwb_item.get()
+        elif self._pwb_repo is not None:
+            # Not created yet: now the whole entity is known
+            self._pwb_content = entity
+        self.labels = updated.labels
+        self.descriptions = updated.descriptions
+        self.aliases = updated.aliases
+        self.statements = updated.statements
+        self.sitelinks = updated.sitelinks
+        self.projection = None
+        self.lastrevid = updated.lastrevid
+        self._index = None
+        for observer in self._observers:
+            observer(self, entity)
+
+    def edit(self, summary=None) -> 'ItemEdit':
+        """Start a unit of work on the item: see ItemEdit."""
+        return ItemEdit(self, summary=summary)
+
     # TODO: refactorize to _persist_statement as Statement._persist_qualifier/source
-    # TODO: add statement to Item.statements
     def add_statement(self, statement: Statement = None, summary=None):
         if statement is None:
             return
@@ -278,21 +1364,205 @@ class Item:
         #     response = repo.editEntity(identification, data, summary=summary)
         #     return response
 
-        if not isinstance(self._item, str):
-            item_id = self._item.getID()
-        # else:
-        #     item_id = item
-        #     item = pywikibot.ItemPage(repo, item_id)
-        #     _ = item.get()
-
-        # Create item statement
-        identification = {'id': item_id}
-        # TODO: []
-        data = {'claims': [statement._statement.toJSON()]}  # add the statement on property: use []
-        # to overwrite statement on property: do not use []  # FALSE; use snak instead
-        response = repo.editEntity(identification, data, summary=summary)
+        edit = self.edit(summary=summary)
+        edit.add_statement(statement)
+        response = edit.commit()
         # response is a dict: {'entity': {'labels': {'ca': {'language': 'ca', 'value': 'Joaquim Abargues i Feliu'}},
         #                      'descriptions': {}, 'aliases': {}, 'sitelinks': {'cawiki': {'site': 'cawiki',
         #                       'title': 'Joaquim Abargues i Feliu', 'badges': []}},
         #                       'claims': {'P31': [{'mainsnak': {'snaktype': 'value', 'property': 'P31',
         return response
+
+
+class ItemEdit:
+    """Unit of work on an Item.
+
+    New statements, qualifier and source additions, rank changes and label/description updates are applied to the
+    item at once, so that later checks see them, and recorded to be committed as a single wbeditentity with the
+    item lastrevid as baserevid. Used as a context manager, it commits on exit unless an exception was raised.
+
+    If the edit is not committed, because an exception was raised in the with block or by wbeditentity (e.g. an edit
+    conflict), the changes are undone: the item (which may be shared, e.g. by a repository cache) is left as it was.
+
+    Qualifiers, sources and ranks are changed on the pywikibot claims of the item statements: each changed
+    statement is sent whole. New statements are added to the item statements as raw JSON, parsed on first access
+    (see LazyStatements), and sent as their Statement.to_json, unless changed afterwards.
+    """
+    def __init__(self, item: Item, summary=None):
+        self.item = item
+        self.summary = summary
+        self._claims = {}  # id(claim): claim; changed statements
+        self._statements = []  # (statement, property, position in the item statements); new statements
+        self._labels = {}
+        self._descriptions = {}
+        # Undo log: state before the changes
+        self._claim_states = {}  # id(claim): (claim, rank, qualifiers, sources)
+        self._lengths = {}  # property: number of its statements, or None if none
+        self._terms = {}  # (id(terms), language): (terms, language, text or None if none)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def __bool__(self):
+        return bool(self._claims or self._statements or self._labels or self._descriptions)
+
+    def _save_claim(self, claim):
+        if id(claim) not in self._claim_states:
+            self._claim_states[id(claim)] = (claim, claim.rank, [(property, list(qualifiers))
+                                                                 for property, qualifiers in claim.qualifiers.items()],
+                                             list(claim.sources))
+
+    def _save_term(self, terms, language):
+        if (id(terms), language) not in self._terms:
+            try:
+                text = terms[language]
+            except LookupError:
+                text = None
+            self._terms[id(terms), language] = (terms, language, text)
+
+    def add_statement(self, statement: Statement):
+        property = statement.claim.property
+        statements = self.item.statements
+        data = typed_json(statement.to_json())
+        if property not in self._lengths:
+            # Without parsing them
+            claims = (statements._data if isinstance(statements, LazyStatements) else statements).get(property)
+            self._lengths[property] = len(claims) if claims is not None else None
+        if isinstance(statements, LazyStatements):
+            position = statements.append_json(property, data)
+        else:
+            claims = statements.setdefault(property, [])
+            claims.append(pywikibot.Claim.fromJSON(repo, data))
+            position = len(claims) - 1
+        if self.item._index is not None:
+            claim = self._added_claim(property, position)
+            if claim is not None:
+                self.item._index.add(property, claim)
+            else:
+                # Not parsed: indexed with the others of property on next lookup
+                self.item._index.discard(property)
+        self._statements.append((statement, property, position))
+
+    def _added_claim(self, property, position):
+        """Return the pywikibot claim of a new statement; None if not parsed yet."""
+        statements = self.item.statements
+        if isinstance(statements, LazyStatements) and not statements.parsed(property):
+            return None
+        return statements[property][position]
+
+    def add_qualifier(self, claim, qualifier: Qualifier, index: int = None):
+        """Add a qualifier to a statement claim; if index is given, replace the qualifier of the same property at
+        that index instead.
+        """
+        qualifier_claim = qualifier._claim
+        qualifier_claim.isQualifier = True
+        self._save_claim(claim)
+        qualifiers = claim.qualifiers.setdefault(qualifier_claim.getID(), [])
+        if index is None:
+            qualifiers.append(qualifier_claim)
+        else:
+            qualifiers[index] = qualifier_claim
+        if self.item._index is not None:
+            self.item._index.discard(claim.getID())
+        self._claims[id(claim)] = claim
+
+    def add_sources(self, claim, sources: List[Source]):
+        """Add a reference block to a statement claim."""
+        source_group = OrderedDict()
+        for source in sources:
+            source_claim = source._claim
+            source_claim.isReference = True
+            source_group.setdefault(source_claim.getID(), []).append(source_claim)
+        self._save_claim(claim)
+        claim.sources.append(source_group)
+        self._claims[id(claim)] = claim
+
+    def change_rank(self, claim, rank: str):
+        if claim.rank != rank:
+            self._save_claim(claim)
+            claim.rank = rank
+            self._claims[id(claim)] = claim
+
+    def set_label(self, language: str, text: str):
+        self._save_term(self.item.labels, language)
+        self.item.labels[language] = text
+        self._labels[language] = text
+
+    def set_description(self, language: str, text: str):
+        self._save_term(self.item.descriptions, language)
+        self.item.descriptions[language] = text
+        self._descriptions[language] = text
+
+    @property
+    def data(self) -> dict:
+        """wbeditentity data."""
+        data = {}
+        if self._labels:
+            data['labels'] = {language: {'language': language, 'value': text}
+                              for language, text in self._labels.items()}
+        if self._descriptions:
+            data['descriptions'] = {language: {'language': language, 'value': text}
+                                    for language, text in self._descriptions.items()}
+        claims = [statement.to_json() for statement, property, position in self._statements
+                  if id(self._added_claim(property, position)) not in self._claims]
+        claims.extend(claim.toJSON() for claim in self._claims.values())
+        if claims:
+            data['claims'] = claims
+        return data
+
+    def commit(self):
+        """Commit the changes and refresh the item; return the wbeditentity response, or None if nothing changed."""
+        if not self:
+            return
+        try:
+            response = repo.editEntity({'id': self.item.id}, self.data, summary=self.summary,
+                                       baserevid=self.item.lastrevid)
+        except BaseException:
+            self.rollback()
+            raise
+        self._clear()
+        # Write-through: the response contains the whole updated entity
+        self.item.refresh(response['entity'])
+        return response
+
+    def rollback(self):
+        """Undo the changes to the item, without committing them."""
+        statements = self.item.statements
+        for property, length in self._lengths.items():
+            if length is None:
+                del statements[property]
+            elif isinstance(statements, LazyStatements):
+                statements.truncate(property, length)
+            else:
+                del statements[property][length:]
+        for claim, rank, qualifiers, sources in self._claim_states.values():
+            claim.rank = rank
+            claim.qualifiers.clear()
+            claim.qualifiers.update(qualifiers)
+            claim.sources[:] = sources
+        for terms, language, text in self._terms.values():
+            if text is None:
+                try:
+                    del terms[language]
+                except KeyError:
+                    pass
+            else:
+                terms[language] = text
+        if self._lengths or self._claim_states:
+            self.item._index = None
+        self._clear()
+
+    def _clear(self):
+        self._claims.clear()
+        self._statements.clear()
+        self._labels.clear()
+        self._descriptions.clear()
+        self._claim_states.clear()
+        self._lengths.clear()
+        self._terms.clear()
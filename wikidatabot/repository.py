@@ -1,15 +1,47 @@
 """Repository Pattern."""
 from abc import abstractmethod, ABC
-from typing import Generic, List, TypeVar
+import bz2
+from collections import defaultdict, OrderedDict
+from concurrent.futures import Future
+import gzip
+import json
+import os
+from pathlib import Path
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Generic, Iterable, Iterator, List, Tuple, TypeVar
+
+from pywikibot.backports import batched
+from pywikibot.data.sparql import SparqlQuery
 
 # TODO: import them directly here and remove from __init__
-from wikidatabot import pywikibot, site, repo
-from wikidatabot.models import Item
+from wikidatabot import models, pywikibot, site, repo
+from wikidatabot.cache import EntityCache
+from wikidatabot.models import covers, Item, Projection
 
 
 T = TypeVar('T')
 
 
+def paginate_query(query: str, cursor: str = None, limit: int = 5000, item_name: str = 'item') -> str:
+    """Return one page of a SPARQL query, using keyset pagination on ?item.
+
+    The results are ordered by ?item and, if cursor is given, restricted to those after it.
+
+    :param query: SELECT query, ending with its WHERE clause and without ORDER BY, LIMIT or OFFSET.
+    :param cursor: IRI of the last item of the previous page.
+    :param limit: Page size.
+    :param item_name: Name of the item variable.
+    """
+    query = query.rstrip()
+    if not query.endswith('}'):
+        raise ValueError("Query must end with its WHERE clause")
+    cursor_filter = f'  FILTER(STR(?{item_name}) > "{cursor}")\n' if cursor else ''
+    return f"{query[:-1]}{cursor_filter}}}\nORDER BY ?{item_name}\nLIMIT {limit}"
+
+
 class Repository(Generic[T], ABC):
     """Repository interface.
 
@@ -26,26 +58,466 @@ class Repository(Generic[T], ABC):
     def edit(self, entity: T): pass
 
 
+class SingleFlight:
+    """Coalesce concurrent calls by key: while a call is in flight, identical calls wait for it and share its
+    result (or exception) instead of calling again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key: Future
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = Future()
+        if not is_leader:
+            return call.result()
+        try:
+            call.set_result(function(*args, **kwargs))
+        except BaseException as error:
+            call.set_exception(error)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return call.result()
+
+
 class ItemRepository(Repository[Item], ABC):
     """Item Repository interface."""
     pass
 
 
 class ItemPywikibotRepository(ItemRepository):
-    """Pywikibot implementation of ItemRepository."""
-    def __init__(self, repo=repo):
+    """Pywikibot implementation of ItemRepository.
+
+    If an EntityCache is given, get_many revalidates the cached entities with a single props=info request per
+    batch and only downloads those whose lastrevid has changed. Edits of its items are written through to it.
+
+    get, get_many and list accept a projection: properties and languages restrict the fetched statements and
+    labels/descriptions/aliases, and the returned items are partial (see `Item.from_json`). wbgetentities can only
+    restrict languages, so statements of other properties are dropped client-side.
+
+    Concurrent identical calls of get and get_from_page (e.g. from several threads) share a single fetch and its
+    item. get_many_from_pages gets the items of many pages at once, by sitelink.
+    """
+    def __init__(self, repo=repo, cache: EntityCache = None):
+        self.repo = repo
+        self.cache = cache
+        self._flights = SingleFlight()
+
+    def get(self, item_id: str, properties: Iterable[str] = None, languages: Iterable[str] = None) -> Item:
+        key = ('get', item_id, frozenset(properties) if properties is not None else None,
+               frozenset(languages) if languages is not None else None)
+        return self._flights.do(key, self._get, item_id, properties=properties, languages=languages)
+
+    def get_from_page(self, page: pywikibot.Page) -> Item:
+        """Get the item of a (Wikipedia) page.
+
+        :raises pywikibot.exceptions.NoPageError: if the page has no item.
+        """
+        key = ('page', page.site.dbName(), page.title())
+        return self._flights.do(key, self._get_from_page, page)
+
+    def _get_from_page(self, page: pywikibot.Page) -> Item:
+        items = self.get_many_from_pages([page])
+        if not items:
+            raise pywikibot.exceptions.NoPageError(page)
+        return next(iter(items.values()))
+
+    def get_many_from_pages(self, pages: Iterable, groupsize: int = 50, properties: Iterable[str] = None,
+                            languages: Iterable[str] = None) -> Dict[Tuple[str, str], Item]:
+        """Get the items of (Wikipedia) pages, with one wbgetentities request per site and group of titles.
+
+        Pages without item are skipped.
+
+        :param pages: pywikibot pages, or (site id, title) pairs, e.g. ('cawiki', 'Barcelona').
+        :param groupsize: Number of titles per request; the API maximum is 50.
+        :param properties: Only fetch the statements of these properties; all if None.
+        :param languages: Only fetch the labels, descriptions and aliases in these languages; all if None.
+        :return: Items by (site id, title) of their pages.
+        """
+        projection = Projection.create(properties=properties, languages=languages)
+        titles = defaultdict(list)  # site id: titles
+        for page in pages:
+            site_id, title = (page.site.dbName(), page.title()) if isinstance(page, pywikibot.Page) else page
+            titles[site_id].append(title)
+        items = {}
+        for site_id, site_titles in titles.items():
+            params = {}
+            if projection is not None:
+                # The sitelink of the site is needed to match each entity with its title
+                params = dict(projection.params, sitefilter=site_id)
+                if 'sitelinks' not in params['props']:
+                    params['props'] = params['props'] + ['sitelinks']
+            for batch in batched(dict.fromkeys(site_titles), groupsize):
+                data = self.repo.simple_request(action='wbgetentities', sites=site_id, titles=batch, **params).submit()
+                entities = [entity for entity in data['entities'].values() if 'missing' not in entity]
+                if self.cache is not None and projection is None:
+                    self.cache.put_many(entities)
+                for entity in entities:
+                    title = entity['sitelinks'][site_id]['title']
+                    items[site_id, title] = self._to_item(entity, projection=projection)
+        return items
+
+    def _get(self, item_id: str, properties: Iterable[str] = None, languages: Iterable[str] = None) -> Item:
+        for item in self.get_many([item_id], groupsize=1, properties=properties, languages=languages):
+            return item
+        raise pywikibot.exceptions.NoPageError(pywikibot.ItemPage(self.repo, item_id))
+
+    def get_many(self, item_ids: Iterable[str], groupsize: int = None, properties: Iterable[str] = None,
+                 languages: Iterable[str] = None) -> Iterator[Item]:
+        """Get items with one wbgetentities request per group of ids.
+
+        Missing items are skipped.
+
+        :param item_ids: Item ids.
+        :param groupsize: Number of ids per request; by default the API maximum: 500 with bot rights, 50 otherwise.
+        :param properties: Only fetch the statements of these properties; all if None.
+        :param languages: Only fetch the labels, descriptions and aliases in these languages; all if None.
+        """
+        projection = Projection.create(properties=properties, languages=languages)
+        if groupsize is None:
+            groupsize = 500 if self.repo.has_right('apihighlimits') else 50
+        for batch in batched(item_ids, groupsize):
+            for entity in self._get_entities(batch, projection=projection):
+                yield self._to_item(entity, projection=projection)
+
+    def list(self, query: str, page_size: int = 5000, item_name: str = 'item', properties: Iterable[str] = None,
+             languages: Iterable[str] = None) -> Iterator[Item]:
+        """Stream the items selected by a SPARQL query.
+
+        The query is run page by page with keyset pagination (see `paginate_query`), so that neither the query
+        service nor this process holds the whole result set.
+
+        :param query: SELECT query projecting ?item.
+        :param page_size: Number of items per SPARQL request.
+        :param item_name: Name of the item variable.
+        :param properties: Only fetch the statements of these properties; all if None.
+        :param languages: Only fetch the labels, descriptions and aliases in these languages; all if None.
+        :raises pywikibot.exceptions.ServerError: if a page of the query fails, instead of ending the stream early.
+        """
+        sparql = SparqlQuery(repo=self.repo)
+        cursor = None
+        while True:
+            results = sparql.select(paginate_query(query, cursor=cursor, limit=page_size, item_name=item_name))
+            # None if the request failed (e.g. timeout or invalid response), not at the end of the results
+            if results is None:
+                raise pywikibot.exceptions.ServerError(f"SPARQL query failed after cursor {cursor}")
+            if not results:
+                return
+            uris = list(dict.fromkeys(result[item_name] for result in results))
+            yield from self.get_many((uri.rsplit('/', 1)[-1] for uri in uris), properties=properties,
+                                     languages=languages)
+            if len(results) < page_size:
+                return
+            cursor = uris[-1]
+
+    def _get_entities(self, entity_ids, projection: Projection = None) -> List[dict]:
+        if self.cache is None:
+            return self._fetch_entities(entity_ids, **(projection.params if projection else {}))
+        # The cache only stores whole entities: the projection is applied by _to_item
+        cached_entities = self.cache.get_many(entity_ids)
+        if cached_entities:
+            lastrevids = {entity['id']: entity.get('lastrevid')
+                          for entity in self._fetch_entities(list(cached_entities), props='info')}
+            for entity_id, entity in list(cached_entities.items()):
+                if lastrevids.get(entity_id) != entity.get('lastrevid'):
+                    del cached_entities[entity_id]
+        fetched_entities = self._fetch_entities(
+            [entity_id for entity_id in entity_ids if entity_id not in cached_entities])
+        self.cache.put_many(fetched_entities)
+        fetched_entities = {entity['id']: entity for entity in fetched_entities}
+        self.cache.delete_many(entity_id for entity_id in entity_ids
+                               if entity_id not in cached_entities and entity_id not in fetched_entities)
+        entities = [cached_entities.get(entity_id) or fetched_entities.pop(entity_id, None)
+                    for entity_id in entity_ids]
+        # Redirected ids are returned under their target id
+        return [entity for entity in entities if entity] + list(fetched_entities.values())
+
+    def _fetch_entities(self, entity_ids, **kwargs) -> List[dict]:
+        if not entity_ids:
+            return []
+        data = self.repo.simple_request(action='wbgetentities', ids=entity_ids, **kwargs).submit()
+        return [entity for entity in data['entities'].values() if 'missing' not in entity]
+
+    def _to_item(self, entity, projection: Projection = None) -> Item:
+        # Claims are parsed on first access to each property
+        item = Item.from_json(entity, repo=self.repo, projection=projection)
+        # Partial content must not be taken for the whole entity
+        item._wrap(self.repo, entity if projection is None else None)
+        if self.cache is not None:
+            item._observers.append(self._write_through)
+        return item
+
+    def _write_through(self, item: Item, entity: dict):
+        self.cache.put(entity)
+
+
+# Datatypes of the properties used by the scripts, in Wikidata
+WIKIDATA_DATATYPES = {
+    'P31': 'wikibase-item', 'P39': 'wikibase-item', 'P66': 'wikibase-item', 'P94': 'commonsMedia',
+    'P131': 'wikibase-item', 'P143': 'wikibase-item', 'P158': 'commonsMedia', 'P248': 'wikibase-item',
+    'P279': 'wikibase-item', 'P360': 'wikibase-item', 'P374': 'external-id', 'P459': 'wikibase-item',
+    'P527': 'wikibase-item', 'P571': 'time', 'P576': 'time', 'P577': 'time', 'P580': 'time', 'P582': 'time',
+    'P585': 'time', 'P642': 'wikibase-item', 'P708': 'wikibase-item', 'P748': 'wikibase-item',
+    'P768': 'wikibase-item', 'P772': 'external-id', 'P813': 'time', 'P1027': 'wikibase-item', 'P1082': 'quantity',
+    'P1313': 'wikibase-item', 'P1365': 'wikibase-item', 'P1366': 'wikibase-item', 'P1448': 'monolingualtext',
+    'P1476': 'monolingualtext', 'P1534': 'wikibase-item', 'P1545': 'string', 'P1706': 'wikibase-item',
+    'P1906': 'wikibase-item', 'P2388': 'wikibase-item', 'P2506': 'external-id', 'P2585': 'external-id',
+    'P2586': 'external-id', 'P2670': 'wikibase-item', 'P2715': 'wikibase-item', 'P2937': 'wikibase-item',
+    'P3423': 'external-id', 'P4100': 'wikibase-item', 'P5054': 'wikibase-item',
+}
+
+
+class PropertyRepository:
+    """Registry of property datatypes, persisted as JSON in path (if given).
+
+    It is warmed from a snapshot (e.g. WIKIDATA_DATATYPES) and with a single wbgetentities props=datatype request
+    per batch of missing properties. Once registered, the models create their pywikibot claims with these datatypes,
+    so that pywikibot does not fetch them.
+    """
+    def __init__(self, path=None, repo=repo, snapshot: dict = None):
+        self.path = Path(path) if path else None
         self.repo = repo
+        self.datatypes = dict(snapshot or {})
+        if self.path is not None and self.path.exists():
+            self.datatypes.update(json.loads(self.path.read_text(encoding='utf-8')))
+
+    def get(self, property_id: str) -> str:
+        return self.get_many([property_id])[property_id]
+
+    def get_many(self, property_ids: Iterable[str]) -> dict:
+        """Return the datatypes of the properties, fetching those missing. Missing properties are skipped."""
+        property_ids = list(property_ids)
+        self.warm(property_ids)
+        return {property_id: self.datatypes[property_id]
+                for property_id in property_ids if property_id in self.datatypes}
+
+    def warm(self, property_ids: Iterable[str], groupsize: int = 50):
+        """Fetch the datatypes of the properties missing in the registry, and persist them."""
+        missing = [property_id for property_id in dict.fromkeys(property_ids) if property_id not in self.datatypes]
+        if not missing:
+            return
+        for batch in batched(missing, groupsize):
+            data = self.repo.simple_request(action='wbgetentities', ids=batch, props='datatype').submit()
+            self.datatypes.update({entity['id']: entity['datatype']
+                                   for entity in data['entities'].values() if 'datatype' in entity})
+        self.save()
+
+    def save(self):
+        if self.path is not None:
+            self.path.write_text(json.dumps(self.datatypes, indent=0, sort_keys=True), encoding='utf-8')
+
+    def register(self):
+        """Make the models use this registry."""
+        models.datatypes = self.datatypes
+
+
+class CachedItemRepository(ItemRepository):
+    """Caching decorator of an ItemRepository.
+
+    Items are kept in memory with LRU eviction beyond maxsize and, if ttl (in seconds) is given, expire after it.
+    Lookups are counted in hits and misses. A cached partial item only hits lookups whose projection it covers.
+    Items refreshed after an edit (see `Item.refresh`) are stored again.
+    """
+    def __init__(self, repository: ItemRepository, maxsize: int = 1024, ttl: float = None):
+        self.repository = repository
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()  # item_id: (item, stored_at)
 
-    def get(self, item_id: str) -> Item:
-        pwb_item = pywikibot.ItemPage(self.repo, item_id)
-        _ = pwb_item.get()
-        # Renamed: statements = pwb_item.claims
-        item = Item(id=pwb_item.id, labels=pwb_item.labels, descriptions=pwb_item.descriptions,
-                    aliases=pwb_item.aliases, statements=pwb_item.claims, sitelinks=pwb_item.sitelinks)
-        # pywikibot wrapper
-        item._item = pwb_item
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, item_id: str, **kwargs) -> Item:
+        item = self._lookup(item_id, projection=Projection.create(**kwargs))
+        if item is None:
+            item = self.repository.get(item_id, **kwargs)
+            self.put(item)
         return item
 
+    def get_many(self, item_ids: Iterable[str], **kwargs) -> Iterator[Item]:
+        """Get items, fetching only the uncached ones with a single get_many of the decorated repository."""
+        projection = Projection.create(properties=kwargs.get('properties'), languages=kwargs.get('languages'))
+        items = {item_id: self._lookup(item_id, projection=projection) for item_id in item_ids}
+        missing_ids = [item_id for item_id, item in items.items() if item is None]
+        if missing_ids:
+            for item in self.repository.get_many(missing_ids, **kwargs):
+                self.put(item)
+                items[item.id] = item
+        for item in items.values():
+            if item is not None:
+                yield item
+
+    def list(self, *args, **kwargs) -> Iterator[Item]:
+        for item in self.repository.list(*args, **kwargs):
+            self.put(item)
+            yield item
+
+    def put(self, item: Item):
+        if self._write_through not in item._observers:
+            item._observers.append(self._write_through)
+        self._cache[item.id] = (item, time.monotonic())
+        self._cache.move_to_end(item.id)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def _write_through(self, item: Item, entity: dict):
+        self.put(item)
+
+    def invalidate(self, item_id: str = None):
+        """Remove an item from the cache; all of them if no item_id is given."""
+        if item_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(item_id, None)
+
+    def _lookup(self, item_id, projection: Projection = None):
+        entry = self._cache.get(item_id)
+        if entry is not None:
+            item, stored_at = entry
+            if self.ttl is not None and time.monotonic() - stored_at >= self.ttl:
+                del self._cache[item_id]
+            elif covers(item.projection, projection):
+                self._cache.move_to_end(item_id)
+                self.hits += 1
+                return item
+        self.misses += 1
+
+
+class ItemDumpRepository(ItemRepository):
+    """ItemRepository over a local Wikidata JSON dump: latest-all.json, optionally compressed (.gz or .bz2).
+
+    A one-time indexing pass stores the byte offset of each entity line in a SQLite file next to the dump, so that
+    getting an item is a seek plus a single-line decode. Offsets refer to the uncompressed stream: seeking in a
+    compressed dump decompresses up to the offset, and seeking backwards decompresses again from its start. Hence
+    get_many reads the requested items in dump order, and get (random access) is only supported on uncompressed
+    dumps: on compressed ones, get the items of a batch at once with get_many, or stream them with list.
+
+    Statements are parsed into Statements (see Statement.from_json), which does not need the site, so that the dump
+    can be read offline; if repo is given, into pywikibot claims of repo instead. The datatypes of the properties
+    found in the dump are added to the registry (see PropertyRepository), so that pywikibot does not fetch them.
+    """
+    ID_REGEX = re.compile(rb'"id":"([A-Z]\d+)"')
+
+    def __init__(self, path, index_path=None, repo=None):
+        self.path = Path(path)
+        self.index_path = Path(index_path) if index_path else self.path.with_name(self.path.name + '.index')
+        self.repo = repo
+        self._file = None
+        self._index = None
+
+    @property
+    def index(self) -> sqlite3.Connection:
+        if self._index is None:
+            if not self.index_path.exists():
+                self.build_index()
+            self._index = sqlite3.connect(str(self.index_path))
+        return self._index
+
+    def build_index(self):
+        """Index the byte offset of each entity in the dump."""
+        tmp_path = self.index_path.with_name(self.index_path.name + '.tmp')
+        tmp_path.unlink(missing_ok=True)
+        index = sqlite3.connect(str(tmp_path))
+        with index:
+            index.execute("CREATE TABLE offsets (id TEXT PRIMARY KEY, offset INTEGER)")
+            index.executemany("INSERT OR REPLACE INTO offsets (id, offset) VALUES (?, ?)", self._scan())
+        index.close()
+        os.replace(tmp_path, self.index_path)
+
+    def get(self, item_id: str, properties: Iterable[str] = None, languages: Iterable[str] = None) -> Item:
+        """Get an item of an uncompressed dump.
+
+        :raises ValueError: if the dump is compressed.
+        :raises pywikibot.exceptions.NoPageError: if the item is not in the dump.
+        """
+        if self.path.suffix in ('.gz', '.bz2'):
+            raise ValueError(f"Random access to compressed dump {self.path}: use get_many or list instead")
+        for item in self.get_many([item_id], properties=properties, languages=languages):
+            return item
+        page = pywikibot.ItemPage(self.repo, item_id) if self.repo is not None else item_id
+        raise pywikibot.exceptions.NoPageError(page, f"Item {item_id} is not in dump {self.path}.")
+
+    def get_many(self, item_ids: Iterable[str], properties: Iterable[str] = None,
+                 languages: Iterable[str] = None) -> Iterator[Item]:
+        """Get items in dump order. Items missing from the dump are skipped."""
+        projection = Projection.create(properties=properties, languages=languages)
+        offsets = []
+        for batch in batched(item_ids, 500):
+            offsets.extend(offset for offset, in self.index.execute(
+                f"SELECT offset FROM offsets WHERE id IN ({', '.join('?' * len(batch))})", batch))
+        file = self._open()
+        for offset in sorted(offsets):
+            file.seek(offset)
+            yield self._to_item(self._decode(file.readline()), projection)
+
+    def list(self, query: Callable[[dict], bool] = None, properties: Iterable[str] = None,
+             languages: Iterable[str] = None) -> Iterator[Item]:
+        """Stream the items of the dump, optionally only those whose entity JSON satisfies query."""
+        projection = Projection.create(properties=properties, languages=languages)
+        with self._open_dump() as file:
+            for line in file:
+                if not line.startswith(b'{'):
+                    continue
+                entity = self._decode(line)
+                if entity.get('type') == 'property':
+                    models.datatypes.setdefault(entity['id'], entity['datatype'])
+                elif entity.get('type') == 'item' and (query is None or query(entity)):
+                    yield self._to_item(entity, projection)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def _to_item(self, entity: dict, projection: Projection = None) -> Item:
+        for claims in entity.get('claims', {}).values():
+            for claim in claims:
+                if 'datatype' in claim['mainsnak']:
+                    models.datatypes.setdefault(claim['mainsnak']['property'], claim['mainsnak']['datatype'])
+                    break
+        return Item.from_json(entity, repo=self.repo, projection=projection,
+                              parse=models.Statement.from_json if self.repo is None else None)
+
+    def _open_dump(self):
+        if self.path.suffix == '.gz':
+            return gzip.open(self.path, 'rb')
+        elif self.path.suffix == '.bz2':
+            return bz2.open(self.path, 'rb')
+        return open(self.path, 'rb')
+
+    def _open(self):
+        if self._file is None:
+            self._file = self._open_dump()
+        return self._file
+
+    def _scan(self):
+        with self._open_dump() as file:
+            offset = 0
+            for line in file:
+                if line.startswith(b'{'):
+                    match = self.ID_REGEX.search(line, 0, 200)
+                    entity_id = match.group(1).decode() if match else self._decode(line)['id']
+                    yield entity_id, offset
+                offset += len(line)
+
+    @staticmethod
+    def _decode(line: bytes) -> dict:
+        return json.loads(line.rstrip().rstrip(b','))
+
 
 class PywikibotRepository:
     items = ItemPywikibotRepository()